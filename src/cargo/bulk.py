@@ -0,0 +1,85 @@
+"""
+Массовое создание заказов для интеграций отправителей.
+
+Строки проверяются сериализатором без запросов к базе, затем все упомянутые
+``Location`` и ``CargoType`` загружаются одним ``in_bulk`` на модель,
+маршруты и тариф — одним вызовом ``pricing.quote_many``. Заказы вставляются
+``bulk_create`` в одной транзакции: если хоть одна строка с ошибкой, не
+создается ни одного заказа, а ошибки возвращаются с индексами строк.
+"""
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+
+from core import pricing
+from locations.models import Location
+from .models import CargoType, Order
+from .serializers import BulkOrderItemSerializer
+
+DOES_NOT_EXIST = PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+
+
+class BulkCreateError(Exception):
+    """Ошибки строк: ``[{'index': n, 'errors': {...}}, ...]``."""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def create_orders(items, sender_id):
+    """Создает заказы из списка словарей и возвращает их id в порядке строк."""
+    rows, errors = _validate(items)
+    locations, cargo_types = {}, {}
+    if not errors:
+        locations, cargo_types, errors = _resolve(rows)
+    if errors:
+        raise BulkCreateError(errors)
+
+    quotes = pricing.quote_many(
+        ((row['departure_point'], row['destination_point'], row['weight']) for row in rows), locations
+    )
+    orders = []
+    for row, quote in zip(rows, quotes):
+        row.update(quote.as_fields())
+        row['departure_point'] = locations[row['departure_point']]
+        row['destination_point'] = locations[row['destination_point']]
+        cargo_type_id = row.pop('cargo_type', None)
+        row['cargo_type'] = cargo_types[cargo_type_id] if cargo_type_id is not None else None
+        orders.append(Order(sender_id=sender_id, **row))
+    with transaction.atomic():
+        Order.objects.bulk_create(orders, batch_size=settings.CARGO_BULK_CREATE_BATCH_SIZE)
+    return [order.pk for order in orders]
+
+
+def _validate(items):
+    child = BulkOrderItemSerializer()
+    rows, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            rows.append(child.run_validation(item))
+        except serializers.ValidationError as error:
+            errors.append({'index': index, 'errors': error.detail})
+    return rows, errors
+
+
+def _resolve(rows):
+    """Загружает связанные объекты по одному запросу на модель и находит несуществующие id."""
+    location_ids = {row[field] for row in rows for field in ('departure_point', 'destination_point')}
+    cargo_type_ids = {row['cargo_type'] for row in rows if row.get('cargo_type') is not None}
+    locations = Location.objects.in_bulk(location_ids)
+    cargo_types = CargoType.objects.in_bulk(cargo_type_ids)
+
+    errors = []
+    for index, row in enumerate(rows):
+        missing = {
+            field: [DOES_NOT_EXIST.format(pk_value=row[field])]
+            for field in ('departure_point', 'destination_point')
+            if row[field] not in locations
+        }
+        if row.get('cargo_type') is not None and row['cargo_type'] not in cargo_types:
+            missing['cargo_type'] = [DOES_NOT_EXIST.format(pk_value=row['cargo_type'])]
+        if missing:
+            errors.append({'index': index, 'errors': missing})
+    return locations, cargo_types, errors
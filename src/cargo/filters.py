@@ -0,0 +1,56 @@
+import django_filters
+
+from locations.models import Location
+from .models import Order
+
+
+class OpenOrderFilter(django_filters.FilterSet):
+    """
+    Фильтры ленты свободных заказов. Каждый фильтр опирается на частичные
+    индексы ``Order`` по свободным заказам (см. ``Order.Meta.indexes``);
+    города сначала переводятся в id локаций по индексу ``Location.city_name``.
+    """
+
+    cargo_type = django_filters.NumberFilter(field_name='cargo_type_id')
+    departure_point = django_filters.NumberFilter(field_name='departure_point_id')
+    destination_point = django_filters.NumberFilter(field_name='destination_point_id')
+    departure_city = django_filters.CharFilter(method='filter_departure_city')
+    destination_city = django_filters.CharFilter(method='filter_destination_city')
+    max_weight = django_filters.NumberFilter(field_name='weight', lookup_expr='lte')
+    fits_vehicle = django_filters.BooleanFilter(method='filter_fits_vehicle')
+    created_after = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='gte')
+    created_before = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='lt')
+
+    class Meta:
+        model = Order
+        fields = []
+
+    def filter_departure_city(self, queryset, name, value):
+        return queryset.filter(departure_point_id__in=self._city_location_ids(value))
+
+    def filter_destination_city(self, queryset, name, value):
+        return queryset.filter(destination_point_id__in=self._city_location_ids(value))
+
+    def _city_location_ids(self, city_name):
+        # id берутся отдельным запросом: со списком констант планировщик идет по
+        # индексу маршрута, а с подзапросом предпочитает перебор ленты.
+        return list(Location.objects.filter(city_name=city_name).values_list('pk', flat=True))
+
+    def filter_fits_vehicle(self, queryset, name, value):
+        """Вес не больше грузоподъемности машины водителя, если она указана в профиле."""
+        capacity = getattr(self.request.user, 'vehicle_capacity', None) if value else None
+        if capacity is None:
+            return queryset
+        return queryset.filter(weight__lte=capacity)
+
+
+class OrderExportFilter(django_filters.FilterSet):
+    """Фильтры выгрузки истории заказов (cargo.export)."""
+
+    status = django_filters.ChoiceFilter(choices=Order.Status.choices)
+    created_after = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='gte')
+    created_before = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='lt')
+
+    class Meta:
+        model = Order
+        fields = []
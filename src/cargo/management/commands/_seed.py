@@ -0,0 +1,86 @@
+"""Генерация синтетических заказов для бенчмарков cargo."""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from locations.models import Location
+from users.models import User
+from cargo.models import CargoType, Order
+
+
+@contextmanager
+def explicit_created_at():
+    """Позволяет задавать ``created_at`` вручную, отключая auto_now_add."""
+    field = Order._meta.get_field('created_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def seed_users(count, role, prefix):
+    users = [
+        User(
+            username=f'{prefix}{index:09d}',
+            phone_number=f'{prefix}{index:09d}',
+            role=role,
+            referral_code=f'{prefix[-2:]}{index:06d}',
+            password='!',
+        )
+        for index in range(count)
+    ]
+    return User.objects.bulk_create(users, batch_size=5000)
+
+
+def seed_locations(count):
+    rng = random.Random(count)
+    locations = []
+    for index in range(count):
+        location = Location(
+            city_name=f'Город {index}',
+            latitude=Decimal(f'{rng.uniform(40.5, 55.4):.6f}'),
+            longitude=Decimal(f'{rng.uniform(46.5, 87.3):.6f}'),
+        )
+        location.update_geohash()
+        locations.append(location)
+    return Location.objects.bulk_create(locations, batch_size=5000)
+
+
+def seed_orders(count, senders, drivers=(), locations=(), cargo_types=(),
+                statuses=(Order.Status.PENDING,), batch_size=10000, stdout=None):
+    """Создает ``count`` заказов с убывающим ``created_at`` (шаг одна секунда)."""
+    rng = random.Random(count)
+    locations = list(locations) or seed_locations(50)
+    cargo_types = list(cargo_types) or CargoType.objects.bulk_create(
+        CargoType(name=f'Тип {index}') for index in range(10)
+    )
+    now = timezone.now()
+    created = 0
+    with explicit_created_at():
+        while created < count:
+            size = min(batch_size, count - created)
+            batch = []
+            for index in range(created, created + size):
+                status = statuses[index % len(statuses)]
+                batch.append(Order(
+                    sender=senders[index % len(senders)],
+                    driver=(
+                        drivers[index % len(drivers)]
+                        if drivers and status != Order.Status.PENDING else None
+                    ),
+                    departure_point=rng.choice(locations),
+                    destination_point=rng.choice(locations),
+                    cargo_type=rng.choice(cargo_types),
+                    weight=Decimal(rng.randint(50, 20000)),
+                    status=status,
+                    created_at=now - timedelta(seconds=index),
+                ))
+            Order.objects.bulk_create(batch)
+            created += size
+            if stdout is not None and created % (batch_size * 10) == 0:
+                stdout.write(f'  создано заказов: {created}')
+    return created
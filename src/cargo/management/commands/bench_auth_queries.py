@@ -0,0 +1,49 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from core.benchmarks import BenchmarkCommand, measure
+from users.authentication import ClaimsJWTAuthentication, clear_user_cache
+from users.models import User
+from users.serializers import CustomTokenObtainPairSerializer
+from cargo.views import CargoRequestViewSet
+from ._seed import seed_orders, seed_users
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Сравнивает число запросов и время list/retrieve CargoRequestViewSet '
+        'с JWTAuthentication (пользователь из базы) и ClaimsJWTAuthentication (из claims).'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--orders', type=int, default=10_000)
+
+    def run_benchmark(self, **options):
+        sender = seed_users(1, User.Role.SENDER, '+7700')[0]
+        seed_orders(options['orders'], senders=[sender], stdout=self.stdout)
+        self.analyze()
+        order_id = sender.sent_orders.values_list('pk', flat=True).first()
+        token = CustomTokenObtainPairSerializer.get_token(sender).access_token
+        factory = APIRequestFactory()
+
+        for action, kwargs in (('list', {}), ('retrieve', {'pk': order_id})):
+            for authentication in (JWTAuthentication, ClaimsJWTAuthentication):
+                view = CargoRequestViewSet.as_view(
+                    {'get': action}, authentication_classes=[authentication]
+                )
+
+                def call():
+                    request = factory.get('/', HTTP_AUTHORIZATION=f'Bearer {token}', HTTP_HOST='localhost')
+                    response = view(request, **kwargs)
+                    response.render()
+                    assert response.status_code == 200, response.status_code
+
+                clear_user_cache()
+                with CaptureQueriesContext(connection) as queries:
+                    call()
+                timings = measure(call, options['repeat'])
+                self.report(f'{action}, {authentication.__name__}', timings)
+                self.stdout.write(f'{"":<40} запросов к базе: {len(queries)}')
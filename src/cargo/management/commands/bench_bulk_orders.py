@@ -0,0 +1,65 @@
+from unittest.mock import patch
+
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.benchmarks import BenchmarkCommand, measure
+from core.models import TariffSettings
+from users.models import User
+from cargo.models import CargoType
+from ._seed import seed_locations, seed_users
+
+
+class Command(BenchmarkCommand):
+    help = 'Создание пачки заказов: по запросу на заказ против одного запроса bulk.'
+    default_repeat = 3
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--orders', type=int, default=1000)
+
+    def run_benchmark(self, **options):
+        count, repeat = options['orders'], options['repeat']
+        sender = seed_users(1, User.Role.SENDER, '+7700')[0]
+        locations = seed_locations(200)
+        cargo_types = CargoType.objects.bulk_create(CargoType(name=f'Тип {index}') for index in range(10))
+        TariffSettings.objects.create(price_per_km='100.00', base_fee='500.00')
+        items = [
+            {
+                'departure_point': locations[index % len(locations)].pk,
+                'destination_point': locations[(index * 7 + 1) % len(locations)].pk,
+                'cargo_type': cargo_types[index % len(cargo_types)].pk,
+                'weight': 100 + index % 1000,
+            }
+            for index in range(count)
+        ]
+
+        client = APIClient()
+        client.force_authenticate(sender)
+        list_url = reverse('cargo:cargo-request-list')
+        bulk_url = reverse('cargo:cargo-request-bulk-create')
+
+        def one_by_one():
+            for item in items:
+                assert client.post(list_url, item, format='json').status_code == 201
+
+        def in_bulk():
+            assert client.post(bulk_url, items, format='json').status_code == 201
+
+        def count_queries(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        # Рассылка водителям одинакова для обоих путей и идет после ответа: в замер не входит.
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), \
+                patch('cargo.views.schedule_new_orders'):
+            for label, func in ((f'{count} x POST', one_by_one), (f'POST bulk ({count})', in_bulk)):
+                func()  # прогрев кешей маршрутов и тарифа
+                queries = []
+                with connection.execute_wrapper(count_queries):
+                    func()
+                self.report(label, measure(func, repeat))
+                self.stdout.write(f'{"":<40} queries={len(queries)}')
@@ -0,0 +1,91 @@
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.urls import resolve, reverse
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.benchmarks import BenchmarkCommand, measure
+from users.models import User
+from cargo.models import CargoType, Order
+from ._seed import seed_locations, seed_orders, seed_users
+
+FEED_INDEXES = ('cargo_open_type_idx', 'cargo_open_route_idx', 'cargo_open_destination_idx')
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Лента свободных заказов водителя: p95 первой страницы по фильтрам '
+        'с частичными индексами и без них.'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--orders', type=int, default=1_000_000)
+        parser.add_argument('--locations', type=int, default=1000)
+
+    def run_benchmark(self, **options):
+        count, repeat = options['orders'], options['repeat']
+        self.stdout.write(f'Генерация {count} заказов...')
+        sender = seed_users(1, User.Role.SENDER, '+7700')[0]
+        drivers = seed_users(100, User.Role.DRIVER, '+7701')
+        driver = drivers[0]
+        driver.vehicle_capacity = 5000
+        driver.save(update_fields=['vehicle_capacity'])
+        locations = seed_locations(options['locations'])
+        cargo_types = CargoType.objects.bulk_create(CargoType(name=f'Тип {index}') for index in range(10))
+        # Свободен каждый десятый заказ, остальные назначены или уже закрыты.
+        statuses = (Order.Status.PENDING, Order.Status.ACCEPTED) + (Order.Status.DELIVERED,) * 8
+        seed_orders(
+            count, senders=[sender], drivers=drivers, locations=locations, cargo_types=cargo_types,
+            statuses=statuses, stdout=self.stdout,
+        )
+        self.analyze()
+
+        rng = random.Random(0)
+        routes = list(
+            Order.objects.open().order_by('?')
+            .values_list('departure_point__city_name', 'destination_point__city_name')[:100]
+        )
+        newest = Order.objects.order_by('-created_at').values_list('created_at', flat=True).first()
+        scenarios = {
+            'no filters': lambda: {},
+            'cargo_type': lambda: {'cargo_type': rng.choice(cargo_types).pk},
+            'route cities': lambda: dict(zip(('departure_city', 'destination_city'), rng.choice(routes))),
+            'destination city': lambda: {'destination_city': rng.choice(locations).city_name},
+            'fits_vehicle': lambda: {'fits_vehicle': 'true'},
+            # Заказы созданы с шагом в секунду: окно уходит вглубь ленты.
+            'created_before': lambda: {
+                'created_before': (newest - timedelta(seconds=rng.randint(0, count))).isoformat()
+            },
+        }
+        self.run_scenarios('indexed', scenarios, driver, repeat)
+
+        with connection.schema_editor() as editor:
+            for index in Order._meta.indexes:
+                if index.name in FEED_INDEXES:
+                    editor.remove_index(Order, index)
+        self.analyze()
+        self.run_scenarios('without partial indexes', scenarios, driver, repeat)
+
+    def run_scenarios(self, label, scenarios, driver, repeat):
+        self.stdout.write(f'-- {label}')
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            self._run_scenarios(scenarios, driver, repeat)
+
+    def _run_scenarios(self, scenarios, driver, repeat):
+        factory = APIRequestFactory()
+        url = reverse('cargo:cargo-request-feed')
+        view = resolve(url).func
+        for name, params in scenarios.items():
+            def fetch():
+                request = factory.get(url, params())
+                force_authenticate(request, user=driver)
+                response = view(request)
+                assert response.status_code == 200, response.data
+                response.render()
+
+            fetch()
+            self.report(name, measure(fetch, repeat))
@@ -0,0 +1,59 @@
+import random
+
+from core.benchmarks import BenchmarkCommand, measure
+from locations.geo import haversine_km
+from users.models import User
+from cargo.models import Order
+from ._seed import seed_locations, seed_orders, seed_users
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Поиск свободных заказов в радиусе: полный перебор с haversine '
+        'против отбора по geohash-индексу с точной проверкой.'
+    )
+    default_repeat = 10
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--locations', type=int, default=100_000)
+
+    def run_benchmark(self, **options):
+        count, repeat = options['locations'], options['repeat']
+        self.stdout.write(f'Генерация {count} локаций и заказов...')
+        sender = seed_users(1, User.Role.SENDER, '+7700')[0]
+        locations = seed_locations(count)
+        seed_orders(count, senders=[sender], locations=locations)
+        self.analyze()
+
+        rng = random.Random(0)
+        points = [(rng.uniform(42, 53), rng.uniform(50, 80)) for _ in range(repeat)]
+
+        for radius_km in (10, 50, 200):
+            found = []
+
+            def full_scan():
+                rows = Order.objects.open().values_list(
+                    'id', 'departure_point__latitude', 'departure_point__longitude'
+                )
+                latitude, longitude = points[len(found) % len(points)]
+                found.append(sum(
+                    1 for _, lat, lon in rows
+                    if haversine_km(latitude, longitude, lat, lon) <= radius_km
+                ))
+
+            def indexed():
+                latitude, longitude = points[len(found) % len(points)]
+                rows = Order.objects.open().departing_near(latitude, longitude, radius_km).values_list(
+                    'id', 'departure_point__latitude', 'departure_point__longitude'
+                )
+                found.append(sum(
+                    1 for _, lat, lon in rows
+                    if haversine_km(latitude, longitude, lat, lon) <= radius_km
+                ))
+
+            self.report(f'full scan, r={radius_km} km', measure(full_scan, repeat))
+            scan_found, found[:] = found[:], []
+            self.report(f'geohash index, r={radius_km} km', measure(indexed, repeat))
+            if scan_found != found:
+                self.stderr.write(f'  результаты различаются: {scan_found} != {found}')
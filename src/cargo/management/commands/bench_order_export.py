@@ -0,0 +1,69 @@
+import time
+
+from django.conf import settings
+from django.test import override_settings
+from django.urls import resolve, reverse
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.benchmarks import BenchmarkCommand, track_rss
+from users.models import User
+from ._seed import seed_orders, seed_users
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Выгрузка истории заказов: потоковый экспорт CSV/JSONL против '
+        'постраничного обхода API; время и прирост пикового RSS.'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--orders', type=int, default=1_000_000)
+        parser.add_argument('--paged-rows', type=int, default=1000,
+                            help='Сколько строк пройти постранично для сравнения')
+
+    def run_benchmark(self, **options):
+        count = options['orders']
+        self.stdout.write(f'Генерация {count} заказов...')
+        admin = seed_users(1, User.Role.ADMIN, '+7709')[0]
+        senders = seed_users(10, User.Role.SENDER, '+7700')
+        seed_orders(count, senders=senders, stdout=self.stdout)
+        self.analyze()
+
+        factory = APIRequestFactory()
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for export_format in ('csv', 'jsonl'):
+                url = reverse('cargo:cargo-request-export')
+                request = factory.get(url, {'export_format': export_format})
+                force_authenticate(request, user=admin)
+                with track_rss() as rss:
+                    started = time.perf_counter()
+                    response = resolve(url).func(request)
+                    size = sum(len(chunk) for chunk in response.streaming_content)
+                    elapsed = time.perf_counter() - started
+                self.write_result(f'export {export_format}', count, elapsed, rss, f'{size / 2 ** 20:.0f} MB')
+
+            self.page_through_api(admin, factory, options['paged_rows'])
+
+    def page_through_api(self, admin, factory, limit):
+        url = reverse('cargo:cargo-request-list')
+        view = resolve(url).func
+        params, rows = {'page_size': 20}, 0
+        with track_rss() as rss:
+            started = time.perf_counter()
+            while rows < limit:
+                request = factory.get(url, params)
+                force_authenticate(request, user=admin)
+                data = view(request).data
+                rows += len(data['results'])
+                if not data['next']:
+                    break
+                params = {'page_size': 20, 'cursor': data['next'].split('cursor=')[1].split('&')[0]}
+            elapsed = time.perf_counter() - started
+        self.write_result('API pages of 20', rows, elapsed, rss, f'{rows // 20} requests')
+
+    def write_result(self, label, rows, elapsed, rss, extra):
+        self.stdout.write(
+            f'{label:<20} rows={rows:>9} time={elapsed:8.2f} s  rows/s={rows / elapsed:>9.0f}  '
+            f'RSS +{rss["peak"] - rss["start"]:6.1f} MB  {extra}'
+        )
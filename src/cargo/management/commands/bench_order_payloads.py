@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.test import override_settings
+from django.urls import resolve, reverse
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.benchmarks import BenchmarkCommand, measure
+from users.models import User
+from cargo import payloads
+from cargo.models import CargoType, Order
+from cargo.serializers import OrderReadSerializer
+from ._seed import seed_locations, seed_orders, seed_users
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Сериализация страницы списка заказов: OrderReadSerializer на каждый запрос '
+        'против кеша представлений (cargo.payloads).'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--orders', type=int, default=10_000)
+        parser.add_argument('--page-size', type=int, default=100)
+
+    def run_benchmark(self, **options):
+        count, repeat, page_size = options['orders'], options['repeat'], options['page_size']
+        sender = seed_users(1, User.Role.SENDER, '+7700')[0]
+        locations = seed_locations(200)
+        cargo_types = CargoType.objects.bulk_create(CargoType(name=f'Тип {index}') for index in range(10))
+        seed_orders(
+            count, senders=[sender], locations=locations, cargo_types=cargo_types,
+            statuses=(Order.Status.PENDING,), stdout=self.stdout,
+        )
+        self.analyze()
+
+        ordering = ('-created_at', '-pk')
+        orders = list(Order.objects.for_read().order_by(*ordering)[:page_size])
+        page = list(payloads.rows(Order.objects.order_by(*ordering))[:page_size])
+        cache = payloads._cache()
+
+        def uncached():
+            OrderReadSerializer(orders, many=True).data
+
+        def cold():
+            cache.delete_many([payloads.cache_key(order) for order in page])
+            payloads.serialize(page)
+
+        def warm():
+            payloads.serialize(page)
+
+        payloads.serialize(page)
+        self.report(f'serializer, {page_size} orders', measure(uncached, repeat))
+        self.report(f'cache cold, {page_size} orders', measure(cold, repeat))
+        self.report(f'cache warm, {page_size} orders', measure(warm, repeat))
+
+        # Полный запрос списка: страница, затем правка одного заказа из нее.
+        factory = APIRequestFactory()
+        url = reverse('cargo:cargo-request-list')
+        view = resolve(url).func
+
+        def fetch():
+            request = factory.get(url, {'page_size': page_size})
+            force_authenticate(request, user=sender)
+            response = view(request)
+            assert response.status_code == 200, response.data
+            response.render()
+
+        cache.clear()
+        payloads.stats.reset()
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            self.report(f'GET list, page_size={page_size}', measure(fetch, repeat))
+            Order.objects.filter(pk=page[0]['id']).touch()
+            fetch()
+        self.stdout.write(f'{"":<40} {payloads.stats.snapshot()}')
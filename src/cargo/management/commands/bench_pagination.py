@@ -0,0 +1,61 @@
+from urllib.parse import parse_qs, urlparse
+
+from rest_framework.pagination import Cursor, PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.benchmarks import BenchmarkCommand, measure
+from core.pagination import CreatedAtCursorPagination
+from users.models import User
+from cargo.models import Order
+from ._seed import seed_orders, seed_users
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Сравнивает OFFSET-пагинацию и keyset-пагинацию заказов отправителя '
+        'на первой, средней и последней странице.'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--orders', type=int, default=1_000_000)
+
+    def run_benchmark(self, **options):
+        orders, repeat = options['orders'], options['repeat']
+        self.stdout.write(f'Генерация {orders} заказов...')
+        sender = seed_users(1, User.Role.SENDER, '+7700')[0]
+        seed_orders(orders, senders=[sender], stdout=self.stdout)
+        self.analyze()
+
+        queryset = Order.objects.for_user(sender).for_read()
+        factory = APIRequestFactory()
+        page_size = CreatedAtCursorPagination.page_size
+        last_page = max(1, orders // page_size)
+
+        for label, page in (('first', 1), ('middle', last_page // 2), ('last', last_page)):
+            request = Request(factory.get('/', {'page': page}, HTTP_HOST='localhost'))
+            paginator = PageNumberPagination()
+            timings = measure(
+                lambda: list(paginator.paginate_queryset(queryset.order_by('-created_at'), request)),
+                repeat,
+            )
+            self.report(f'page number, {label} page', timings)
+
+            request = Request(factory.get(
+                '/', self._cursor_params(queryset, (page - 1) * page_size), HTTP_HOST='localhost'
+            ))
+            paginator = CreatedAtCursorPagination()
+            timings = measure(lambda: list(paginator.paginate_queryset(queryset, request)), repeat)
+            self.report(f'cursor, {label} page', timings)
+
+    @staticmethod
+    def _cursor_params(queryset, offset):
+        """Курсор, который клиент получил бы в ссылке ``next`` на глубине ``offset``."""
+        if not offset:
+            return {}
+        position = queryset.order_by('-created_at', '-id').values_list('created_at', flat=True)[offset - 1]
+        paginator = CreatedAtCursorPagination()
+        paginator.base_url = 'http://localhost/'
+        url = paginator.encode_cursor(Cursor(offset=0, reverse=False, position=str(position)))
+        return {key: values[0] for key, values in parse_qs(urlparse(url).query).items()}
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cargo import export
+from cargo.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка заказов в CSV или JSON Lines; память не растет с числом строк.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=export.FORMATS, default='csv', dest='export_format')
+        parser.add_argument('--output', help='Файл для записи; по умолчанию stdout')
+        parser.add_argument('--sender', type=int, help='Только заказы этого отправителя')
+        parser.add_argument('--status', choices=Order.Status.values)
+        parser.add_argument('--chunk-size', type=int, default=settings.ORDER_EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if options['sender'] is not None:
+            orders = orders.filter(sender_id=options['sender'])
+        if options['status']:
+            orders = orders.filter(status=options['status'])
+
+        chunks = export.stream(orders, options['export_format'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+            self.stderr.write(self.style.SUCCESS(f'Выгрузка записана в {options["output"]}'))
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cargo', '0001_initial'),
+        ('locations', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['driver', 'created_at'], name='cargo_order_driver__ca7d4f_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cargo', '0002_order_cargo_order_driver__ca7d4f_idx'),
+        ('locations', '0003_route'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('driver__isnull', True), ('status', 'PENDING')), fields=['cargo_type', 'created_at'], name='cargo_open_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('driver__isnull', True), ('status', 'PENDING')), fields=['departure_point', 'destination_point', 'created_at'], name='cargo_open_route_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('driver__isnull', True), ('status', 'PENDING')), fields=['destination_point', 'created_at'], name='cargo_open_destination_idx'),
+        ),
+    ]
@@ -10,6 +10,83 @@ class CargoType(models.Model):
     def __str__(self):
         return self.name
 
+class OrderQuerySet(models.QuerySet):
+    """QuerySet заказов с учетом роли пользователя и чтения для API."""
+
+    # Колонки, которые отдает OrderReadSerializer (вместе со связанными моделями),
+    # и version — ключ кеша готовых представлений (cargo.payloads).
+    READ_FIELDS = (
+        'id',
+        'version',
+        'sender',
+        'driver',
+        'weight',
+        'length',
+        'width',
+        'height',
+        'description',
+        'distance_km',
+        'estimated_time_hours',
+        'total_cost',
+        'status',
+        'created_at',
+        'accepted_at',
+        'delivered_at',
+        'is_driver_sharing_location',
+        'cargo_type__id',
+        'cargo_type__name',
+        'cargo_type__description',
+        'departure_point__id',
+        'departure_point__city_name',
+        'departure_point__latitude',
+        'departure_point__longitude',
+        'destination_point__id',
+        'destination_point__city_name',
+        'destination_point__latitude',
+        'destination_point__longitude',
+    )
+
+    def for_user(self, user):
+        """Отправители видят свои заказы, водители — назначенные им, администратор — все."""
+        role = getattr(user, 'role', None)
+        if role == User.Role.ADMIN or user.is_staff:
+            return self.all()
+        if role == User.Role.DRIVER:
+            return self.filter(driver_id=user.pk)
+        return self.filter(sender_id=user.pk)
+
+    def update(self, **kwargs):
+        # Любое изменение строк сдвигает версию, и закешированное представление заказа устаревает.
+        kwargs.setdefault('version', models.F('version') + 1)
+        return super().update(**kwargs)
+
+    def touch(self):
+        """Сдвигает версию без изменения данных: поменялись связанные Location или CargoType."""
+        return self.update()
+
+    def for_read(self):
+        """Подгружает связи одним JOIN и только нужные сериализатору колонки."""
+        return self.select_related(
+            'cargo_type', 'departure_point', 'destination_point'
+        ).only(*self.READ_FIELDS)
+
+    def open(self):
+        """Заказы, которые еще может принять водитель; условие совпадает с частичными индексами."""
+        return self.filter(OPEN_ORDERS)
+
+    def departing_near(self, latitude, longitude, radius_km):
+        """
+        Предварительный отбор по geohash-индексу точки отправления.
+        Подзапрос заставляет планировщик начинать с индекса локаций,
+        а не с перебора всех свободных заказов.
+        """
+        nearby_locations = Location.objects.near(latitude, longitude, radius_km)
+        return self.filter(departure_point__in=nearby_locations.values('pk'))
+
+
+OPEN_ORDERS = models.Q(status='PENDING', driver__isnull=True)
+
+
 class Order(models.Model):
     """Основная модель заказа."""
     
@@ -48,13 +125,59 @@ class Order(models.Model):
     
     # Флаг для отслеживания геолокации
     is_driver_sharing_location = models.BooleanField(default=False)
+
+    # Растет при каждом изменении заказа и связанных справочников (cargo.payloads)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    objects = OrderQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['status']),
             models.Index(fields=['sender', 'created_at']),
+            models.Index(fields=['driver', 'created_at']),
+            # Частичные индексы ленты свободных заказов (cargo.filters.OpenOrderFilter):
+            # только строки PENDING без водителя, порядок ленты — по created_at.
+            # Ленту без фильтров обслуживает индекс (driver, created_at) по driver IS NULL.
+            models.Index(fields=['cargo_type', 'created_at'], condition=OPEN_ORDERS, name='cargo_open_type_idx'),
+            models.Index(
+                fields=['departure_point', 'destination_point', 'created_at'],
+                condition=OPEN_ORDERS, name='cargo_open_route_idx',
+            ),
+            models.Index(
+                fields=['destination_point', 'created_at'], condition=OPEN_ORDERS, name='cargo_open_destination_idx'
+            ),
         ]
 
     def __str__(self):
-        return f"Заказ #{self.id} от {self.sender}"
\ No newline at end of file
+        return f"Заказ #{self.id} от {self.sender}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Статус на момент загрузки: по нему сигналы находят смену статуса.
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'version'}
+        # Инкремент в базе, а не в Python: параллельные сохранения не получат одну версию.
+        self.version = models.F('version') + 1
+        super().save(*args, **kwargs)
+        # Новое значение прочитается из базы при первом обращении.
+        del self.version
+
+    def event_payload(self):
+        return {
+            'id': self.pk,
+            'status': self.status,
+            'driver': self.driver_id,
+            'is_driver_sharing_location': self.is_driver_sharing_location,
+            'accepted_at': self.accepted_at.isoformat() if self.accepted_at else None,
+            'delivered_at': self.delivered_at.isoformat() if self.delivered_at else None,
+        }
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""
+Кеш готовых представлений заказов (``OrderReadSerializer``).
+
+Ключ — id заказа, ``Order.version`` и момент создания (id в SQLite может
+достаться новому заказу после удаления старого). Версия растет при любом изменении
+заказа (``save`` и ``QuerySet.update``) и при изменении связанных
+``Location``/``CargoType`` (сигналы ``cargo.signals``), поэтому записи не
+нужно удалять: устаревшие просто перестают запрашиваться и истекают по
+TTL. Ключ начинается с ``schema_token()``: после деплоя с другим набором
+полей сериализатора (или увеличенным ``PAYLOAD_VERSION``) общий кеш не
+отдает представления старой схемы. Страница списка собирается одним ``get_many``, сериализуются только
+промахи — скомпилированным ``OrderReadSerializer`` (``core.compiled``) из
+строк ``values()``, без создания моделей.
+"""
+import functools
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from core.compiled import compile_serializer
+from .serializers import OrderReadSerializer
+
+
+# Увеличить, если вывод меняется без изменения колонок (формат полей, вычисляемые значения).
+PAYLOAD_VERSION = 1
+
+
+@functools.cache
+def schema_token():
+    lookups = ','.join(compile_serializer(OrderReadSerializer).lookups)
+    return hashlib.blake2b(f'{PAYLOAD_VERSION}:{lookups}'.encode(), digest_size=6).hexdigest()
+
+
+def cache_key(row):
+    return (
+        f'orders:payload:{schema_token()}:{row["id"]}:{row["version"]}:{row["created_at"].timestamp():.6f}'
+    )
+
+
+def rows(queryset):
+    """Строки для ``serialize``: колонки сериализатора и версия."""
+    return queryset.values(*compile_serializer(OrderReadSerializer).lookups, 'version')
+
+
+class PayloadStats:
+    """Счетчики попаданий кеша в процессе."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def record(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def snapshot(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else None,
+            }
+
+
+stats = PayloadStats()
+
+
+def _cache():
+    return caches[settings.ORDER_PAYLOAD_CACHE]
+
+
+def serialize(rows):
+    """Представления заказов из строк ``rows()`` в их порядке: из кеша или сериализованные заново."""
+    rows = list(rows)
+    if not rows:
+        return []
+    keys = [cache_key(row) for row in rows]
+    cache = _cache()
+    cached = cache.get_many(keys)
+
+    missing = [(key, row) for key, row in zip(keys, rows) if key not in cached]
+    if missing:
+        data = compile_serializer(OrderReadSerializer).data(row for _, row in missing)
+        fresh = {key: item for (key, _), item in zip(missing, data)}
+        cache.set_many(fresh, settings.ORDER_PAYLOAD_CACHE_TIMEOUT)
+        cached.update(fresh)
+    stats.record(hits=len(rows) - len(missing), misses=len(missing))
+    return [cached[key] for key in keys]
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 
+from core import pricing
 from locations.models import Location
 from .models import Order, CargoType
 
@@ -50,6 +51,26 @@ class OrderReadSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class NearbyOrderSerializer(OrderReadSerializer):
+    distance_to_departure_km = serializers.FloatField(read_only=True)
+
+    class Meta(OrderReadSerializer.Meta):
+        fields = OrderReadSerializer.Meta.fields + ('distance_to_departure_km',)
+        read_only_fields = fields
+
+
+class NearbyQuerySerializer(serializers.Serializer):
+    latitude = serializers.DecimalField(max_digits=9, decimal_places=6, min_value=-90, max_value=90, required=False)
+    longitude = serializers.DecimalField(max_digits=9, decimal_places=6, min_value=-180, max_value=180, required=False)
+    radius_km = serializers.FloatField(min_value=0.1, max_value=500, default=50)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+    def validate(self, attrs):
+        if ('latitude' in attrs) != ('longitude' in attrs):
+            raise serializers.ValidationError('Укажите широту и долготу вместе')
+        return attrs
+
+
 class OrderWriteSerializer(serializers.ModelSerializer):
     cargo_type = serializers.PrimaryKeyRelatedField(
         queryset=CargoType.objects.all(), allow_null=True, required=False
@@ -81,7 +102,50 @@ class OrderWriteSerializer(serializers.ModelSerializer):
             'accepted_at',
             'delivered_at',
         )
+        # Статус, водитель и время переходов меняются только действиями
+        # accept/start/deliver/cancel (cargo.workflow).
         read_only_fields = (
+            'distance_km',
+            'estimated_time_hours',
+            'total_cost',
+            'status',
+            'driver',
             'accepted_at',
             'delivered_at',
         )
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if self.instance is not None and not {'departure_point', 'destination_point', 'weight'} & attrs.keys():
+            return attrs
+        departure = attrs.get('departure_point', getattr(self.instance, 'departure_point', None))
+        destination = attrs.get('destination_point', getattr(self.instance, 'destination_point', None))
+        weight = attrs.get('weight', getattr(self.instance, 'weight', None))
+        # Расстояние, время и стоимость считает сервер по тарифу, а не клиент.
+        attrs.update(pricing.quote(departure, destination, weight).as_fields())
+        return attrs
+
+
+class BulkOrderItemSerializer(serializers.ModelSerializer):
+    """
+    Заказ в массовом создании. Связи принимаются как id и проверяются
+    пачкой в ``cargo.bulk``, а не запросом на каждую строку.
+    """
+
+    cargo_type = serializers.IntegerField(allow_null=True, required=False)
+    departure_point = serializers.IntegerField()
+    destination_point = serializers.IntegerField()
+
+    class Meta:
+        model = Order
+        fields = (
+            'cargo_type',
+            'departure_point',
+            'destination_point',
+            'weight',
+            'length',
+            'width',
+            'height',
+            'description',
+            'is_driver_sharing_location',
+        )
@@ -0,0 +1,43 @@
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from core import realtime
+from locations.models import Location
+from users.models import User
+from .models import CargoType, Order
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_loaded_status', None)
+    instance._loaded_status = instance.status
+    if created or previous == instance.status:
+        return
+    payload = instance.event_payload()
+    transaction.on_commit(
+        lambda: realtime.publish(realtime.order_channel(payload['id']), 'order.status', payload)
+    )
+
+
+
+@receiver(post_save, sender=Location)
+def location_saved(sender, instance, created, **kwargs):
+    # Город и координаты входят в представление заказа (cargo.payloads).
+    if not created:
+        Order.objects.filter(Q(departure_point_id=instance.pk) | Q(destination_point_id=instance.pk)).touch()
+
+
+@receiver(post_save, sender=CargoType)
+@receiver(pre_delete, sender=CargoType)
+def cargo_type_changed(sender, instance, created=False, **kwargs):
+    # pre_delete: после удаления SET_NULL уже не найти затронутые заказы.
+    if not created:
+        Order.objects.filter(cargo_type_id=instance.pk).touch()
+
+
+@receiver(pre_delete, sender=User)
+def driver_deleted(sender, instance, **kwargs):
+    # Order.driver — SET_NULL, и его UPDATE идет в обход OrderQuerySet.update.
+    Order.objects.filter(driver_id=instance.pk).touch()
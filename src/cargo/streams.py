@@ -0,0 +1,96 @@
+"""SSE-поток событий заказа для ASGI."""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from core import realtime, replicas
+from .models import Order
+
+FINAL_STATUSES = (Order.Status.DELIVERED, Order.Status.CANCELLED)
+
+
+def _token_user(request):
+    """Пользователь из заголовка Authorization или параметра ``access_token`` (EventSource не умеет заголовки)."""
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if raw_token is None and request.GET.get('access_token'):
+        raw_token = request.GET['access_token'].encode()
+    if raw_token is None:
+        return None
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def _visible_order(user, pk):
+    return Order.objects.for_user(user).filter(pk=pk).first()
+
+
+def _format(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+def _snapshot(pk):
+    # Из основной базы: отстающая реплика вернула бы статус старше уже пришедших событий.
+    with replicas.primary():
+        return Order.objects.filter(pk=pk).first()
+
+
+async def _event_stream(order_id):
+    # Сначала подписка, потом снимок: смена статуса между чтением заказа и
+    # подпиской иначе потерялась бы. Событие, попавшее и в снимок, и в
+    # очередь, придет дважды — клиент просто применит тот же статус.
+    subscription = realtime.get_broker().subscribe([realtime.order_channel(order_id)])
+    try:
+        order = await sync_to_async(_snapshot)(order_id)
+        if order is None:
+            return
+        if order.is_driver_sharing_location and order.driver_id:
+            subscription.add(realtime.driver_channel(order.driver_id))
+        yield 'retry: 5000\n\n'
+        yield _format('order.status', order.event_payload())
+        if order.status in FINAL_STATUSES:
+            return
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.get(), settings.REALTIME_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            data = message['data']
+            if message['event'] == 'order.status' and data['is_driver_sharing_location'] and data['driver']:
+                # Подписываемся до отправки события: генератор остановится на yield.
+                subscription.add(realtime.driver_channel(data['driver']))
+            yield _format(message['event'], data)
+            if message['event'] == 'order.status' and data['status'] in FINAL_STATUSES:
+                return
+    finally:
+        subscription.close()
+
+
+async def order_events(request, pk):
+    """
+    Поток Server-Sent Events по заказу: ``order.status`` при смене статуса и
+    ``driver.location`` при движении водителя, если он делится геолокацией.
+    Доступен отправителю, назначенному водителю и администратору.
+    """
+    user = await sync_to_async(_token_user)(request)
+    if user is None:
+        user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'detail': 'Учетные данные не были предоставлены.'}, status=401)
+    order = await sync_to_async(_visible_order)(user, pk)
+    if order is None:
+        return JsonResponse({'detail': 'Не найдено.'}, status=404)
+
+    response = StreamingHttpResponse(_event_stream(order.pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,11 +1,36 @@
+import asyncio
+import csv
+import io
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django import db
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 
-from users.models import User
+from core import pricing, realtime
+from core.models import TariffSettings
+from locations.routes import route_cache
+from users.models import DriverLocation, User
+from users.serializers import CustomTokenObtainPairSerializer
 from locations.models import Location
+from notifications.models import Notification
+from . import payloads, workflow
+from .filters import OpenOrderFilter
+from .management.commands._seed import seed_orders, seed_users
 from .models import Order, CargoType
+from .serializers import LocationSerializer, OrderReadSerializer
 
 
 class CargoRequestViewSetTests(APITestCase):
@@ -66,6 +91,33 @@ class CargoRequestViewSetTests(APITestCase):
         self.assertEqual(order.sender, self.sender)
         self.assertEqual(order.weight, 150)
 
+    def test_order_cost_is_calculated_by_server(self):
+        TariffSettings.objects.create(price_per_km='100.00', base_fee='1000.00')
+        pricing.invalidate_tariff_cache()
+        self.addCleanup(pricing.invalidate_tariff_cache)
+        route_cache.clear()
+        self.departure.latitude, self.departure.longitude = '43.238949', '76.889709'
+        self.departure.save()
+        self.destination.latitude, self.destination.longitude = '51.169392', '71.449074'
+        self.destination.save()
+
+        self.client.force_authenticate(self.sender)
+        payload = {
+            'departure_point': self.departure.id,
+            'destination_point': self.destination.id,
+            'weight': 150,
+            'total_cost': '1.00',
+            'distance_km': '1.00',
+        }
+        response = self.client.post(self.list_url, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        order = Order.objects.get()
+        expected = pricing.quote(self.departure, self.destination, order.weight)
+        self.assertEqual(order.distance_km, expected.distance_km)
+        self.assertEqual(order.total_cost, expected.total_cost)
+        self.assertGreater(order.estimated_time_hours, 0)
+
     def test_sender_sees_only_own_orders(self):
         own_order = self._create_order(sender=self.sender)
         other_sender = User.objects.create_user(
@@ -143,21 +195,28 @@ class CargoRequestViewSetTests(APITestCase):
 
     def test_driver_can_mark_order_delivered(self):
         order = self._create_order(sender=self.sender, driver=self.driver, status=Order.Status.IN_PROGRESS)
-        url = reverse('cargo:cargo-request-detail', args=[order.id])
+        url = reverse('cargo:cargo-request-deliver', args=[order.id])
 
         self.client.force_authenticate(self.driver)
+        response = self.client.post(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.Status.DELIVERED)
+        self.assertIsNotNone(order.delivered_at)
+
+    def test_status_and_driver_are_not_writable(self):
+        order = self._create_order(sender=self.sender)
+        url = reverse('cargo:cargo-request-detail', args=[order.id])
+
+        self.client.force_authenticate(self.sender)
         response = self.client.patch(
-            url,
-            {
-                'status': Order.Status.DELIVERED,
-                'delivered_at': timezone.now().isoformat()
-            },
-            format='json'
+            url, {'status': Order.Status.DELIVERED, 'driver': self.driver.id}, format='json'
         )
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         order.refresh_from_db()
-        self.assertEqual(order.status, Order.Status.DELIVERED)
+        self.assertEqual((order.status, order.driver_id), (Order.Status.PENDING, None))
 
     def test_driver_cannot_create_order(self):
         self.client.force_authenticate(self.driver)
@@ -168,3 +227,794 @@ class CargoRequestViewSetTests(APITestCase):
         }
         response = self.client.post(self.list_url, payload, format='json')
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class OrderWorkflowTests(APITestCase):
+    def setUp(self):
+        self.sender = User.objects.create(username='+70000000001', phone_number='+70000000001')
+        self.driver = User.objects.create(
+            username='+70000000002', phone_number='+70000000002',
+            role=User.Role.DRIVER, is_subscription_active=True,
+        )
+        self.other_driver = User.objects.create(
+            username='+70000000003', phone_number='+70000000003',
+            role=User.Role.DRIVER, is_subscription_active=True,
+        )
+        location = Location.objects.create(city_name='Алматы')
+        self.order = Order.objects.create(
+            sender=self.sender, departure_point=location, destination_point=location, weight=10
+        )
+
+    def _post(self, user, name):
+        self.client.force_authenticate(user)
+        return self.client.post(reverse(f'cargo:cargo-request-{name}', args=[self.order.pk]))
+
+    def test_full_lifecycle_sets_timestamps_and_notifies_sender(self):
+        with patch('core.realtime.publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            response = self._post(self.driver, 'accept')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['status'], response.data['driver']), ('ACCEPTED', self.driver.pk))
+        self.assertIsNotNone(response.data['accepted_at'])
+        publish.assert_called_once()
+        self.assertEqual(publish.call_args.args[2]['status'], 'ACCEPTED')
+
+        self.assertEqual(self._post(self.driver, 'start').data['status'], 'IN_PROGRESS')
+        response = self._post(self.driver, 'deliver')
+        self.assertEqual(response.data['status'], 'DELIVERED')
+        self.assertIsNotNone(response.data['delivered_at'])
+        self.assertEqual(
+            list(Notification.objects.filter(user=self.sender).values_list('type', flat=True).order_by('pk')),
+            [Notification.Type.ORDER_ACCEPTED, Notification.Type.ORDER_DELIVERED],
+        )
+
+    def test_accept_is_a_single_conditional_update(self):
+        self.client.force_authenticate(self.driver)
+        url = reverse('cargo:cargo-request-accept', args=[self.order.pk])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(url)
+
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"status" IN', updates[0])
+        self.assertFalse(any('FOR UPDATE' in q['sql'] for q in queries.captured_queries))
+
+    def test_second_accept_conflicts(self):
+        self.assertEqual(self._post(self.driver, 'accept').status_code, status.HTTP_200_OK)
+
+        response = self._post(self.other_driver, 'accept')
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['status'], Order.Status.ACCEPTED)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.driver_id, self.driver.pk)
+
+    def test_only_assigned_driver_moves_order(self):
+        self._post(self.driver, 'accept')
+        self.assertEqual(self._post(self.other_driver, 'deliver').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self._post(self.driver, 'accept').status_code, status.HTTP_409_CONFLICT)
+
+    def test_accept_requires_subscribed_driver(self):
+        User.objects.filter(pk=self.driver.pk).update(is_subscription_active=False)
+        self.driver.refresh_from_db()
+        self.assertEqual(self._post(self.driver, 'accept').status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self._post(self.sender, 'accept').status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_accept_checks_current_subscription_not_token(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.driver).access_token
+        # Флаг снят в обход сигналов: ни claims, ни кеш состояния об этом не знают.
+        User.objects.filter(pk=self.driver.pk).update(is_subscription_active=False)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.post(reverse('cargo:cargo-request-accept', args=[self.order.pk]))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.order.refresh_from_db()
+        self.assertIsNone(self.order.driver_id)
+
+    def test_cancel_by_sender_until_in_progress(self):
+        self.assertEqual(self._post(self.driver, 'cancel').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self._post(self.sender, 'cancel').data['status'], 'CANCELLED')
+        self.assertEqual(self._post(self.driver, 'accept').status_code, status.HTTP_409_CONFLICT)
+
+
+class OrderAcceptRaceTests(TransactionTestCase):
+    DRIVERS = 8
+
+    def setUp(self):
+        sender = User.objects.create(username='+70000000001', phone_number='+70000000001')
+        self.drivers = [
+            User.objects.create(
+                username=f'+7700000010{index}', phone_number=f'+7700000010{index}',
+                role=User.Role.DRIVER, is_subscription_active=True,
+            )
+            for index in range(self.DRIVERS)
+        ]
+        location = Location.objects.create(city_name='Алматы')
+        self.order = Order.objects.create(sender=sender, departure_point=location, destination_point=location, weight=10)
+
+    def test_exactly_one_parallel_accept_wins(self):
+        barrier = threading.Barrier(self.DRIVERS)
+
+        def accept(driver):
+            barrier.wait()
+            try:
+                while True:
+                    try:
+                        return workflow.apply('accept', self.order.pk, driver).driver_id
+                    except workflow.TransitionConflict:
+                        return None
+                    except db.OperationalError as error:
+                        # Тестовая SQLite в памяти с общим кешем не ждет блокировку
+                        # таблицы, а сразу отвечает ошибкой; повтор заменяет ожидание.
+                        if 'locked' not in str(error):
+                            raise
+            finally:
+                db.connections.close_all()
+
+        with ThreadPoolExecutor(self.DRIVERS) as pool:
+            winners = [driver_id for driver_id in pool.map(accept, self.drivers) if driver_id]
+
+        self.assertEqual(len(winners), 1)
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertEqual((order.status, order.driver_id), (Order.Status.ACCEPTED, winners[0]))
+        self.assertIsNotNone(order.accepted_at)
+        self.assertEqual(Notification.objects.filter(order=order).count(), 1)
+
+
+class CargoRequestQueryBudgetTests(APITestCase):
+    """Количество запросов list/retrieve не должно зависеть от числа заказов."""
+
+    LIST_QUERY_BUDGET = 1  # keyset-пагинация: один SELECT страницы с JOIN-ами, без COUNT
+    RETRIEVE_QUERY_BUDGET = 1
+
+    def setUp(self):
+        self.sender = User.objects.create_user(
+            username='+70000000001',
+            phone_number='+70000000001',
+            password='StrongPass123!',
+            role=User.Role.SENDER,
+            email='sender@example.com'
+        )
+        self.list_url = reverse('cargo:cargo-request-list')
+
+    def _create_orders(self, count):
+        orders = []
+        for index in range(count):
+            cargo_type = CargoType.objects.create(name=f'Тип {index}')
+            departure = Location.objects.create(city_name=f'Город {index}', latitude='43.238949', longitude='76.889709')
+            destination = Location.objects.create(city_name=f'Пункт {index}')
+            orders.append(Order(
+                sender=self.sender,
+                departure_point=departure,
+                destination_point=destination,
+                cargo_type=cargo_type if index % 2 else None,
+                weight=100 + index,
+            ))
+        return Order.objects.bulk_create(orders)
+
+    def test_list_query_count_is_constant(self):
+        self.client.force_authenticate(self.sender)
+        self._create_orders(45)
+        for page_size in (1, 5, 20, 45):
+            with self.subTest(page_size=page_size):
+                with self.assertNumQueries(self.LIST_QUERY_BUDGET):
+                    response = self.client.get(self.list_url, {'page_size': page_size})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(len(response.data['results']), page_size)
+
+    def test_bearer_token_list_does_not_load_user(self):
+        self._create_orders(3)
+        token = CustomTokenObtainPairSerializer.get_token(self.sender).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        with self.assertNumQueries(self.LIST_QUERY_BUDGET):
+            response = self.client.get(self.list_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_bearer_token_create_uses_claims(self):
+        departure = Location.objects.create(city_name='Алматы', latitude='43.238949', longitude='76.889709')
+        destination = Location.objects.create(city_name='Астана', latitude='51.169392', longitude='71.449074')
+        token = CustomTokenObtainPairSerializer.get_token(self.sender).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        response = self.client.post(
+            self.list_url, {'departure_point': departure.pk, 'destination_point': destination.pk, 'weight': 10}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.get().sender, self.sender)
+
+    def test_retrieve_query_count(self):
+        order = self._create_orders(1)[0]
+        self.client.force_authenticate(self.sender)
+        url = reverse('cargo:cargo-request-detail', args=[order.id])
+        with self.assertNumQueries(self.RETRIEVE_QUERY_BUDGET):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['departure_point']['city_name'], 'Город 0')
+        self.assertIsNone(response.data['cargo_type'])
+
+    def test_read_queryset_loads_all_serialized_columns(self):
+        self._create_orders(1)
+        queryset = Order.objects.for_user(self.sender).for_read()
+        order = queryset.get()
+        self.assertFalse(order.get_deferred_fields() & set(OrderReadSerializer.Meta.fields))
+        self.assertFalse(order.departure_point.get_deferred_fields() & set(LocationSerializer.Meta.fields))
+        self.assertIn('geohash', order.departure_point.get_deferred_fields())
+
+
+class CargoRequestCursorPaginationTests(APITestCase):
+    def setUp(self):
+        self.sender = User.objects.create_user(
+            username='+70000000001',
+            phone_number='+70000000001',
+            password='StrongPass123!',
+            role=User.Role.SENDER,
+            email='sender@example.com'
+        )
+        departure = Location.objects.create(city_name='Алматы')
+        destination = Location.objects.create(city_name='Астана')
+        self.orders = Order.objects.bulk_create(
+            Order(sender=self.sender, departure_point=departure, destination_point=destination, weight=10)
+            for _ in range(7)
+        )
+        self.list_url = reverse('cargo:cargo-request-list')
+
+    def test_pages_cover_all_orders_without_count(self):
+        self.client.force_authenticate(self.sender)
+        seen = []
+        response = self.client.get(self.list_url, {'page_size': 3})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            seen.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+
+        expected = list(
+            Order.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_cursor_is_stable_when_new_orders_arrive(self):
+        self.client.force_authenticate(self.sender)
+        first_page = self.client.get(self.list_url, {'page_size': 3})
+        self._add_newer_order()
+        second_page = self.client.get(first_page.data['next'])
+
+        first_ids = [item['id'] for item in first_page.data['results']]
+        second_ids = [item['id'] for item in second_page.data['results']]
+        self.assertFalse(set(first_ids) & set(second_ids))
+
+    def _add_newer_order(self):
+        order = self.orders[0]
+        Order.objects.create(
+            sender=self.sender,
+            departure_point=order.departure_point,
+            destination_point=order.destination_point,
+            weight=10,
+        )
+
+
+@override_settings(NOTIFICATION_DISPATCH_ASYNC=False)
+class BulkOrderCreateTests(APITestCase):
+    def setUp(self):
+        route_cache.clear()
+        pricing.invalidate_tariff_cache()
+        TariffSettings.objects.create(price_per_km='100.00', base_fee='500.00')
+        self.sender = User.objects.create(username='+70000000001', phone_number='+70000000001')
+        self.almaty = Location.objects.create(city_name='Алматы', latitude='43.238949', longitude='76.889709')
+        self.astana = Location.objects.create(city_name='Астана', latitude='51.169392', longitude='71.449074')
+        self.cargo_type = CargoType.objects.create(name='Документы')
+        self.url = reverse('cargo:cargo-request-bulk-create')
+        self.client.force_authenticate(self.sender)
+
+    def _items(self, count):
+        return [
+            {
+                'departure_point': self.almaty.pk,
+                'destination_point': self.astana.pk,
+                'cargo_type': self.cargo_type.pk,
+                'weight': 100 + index,
+            }
+            for index in range(count)
+        ]
+
+    def test_creates_priced_orders(self):
+        response = self.client.post(self.url, self._items(3), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+        orders = Order.objects.filter(pk__in=response.data['ids']).order_by('pk')
+        single = pricing.quote(self.almaty, self.astana, 100)
+        self.assertEqual([order.weight for order in orders], [100, 101, 102])
+        self.assertEqual(
+            {(order.sender_id, order.distance_km, order.total_cost) for order in orders},
+            {(self.sender.pk, single.distance_km, single.total_cost)},
+        )
+
+    def test_select_count_does_not_depend_on_item_count(self):
+        self.client.post(self.url, self._items(1), format='json')  # прогрев тарифа и маршрутов
+
+        def selects(count):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.url, self._items(count), format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return [q['sql'] for q in queries.captured_queries if q['sql'].startswith('SELECT')]
+
+        few, many = selects(2), selects(300)
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(len(many), 2)  # in_bulk локаций и типов груза
+
+    def test_item_errors_reject_whole_batch(self):
+        items = self._items(3)
+        items[0]['weight'] = 'много'
+        items[2]['destination_point'] = 999
+        items[2]['cargo_type'] = 998
+
+        response = self.client.post(self.url, items, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error['index'] for error in response.data['errors']], [0])
+        self.assertIn('weight', response.data['errors'][0]['errors'])
+        self.assertFalse(Order.objects.exists())
+
+        items[0]['weight'] = 10
+        response = self.client.post(self.url, items, format='json')
+        self.assertEqual(response.data['errors'], [{
+            'index': 2,
+            'errors': {
+                'destination_point': ['Недопустимый первичный ключ "999" - объект не существует.'],
+                'cargo_type': ['Недопустимый первичный ключ "998" - объект не существует.'],
+            },
+        }])
+        self.assertFalse(Order.objects.exists())
+
+    def test_payload_must_be_bounded_list(self):
+        self.assertEqual(self.client.post(self.url, {}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        with override_settings(CARGO_BULK_CREATE_MAX_ITEMS=2):
+            response = self.client.post(self.url, self._items(3), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_drivers_are_notified_and_only_senders_may_post(self):
+        User.objects.create(
+            username='+70000000002', phone_number='+70000000002',
+            role=User.Role.DRIVER, is_subscription_active=True,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, self._items(2), format='json')
+        self.assertEqual(Notification.objects.filter(type=Notification.Type.NEW_ORDER).count(), 2)
+
+        self.client.force_authenticate(User.objects.get(phone_number='+70000000002'))
+        response = self.client.post(self.url, self._items(1), format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class OrderExportTests(APITestCase):
+    def setUp(self):
+        self.sender = User.objects.create(username='+70000000001', phone_number='+70000000001')
+        self.other = User.objects.create(username='+70000000002', phone_number='+70000000002')
+        self.admin = User.objects.create(
+            username='+70000000003', phone_number='+70000000003', role=User.Role.ADMIN, is_staff=True
+        )
+        self.almaty = Location.objects.create(city_name='Алматы')
+        self.astana = Location.objects.create(city_name='Астана')
+        self.cargo_type = CargoType.objects.create(name='Документы, мелкие')
+        self.url = reverse('cargo:cargo-request-export')
+
+    def _order(self, sender, **kwargs):
+        return Order.objects.create(
+            sender=sender, departure_point=self.almaty, destination_point=self.astana,
+            cargo_type=self.cargo_type, weight='120.50', total_cost='1500.00', **kwargs
+        )
+
+    def _export(self, user, **params):
+        self.client.force_authenticate(user)
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_export_streams_own_orders(self):
+        own = [self._order(self.sender) for _ in range(3)]
+        self._order(self.other)
+
+        with override_settings(ORDER_EXPORT_CHUNK_SIZE=2):
+            response, body = self._export(self.sender)
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="orders-', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([int(row['id']) for row in rows], [order.pk for order in own])
+        self.assertEqual(rows[0]['cargo_type'], 'Документы, мелкие')
+        self.assertEqual((rows[0]['weight'], rows[0]['driver']), ('120.50', ''))
+        self.assertEqual(rows[0]['created_at'], OrderReadSerializer(own[0]).data['created_at'])
+
+    def test_csv_export_escapes_formulas(self):
+        self.almaty.city_name = '=HYPERLINK("http://evil")'
+        self.almaty.save()
+        self.cargo_type.name = '@SUM(A1)'
+        self.cargo_type.save()
+        self._order(self.sender)
+
+        _, body = self._export(self.sender)
+        row = next(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(
+            (row['departure_city'], row['cargo_type'], row['destination_city']),
+            ('\'=HYPERLINK("http://evil")', "'@SUM(A1)", 'Астана'),
+        )
+
+        _, body = self._export(self.sender, export_format='jsonl')
+        self.assertEqual(json.loads(body)['cargo_type'], '@SUM(A1)')
+
+    def test_jsonl_export_with_filters(self):
+        self._order(self.sender)
+        delivered = self._order(self.other, status=Order.Status.DELIVERED)
+
+        _, body = self._export(self.admin, export_format='jsonl', status='DELIVERED')
+
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0]['id'], delivered.pk)
+        self.assertEqual((lines[0]['total_cost'], lines[0]['departure_city']), ('1500.00', 'Алматы'))
+
+    def test_export_reads_rows_in_chunks(self):
+        for _ in range(5):
+            self._order(self.sender)
+        with override_settings(ORDER_EXPORT_CHUNK_SIZE=2), self.assertNumQueries(1):
+            response, body = self._export(self.sender)
+        self.assertEqual(len(body.splitlines()), 6)
+
+    def test_export_access_and_format(self):
+        driver = User.objects.create(username='+70000000004', phone_number='+70000000004', role=User.Role.DRIVER)
+        self.client.force_authenticate(driver)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(self.sender)
+        self.assertEqual(self.client.get(self.url, {'export_format': 'xml'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_command(self):
+        order = self._order(self.sender)
+        self._order(self.other)
+        out = StringIO()
+
+        call_command('export_orders', export_format='jsonl', sender=self.sender.pk, stdout=out)
+
+        self.assertEqual([json.loads(line)['id'] for line in out.getvalue().splitlines()], [order.pk])
+
+
+class OpenOrderFeedTests(APITestCase):
+    def setUp(self):
+        self.sender = User.objects.create(username='+70000000001', phone_number='+70000000001')
+        self.driver = User.objects.create(
+            username='+70000000002', phone_number='+70000000002',
+            role=User.Role.DRIVER, vehicle_capacity=500,
+        )
+        self.almaty = Location.objects.create(city_name='Алматы')
+        self.astana = Location.objects.create(city_name='Астана')
+        self.documents = CargoType.objects.create(name='Документы')
+        self.furniture = CargoType.objects.create(name='Мебель')
+        self.url = reverse('cargo:cargo-request-feed')
+        self.client.force_authenticate(self.driver)
+
+    def _order(self, departure=None, destination=None, cargo_type=None, weight=100, **kwargs):
+        return Order.objects.create(
+            sender=self.sender,
+            departure_point=departure or self.almaty,
+            destination_point=destination or self.astana,
+            cargo_type=cargo_type or self.documents,
+            weight=weight,
+            **kwargs
+        )
+
+    def _ids(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['results']]
+
+    def test_feed_lists_only_open_orders_newest_first(self):
+        first, second = self._order(), self._order()
+        self._order(driver=self.driver, status=Order.Status.ACCEPTED)
+        self._order(status=Order.Status.CANCELLED)
+
+        self.assertEqual(self._ids(), [second.pk, first.pk])
+
+    def test_filters(self):
+        documents = self._order(weight=100)
+        furniture = self._order(cargo_type=self.furniture, weight=900)
+        backwards = self._order(departure=self.astana, destination=self.almaty, weight=300)
+
+        self.assertEqual(self._ids(cargo_type=self.furniture.pk), [furniture.pk])
+        self.assertEqual(self._ids(departure_city='Астана'), [backwards.pk])
+        self.assertEqual(self._ids(destination_city='Астана'), [furniture.pk, documents.pk])
+        self.assertEqual(
+            self._ids(departure_point=self.almaty.pk, destination_point=self.astana.pk),
+            [furniture.pk, documents.pk],
+        )
+        self.assertEqual(self._ids(max_weight=300), [backwards.pk, documents.pk])
+        self.assertEqual(self._ids(fits_vehicle='true'), [backwards.pk, documents.pk])
+
+    def test_date_filters(self):
+        old = self._order()
+        Order.objects.filter(pk=old.pk).update(created_at=timezone.now() - timezone.timedelta(days=3))
+        fresh = self._order()
+        since = (timezone.now() - timezone.timedelta(days=1)).isoformat()
+
+        self.assertEqual(self._ids(created_after=since), [fresh.pk])
+        self.assertEqual(self._ids(created_before=since), [old.pk])
+
+    def test_feed_is_for_drivers(self):
+        self.client.force_authenticate(self.sender)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_queries_use_partial_indexes(self):
+        # Распределение как в рабочей базе: большинство заказов уже назначены, маршрутов много.
+        drivers = seed_users(20, User.Role.DRIVER, '+7701')
+        locations = Location.objects.bulk_create(Location(city_name=f'Город {index}') for index in range(30))
+        seed_orders(
+            2000, senders=[self.sender], drivers=drivers, locations=locations,
+            cargo_types=[self.documents, self.furniture],
+            statuses=(Order.Status.PENDING, Order.Status.DELIVERED, Order.Status.DELIVERED, Order.Status.ACCEPTED),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        feed = Order.objects.open().order_by('-created_at', '-id')
+        plans = {
+            'cargo_order_driver__ca7d4f_idx': feed,
+            'cargo_open_type_idx': feed.filter(cargo_type_id=self.documents.pk),
+            'cargo_open_route_idx': feed.filter(departure_point_id=self.almaty.pk, destination_point_id=self.astana.pk),
+            'cargo_open_destination_idx': feed.filter(destination_point_id=self.astana.pk),
+        }
+        for index, queryset in plans.items():
+            with self.subTest(index=index):
+                plan = queryset.explain()
+                self.assertRegex(plan, rf'SEARCH cargo_order USING INDEX {index}')
+                self.assertNotIn('TEMP B-TREE', plan)
+
+        filterset = OpenOrderFilter({'departure_city': 'Алматы', 'destination_city': 'Астана'}, queryset=feed)
+        self.assertIn('USING INDEX cargo_open_route_idx', filterset.qs.explain())
+
+
+class CargoNearbyTests(APITestCase):
+    def setUp(self):
+        self.sender = User.objects.create_user(
+            username='+70000000001',
+            phone_number='+70000000001',
+            password='StrongPass123!',
+            role=User.Role.SENDER,
+            email='sender@example.com'
+        )
+        self.driver = User.objects.create_user(
+            username='+70000000002',
+            phone_number='+70000000002',
+            password='StrongPass123!',
+            role=User.Role.DRIVER,
+            email='driver@example.com'
+        )
+        self.almaty = Location.objects.create(city_name='Алматы', latitude='43.238949', longitude='76.889709')
+        self.kaskelen = Location.objects.create(city_name='Каскелен', latitude='43.200000', longitude='76.620000')
+        self.astana = Location.objects.create(city_name='Астана', latitude='51.169392', longitude='71.449074')
+        self.url = reverse('cargo:cargo-request-nearby')
+
+    def _create_order(self, departure, **kwargs):
+        return Order.objects.create(
+            sender=self.sender,
+            departure_point=departure,
+            destination_point=self.astana,
+            weight=100,
+            **kwargs
+        )
+
+    def test_location_geohash_follows_coordinates(self):
+        self.assertTrue(self.almaty.geohash.startswith('txwt'))
+        self.almaty.latitude, self.almaty.longitude = '51.169392', '71.449074'
+        self.almaty.save(update_fields=['latitude', 'longitude'])
+        self.almaty.refresh_from_db()
+        self.assertEqual(self.almaty.geohash, self.astana.geohash)
+
+    def test_driver_finds_pending_orders_within_radius(self):
+        near = self._create_order(self.almaty)
+        suburb = self._create_order(self.kaskelen)
+        self._create_order(self.astana)
+        self._create_order(self.almaty, driver=self.driver, status=Order.Status.ACCEPTED)
+        DriverLocation.objects.create(driver=self.driver, latitude='43.250000', longitude='76.900000')
+
+        self.client.force_authenticate(self.driver)
+        response = self.client.get(self.url, {'radius_km': 50})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [item['id'] for item in response.data['results']]
+        self.assertEqual(ids, [near.id, suburb.id])
+        self.assertLess(response.data['results'][0]['distance_to_departure_km'], 2)
+
+    def test_radius_is_checked_exactly(self):
+        self._create_order(self.kaskelen)
+        self.client.force_authenticate(self.driver)
+
+        response = self.client.get(self.url, {'latitude': '43.238949', 'longitude': '76.889709', 'radius_km': 10})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [])
+
+    def test_candidates_are_prefiltered_by_geohash(self):
+        queryset = Order.objects.open().departing_near(43.238949, 76.889709, 50)
+        self.assertIn('geohash', str(queryset.query))
+
+    def test_driver_without_position_must_pass_coordinates(self):
+        self.client.force_authenticate(self.driver)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sender_cannot_search_nearby(self):
+        self.client.force_authenticate(self.sender)
+        response = self.client.get(self.url, {'latitude': '43.2', 'longitude': '76.9'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class OrderEventStreamTests(TransactionTestCase):
+    def setUp(self):
+        self.sender = User.objects.create(username='+70000000001', phone_number='+70000000001')
+        self.driver = User.objects.create(
+            username='+70000000002', phone_number='+70000000002', role=User.Role.DRIVER
+        )
+        location = Location.objects.create(city_name='Алматы')
+        self.order = Order.objects.create(
+            sender=self.sender, departure_point=location, destination_point=location,
+            weight=10, is_driver_sharing_location=True,
+        )
+        self.url = reverse('cargo:cargo-request-events', args=[self.order.pk])
+
+    async def _next_event(self, stream):
+        chunk = await asyncio.wait_for(anext(stream), 2)
+        lines = dict(line.split(': ', 1) for line in chunk.decode().strip().splitlines())
+        return lines['event'], json.loads(lines['data'])
+
+    async def test_stream_pushes_status_and_driver_position(self):
+        token = str(AccessToken.for_user(self.sender))
+        response = await self.async_client.get(self.url, {'access_token': token})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+        event, data = await self._next_event(stream)
+        self.assertEqual((event, data['status']), ('order.status', Order.Status.PENDING))
+
+        def accept():
+            order = Order.objects.get(pk=self.order.pk)
+            order.driver, order.status = self.driver, Order.Status.ACCEPTED
+            order.save()
+
+        await sync_to_async(accept)()
+        event, data = await self._next_event(stream)
+        self.assertEqual((event, data['status'], data['driver']), ('order.status', 'ACCEPTED', self.driver.pk))
+
+        realtime.publish(realtime.driver_channel(self.driver.pk), 'driver.location', {'latitude': 43.2})
+        event, data = await self._next_event(stream)
+        self.assertEqual((event, data), ('driver.location', {'latitude': 43.2}))
+        await stream.aclose()
+
+    async def test_change_before_stream_starts_is_not_lost(self):
+        token = str(AccessToken.for_user(self.sender))
+        response = await self.async_client.get(self.url, {'access_token': token})
+
+        # Заказ принят после проверки доступа, но до первого чтения потока.
+        await Order.objects.filter(pk=self.order.pk).aupdate(driver=self.driver, status=Order.Status.ACCEPTED)
+        stream = aiter(response.streaming_content)
+        await anext(stream)
+        event, data = await self._next_event(stream)
+        self.assertEqual((event, data['status'], data['driver']), ('order.status', 'ACCEPTED', self.driver.pk))
+
+        realtime.publish(realtime.driver_channel(self.driver.pk), 'driver.location', {'latitude': 43.2})
+        self.assertEqual(await self._next_event(stream), ('driver.location', {'latitude': 43.2}))
+        await stream.aclose()
+
+    async def test_stream_requires_access_to_order(self):
+        stranger = await User.objects.acreate(username='+70000000003', phone_number='+70000000003')
+        response = await self.async_client.get(self.url, {'access_token': str(AccessToken.for_user(stranger))})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class OrderPayloadCacheTests(APITestCase):
+    def setUp(self):
+        payloads._cache().clear()
+        payloads.stats.reset()
+        self.sender = User.objects.create(username='+70000000001', phone_number='+70000000001')
+        self.driver = User.objects.create(
+            username='+70000000002', phone_number='+70000000002', role=User.Role.DRIVER
+        )
+        self.admin = User.objects.create(
+            username='+70000000003', phone_number='+70000000003', role=User.Role.ADMIN, is_staff=True
+        )
+        self.almaty = Location.objects.create(city_name='Алматы')
+        self.astana = Location.objects.create(city_name='Астана')
+        self.cargo_type = CargoType.objects.create(name='Документы')
+        self.order = Order.objects.create(
+            sender=self.sender, departure_point=self.almaty, destination_point=self.astana,
+            cargo_type=self.cargo_type, weight=100,
+        )
+        self.list_url = reverse('cargo:cargo-request-list')
+        self.client.force_authenticate(self.sender)
+
+    def _results(self):
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results']
+
+    def test_second_list_is_served_from_cache(self):
+        first = self._results()
+        self.assertEqual(payloads.stats.snapshot(), {'hits': 0, 'misses': 1, 'hit_rate': 0.0})
+
+        with patch('core.compiled.CompiledSerializer.data') as serialize:
+            second = self._results()
+
+        serialize.assert_not_called()
+        self.assertEqual(second, first)
+        self.assertEqual(first[0], OrderReadSerializer(Order.objects.for_read().get()).data)
+        self.assertEqual(payloads.stats.snapshot()['hit_rate'], 0.5)
+
+    def test_schema_change_misses_cache(self):
+        self._results()
+        self.addCleanup(payloads.schema_token.cache_clear)
+        payloads.schema_token.cache_clear()
+        with patch.object(payloads, 'PAYLOAD_VERSION', payloads.PAYLOAD_VERSION + 1):
+            self._results()
+        self.assertEqual(payloads.stats.snapshot()['misses'], 2)
+
+    def test_save_and_update_bump_version(self):
+        self.assertEqual(self.order.version, 1)
+        self.order.weight = 200
+        self.order.save()
+        self.assertEqual(self.order.version, 2)
+        self.assertEqual(self._results()[0]['weight'], '200.00')
+
+        Order.objects.filter(pk=self.order.pk).update(total_cost='999.00')
+        self.assertEqual(self._results()[0]['total_cost'], '999.00')
+
+        workflow.apply('accept', self.order.pk, self.driver)
+        self.assertEqual(self._results()[0]['status'], Order.Status.ACCEPTED)
+        self.assertEqual(Order.objects.get().version, 4)
+
+    def test_location_and_cargo_type_changes_invalidate(self):
+        self._results()
+        self.almaty.city_name = 'Алма-Ата'
+        self.almaty.save()
+        self.assertEqual(self._results()[0]['departure_point']['city_name'], 'Алма-Ата')
+
+        self.cargo_type.name = 'Посылки'
+        self.cargo_type.save()
+        self.assertEqual(self._results()[0]['cargo_type']['name'], 'Посылки')
+
+        self.cargo_type.delete()
+        self.assertIsNone(self._results()[0]['cargo_type'])
+        self.assertEqual(Order.objects.get().version, 4)
+
+    def test_deleting_driver_invalidates(self):
+        workflow.apply('accept', self.order.pk, self.driver)
+        self.assertEqual(self._results()[0]['driver'], self.driver.pk)
+
+        self.driver.delete()
+        self.assertIsNone(self._results()[0]['driver'])
+
+    def test_retrieve_uses_cache(self):
+        url = reverse('cargo:cargo-request-detail', args=[self.order.pk])
+        first = self.client.get(url).data
+        self.assertEqual(self.client.get(url).data, first)
+        self.assertEqual(payloads.stats.snapshot(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_stats_endpoint_is_staff_only(self):
+        url = reverse('cargo:cargo-request-payload-cache')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self._results()
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'hits': 0, 'misses': 1, 'hit_rate': 0.0})
@@ -1,5 +1,7 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 
+from .streams import order_events
 from .views import CargoRequestViewSet
 
 app_name = 'cargo'
@@ -7,4 +9,6 @@ app_name = 'cargo'
 router = DefaultRouter()
 router.register(r'requests', CargoRequestViewSet, basename='cargo-request')
 
-urlpatterns = router.urls
+urlpatterns = [
+    path('requests/<int:pk>/events/', order_events, name='cargo-request-events'),
+] + router.urls
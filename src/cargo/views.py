@@ -1,10 +1,28 @@
-from rest_framework import permissions
-from rest_framework.exceptions import PermissionDenied
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import permissions, status
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
-from users.models import User
+from core.pagination import CreatedAtCursorPagination
+from locations.geo import haversine_km
+from notifications.dispatch import schedule_new_orders
+from users.authentication import ClaimsJWTAuthentication
+from users.models import DriverLocation, User
+from . import bulk, export, payloads, workflow
+from .filters import OpenOrderFilter, OrderExportFilter
 from .models import Order
-from .serializers import OrderReadSerializer, OrderWriteSerializer
+from .serializers import (
+    NearbyOrderSerializer,
+    NearbyQuerySerializer,
+    OrderReadSerializer,
+    OrderWriteSerializer,
+)
 
 
 class CargoRequestViewSet(ModelViewSet):
@@ -13,25 +31,184 @@ class CargoRequestViewSet(ModelViewSet):
     водители — назначенные им, администратор — все.
     """
 
+    # Роль и флаги берутся из claims токена, без запроса пользователя из базы.
+    authentication_classes = [ClaimsJWTAuthentication, SessionAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
+    filterset_class = None  # задается действием feed
 
     def get_queryset(self):
-        user = self.request.user
-        if getattr(user, 'role', None) == User.Role.ADMIN or user.is_staff:
-            return Order.objects.all().order_by('-created_at')
-        if getattr(user, 'role', None) == User.Role.DRIVER:
-            return Order.objects.filter(driver=user).order_by('-created_at')
-        return Order.objects.filter(sender=user).order_by('-created_at')
+        if self.action == 'feed':
+            return Order.objects.open().for_read()
+        if self.action == 'export':
+            return Order.objects.for_user(self.request.user)
+        return (
+            Order.objects.for_user(self.request.user)
+            .for_read()
+            .order_by('-created_at')
+        )
 
     def get_serializer_class(self):
         if self.action in ('create', 'update', 'partial_update'):
             return OrderWriteSerializer
+        if self.action == 'nearby':
+            return NearbyOrderSerializer
         return OrderReadSerializer
 
+    def list(self, request, *args, **kwargs):
+        if self.get_serializer_class() is not OrderReadSerializer:
+            return super().list(request, *args, **kwargs)
+        queryset = payloads.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(payloads.serialize(queryset))
+        return self.get_paginated_response(payloads.serialize(page))
+
+    def retrieve(self, request, *args, **kwargs):
+        queryset = payloads.rows(self.filter_queryset(self.get_queryset()))
+        row = get_object_or_404(queryset, pk=kwargs[self.lookup_url_kwarg or self.lookup_field])
+        self.check_object_permissions(request, row)
+        return Response(payloads.serialize([row])[0])
+
+    @action(detail=False, methods=['get'], url_path='payload-cache')
+    def payload_cache(self, request):
+        """Попадания кеша представлений заказов в этом процессе (только для персонала)."""
+        if not request.user.is_staff:
+            raise PermissionDenied('Статистика кеша доступна только персоналу')
+        return Response(payloads.stats.snapshot())
+
     def create(self, request, *args, **kwargs):
         if getattr(request.user, 'role', None) != User.Role.SENDER:
             raise PermissionDenied('Создавать заявки могут только отправители')
         return super().create(request, *args, **kwargs)
 
     def perform_create(self, serializer):
-        serializer.save(sender=self.request.user)
+        order = serializer.save(sender_id=self.request.user.pk)
+        schedule_new_orders([order.pk])
+
+    @action(detail=False, methods=['get'], filterset_class=OrderExportFilter)
+    def export(self, request):
+        """
+        Потоковая выгрузка истории заказов: ``?export_format=csv`` (по умолчанию)
+        или ``jsonl``. Отправитель получает свои заказы, администратор — все.
+        """
+        user = request.user
+        if getattr(user, 'role', None) not in (User.Role.SENDER, User.Role.ADMIN) and not user.is_staff:
+            raise PermissionDenied('Выгрузка доступна отправителям и администраторам')
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in export.FORMATS:
+            raise ValidationError({'export_format': f'Допустимые значения: {", ".join(export.FORMATS)}'})
+
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            export.stream(queryset, export_format), content_type=export.FORMATS[export_format]
+        )
+        filename = f'orders-{timezone.localdate():%Y%m%d}.{export_format}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_create(self, request):
+        """
+        Создание списка заказов одним запросом. Все или ничего: при ошибках
+        в строках возвращается 400 с ``{'errors': [{'index', 'errors'}]}``.
+        """
+        if getattr(request.user, 'role', None) != User.Role.SENDER:
+            raise PermissionDenied('Создавать заявки могут только отправители')
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError('Ожидается непустой список заказов')
+        if len(items) > settings.CARGO_BULK_CREATE_MAX_ITEMS:
+            raise ValidationError(f'Не больше {settings.CARGO_BULK_CREATE_MAX_ITEMS} заказов в одном запросе')
+
+        try:
+            ids = bulk.create_orders(items, request.user.pk)
+        except bulk.BulkCreateError as error:
+            return Response({'errors': error.errors}, status=status.HTTP_400_BAD_REQUEST)
+        schedule_new_orders(ids)
+        return Response({'created': len(ids), 'ids': ids}, status=status.HTTP_201_CREATED)
+
+    def _transition(self, name, pk):
+        try:
+            order = workflow.apply(name, int(pk), self.request.user)
+        except (ValueError, Order.DoesNotExist):
+            raise NotFound('Заказ не найден')
+        except workflow.TransitionConflict as conflict:
+            return Response(
+                {'error': 'Переход недоступен для текущего статуса заказа', 'status': conflict.status},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(OrderReadSerializer(order).data)
+
+    @action(detail=True, methods=['post'])
+    def accept(self, request, pk=None):
+        """
+        Водитель с активной подпиской принимает свободный заказ. Роль и
+        подписка читаются из базы, а не из токена и кешей: подписка могла
+        истечь после его выдачи.
+        """
+        current = User.objects.filter(pk=request.user.pk).values('role', 'is_subscription_active').first()
+        if current is None or current['role'] != User.Role.DRIVER:
+            raise PermissionDenied('Принимать заказы могут только водители')
+        if not current['is_subscription_active']:
+            raise PermissionDenied('Для принятия заказов нужна активная подписка')
+        return self._transition('accept', pk)
+
+    @action(detail=True, methods=['post'])
+    def start(self, request, pk=None):
+        return self._transition('start', pk)
+
+    @action(detail=True, methods=['post'])
+    def deliver(self, request, pk=None):
+        return self._transition('deliver', pk)
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Отмена отправителем или администратором, пока заказ не в пути."""
+        return self._transition('cancel', pk)
+
+    @action(detail=False, methods=['get'], filterset_class=OpenOrderFilter)
+    def feed(self, request):
+        """
+        Лента свободных заказов для водителей, новые сверху. Фильтры —
+        ``OpenOrderFilter``; страницы по курсору, как в списке заказов.
+        """
+        user = request.user
+        if getattr(user, 'role', None) not in (User.Role.DRIVER, User.Role.ADMIN) and not user.is_staff:
+            raise PermissionDenied('Лента свободных заказов доступна только водителям')
+        return self.list(request)
+
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        """
+        Свободные заказы с точкой отправления в радиусе ``radius_km`` от водителя.
+        Без ``latitude``/``longitude`` используется последняя позиция водителя.
+        """
+        user = request.user
+        if getattr(user, 'role', None) not in (User.Role.DRIVER, User.Role.ADMIN) and not user.is_staff:
+            raise PermissionDenied('Поиск заказов рядом доступен только водителям')
+
+        query = NearbyQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        if 'latitude' in params:
+            latitude, longitude = params['latitude'], params['longitude']
+        else:
+            position = DriverLocation.objects.filter(driver_id=user.pk).values_list('latitude', 'longitude').first()
+            if position is None:
+                raise ValidationError('Местоположение водителя неизвестно, передайте latitude и longitude')
+            latitude, longitude = position
+
+        radius_km = params['radius_km']
+        candidates = Order.objects.open().departing_near(latitude, longitude, radius_km).for_read()
+        orders = []
+        for order in candidates:
+            departure = order.departure_point
+            distance = haversine_km(latitude, longitude, departure.latitude, departure.longitude)
+            if distance <= radius_km:
+                order.distance_to_departure_km = round(distance, 2)
+                orders.append(order)
+        orders.sort(key=lambda order: (order.distance_to_departure_km, -order.pk))
+
+        serializer = self.get_serializer(orders[:params['limit']], many=True)
+        return Response({'results': serializer.data})
@@ -0,0 +1,91 @@
+"""
+Переходы статусов заказа.
+
+Каждый переход — один условный ``UPDATE ... WHERE status IN (...)``: база
+сама решает, кто успел первым, и строка блокируется только на время этого
+запроса. Из нескольких водителей, одновременно принимающих один заказ,
+обновит строку ровно один, остальные получат 0 измененных строк.
+
+``QuerySet.update`` не вызывает ``post_save``, поэтому событие ``order.status``
+публикуется здесь же после коммита.
+"""
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.utils import timezone
+
+from core import realtime
+from notifications.dispatch import notify_order_status
+from users.models import User
+from .models import Order
+
+
+@dataclass(frozen=True)
+class Transition:
+    sources: tuple
+    target: str
+    timestamp: str = None  # поле времени, которое заполняет переход
+
+
+TRANSITIONS = {
+    'accept': Transition((Order.Status.PENDING,), Order.Status.ACCEPTED, 'accepted_at'),
+    'start': Transition((Order.Status.ACCEPTED,), Order.Status.IN_PROGRESS),
+    'deliver': Transition((Order.Status.ACCEPTED, Order.Status.IN_PROGRESS), Order.Status.DELIVERED, 'delivered_at'),
+    'cancel': Transition((Order.Status.PENDING, Order.Status.ACCEPTED), Order.Status.CANCELLED),
+}
+
+
+class TransitionConflict(Exception):
+    """Заказ уже не в том статусе, из которого разрешен переход."""
+
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+def candidates(name, user):
+    """Заказы, к которым пользователь может применить переход, без учета статуса."""
+    orders = Order.objects.all()
+    if name == 'accept':
+        return orders.filter(driver__isnull=True)
+    if name == 'cancel':
+        return orders.for_user(user) if getattr(user, 'role', None) != User.Role.DRIVER else orders.none()
+    return orders.filter(driver_id=user.pk)
+
+
+def apply(name, order_id, user):
+    """
+    Выполняет переход ``name`` и возвращает обновленный заказ. Если заказ не
+    найден среди доступных пользователю — ``Order.DoesNotExist``, если статус
+    уже другой — ``TransitionConflict``.
+    """
+    transition = TRANSITIONS[name]
+    values = {'status': transition.target}
+    if transition.timestamp:
+        values[transition.timestamp] = timezone.now()
+    if name == 'accept':
+        values['driver_id'] = user.pk
+
+    with transaction.atomic():
+        updated = candidates(name, user).filter(pk=order_id, status__in=transition.sources).update(**values)
+        if not updated:
+            current = _current_status(name, order_id, user)
+            if current is None:
+                raise Order.DoesNotExist
+            raise TransitionConflict(current)
+        order = Order.objects.for_read().get(pk=order_id)
+        payload = order.event_payload()
+        transaction.on_commit(
+            lambda: realtime.publish(realtime.order_channel(order_id), 'order.status', payload)
+        )
+        notify_order_status(order)
+    return order
+
+
+def _current_status(name, order_id, user):
+    if name == 'accept':
+        # Принятый другим водителем заказ существует, но уже не свободен.
+        visible = Order.objects.filter(pk=order_id)
+    else:
+        visible = candidates(name, user).filter(pk=order_id)
+    return visible.values_list('status', flat=True).first()
@@ -0,0 +1,96 @@
+import os
+import resource
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+
+def measure(func, repeat):
+    """Вызывает ``func`` ``repeat`` раз и возвращает длительности в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def current_rss_mb():
+    """Текущий RSS процесса по /proc; на системах без procfs — пиковый из getrusage."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@contextmanager
+def track_rss(interval=0.01):
+    """
+    Следит за RSS во время блока; в ``stats`` — RSS до блока и пик за блок (МБ).
+    Прирост пика над исходным значением и есть память, занятая кодом блока.
+    """
+    stats = {'start': current_rss_mb()}
+    stats['peak'] = stats['start']
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(interval):
+            stats['peak'] = max(stats['peak'], current_rss_mb())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        yield stats
+    finally:
+        done.set()
+        sampler.join()
+        stats['peak'] = max(stats['peak'], current_rss_mb())
+
+
+class BenchmarkCommand(BaseCommand):
+    """
+    Базовый класс management-команд бенчмарков.
+
+    Данные генерируются во временной тестовой базе, которая удаляется после
+    прогона, поэтому рабочая база не затрагивается.
+    """
+
+    default_repeat = 20
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=self.default_repeat,
+                            help='Сколько раз повторять каждый замер')
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            self.run_benchmark(**options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run_benchmark(self, **options):
+        raise NotImplementedError
+
+    def analyze(self):
+        """Собирает статистику планировщика, как это делает рабочая база после загрузки данных."""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def report(self, label, timings):
+        self.stdout.write(
+            f'{label:<40} median={statistics.median(timings):9.2f} ms  '
+            f'p95={percentile(timings, 0.95):9.2f} ms'
+        )
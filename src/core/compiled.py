@@ -0,0 +1,155 @@
+"""
+Скомпилированный режим чтения для сериализаторов DRF.
+
+``CompiledSerializer`` один раз разбирает поля ``ModelSerializer`` и строит
+по ним список колонок для ``values()`` и конвертеры значений: Decimal и
+datetime приводятся так же, как ``DecimalField`` и ``DateTimeField`` DRF,
+id связей и простые значения отдаются как есть, вложенные сериализаторы
+компилируются рекурсивно. Строки ``values()`` превращаются в словари без
+создания моделей и без ``Field.get_attribute``/``to_representation`` на
+каждое значение; результат совпадает с ``serializer.data`` побайтно после
+рендеринга.
+
+Поля, которые нельзя прочитать из ``values()`` (методы, ``source='*'``,
+свойства модели, связи кроме ``PrimaryKeyRelatedField``), вызывают
+``ImproperlyConfigured`` при компиляции.
+"""
+import decimal
+import functools
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+# Поля, у которых to_representation возвращает значение из values() без изменений.
+PASSTHROUGH_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+    serializers.ReadOnlyField,
+)
+
+
+@functools.cache
+def compile_serializer(serializer_class):
+    return CompiledSerializer(serializer_class)
+
+
+class CompiledSerializer:
+    def __init__(self, serializer_class, prefix=''):
+        self.serializer_class = serializer_class
+        self.model = serializer_class.Meta.model
+        # (имя в ответе, колонка values(), фабрика конвертера или None, вложенный CompiledSerializer)
+        self._plan = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            self._plan.append(self._compile_field(name, field, prefix))
+        self.lookups = tuple(self._lookups())
+
+    def _compile_field(self, name, field, prefix):
+        source = field.source
+        if source == '*' or '.' in source:
+            raise ImproperlyConfigured(f'{self.serializer_class.__name__}.{name}: source={source!r} не читается из values()')
+        try:
+            self.model._meta.get_field(source)
+        except FieldDoesNotExist:
+            raise ImproperlyConfigured(f'{self.serializer_class.__name__}.{name}: {source!r} не поле модели') from None
+        lookup = prefix + source
+        if isinstance(field, serializers.ModelSerializer):
+            return name, lookup, None, CompiledSerializer(type(field), prefix=f'{lookup}__')
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+            return name, lookup, None, None
+        if isinstance(field, (serializers.BaseSerializer, serializers.RelatedField, serializers.SerializerMethodField)):
+            raise ImproperlyConfigured(f'{self.serializer_class.__name__}.{name}: {type(field).__name__} не компилируется')
+        return name, lookup, _converter(field), None
+
+    def _lookups(self):
+        for _, lookup, _, nested in self._plan:
+            # Для вложенного сериализатора — id связи (проверка на NULL) и его колонки.
+            yield lookup
+            if nested is not None:
+                yield from nested.lookups
+
+    def values(self, queryset):
+        return queryset.values(*self.lookups)
+
+    def data(self, rows):
+        """Представления строк ``values(*self.lookups)`` в их порядке."""
+        represent = self._bind()
+        return [represent(row) for row in rows]
+
+    def _bind(self):
+        """Функция строки с конвертерами, привязанными к текущему запросу (часовой пояс)."""
+        plan = [
+            (name, lookup, factory() if factory else None, nested._bind() if nested else None)
+            for name, lookup, factory, nested in self._plan
+        ]
+
+        def represent(row):
+            ret = {}
+            for name, lookup, convert, nested in plan:
+                value = row[lookup]
+                if value is None:
+                    ret[name] = None
+                elif nested is not None:
+                    ret[name] = nested(row)
+                else:
+                    ret[name] = convert(value) if convert else value
+            return ret
+
+        return represent
+
+
+def _converter(field):
+    """Фабрика конвертера значения поля; ``None`` — значение отдается как есть."""
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_converter(field)
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime_converter(field)
+    if isinstance(field, PASSTHROUGH_FIELDS):
+        return None
+    return lambda: field.to_representation
+
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if field.localize or field.normalize_output or field.decimal_places is None:
+        return lambda: field.to_representation
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    rounding = field.rounding
+
+    def factory():
+        context = decimal.getcontext().copy()
+        if field.max_digits is not None:
+            context.prec = field.max_digits
+
+        def convert(value):
+            if not isinstance(value, decimal.Decimal):
+                value = decimal.Decimal(str(value).strip())
+            value = value.quantize(exponent, rounding=rounding, context=context)
+            return f'{value:f}' if coerce_to_string else value
+
+        return convert
+
+    return factory
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return lambda: field.to_representation
+
+    def factory():
+        tz = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+        if tz is None:
+            return field.to_representation
+
+        def convert(value):
+            value = value.astimezone(tz).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+        return convert
+
+    return factory
@@ -0,0 +1,24 @@
+"""
+Настройка соединений с базой при открытии (сигнал ``connection_created``).
+
+Для SQLite выполняются ``SQLITE_PRAGMAS``: WAL, ``synchronous=NORMAL``,
+ожидание блокировки и mmap. Эти параметры действуют на соединение, а не на
+файл (кроме ``journal_mode``), поэтому задаются при каждом подключении.
+"""
+from django.conf import settings
+
+
+def configure_sqlite(connection):
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def sqlite_pragmas(connection):
+    """Текущие значения ``SQLITE_PRAGMAS`` соединения."""
+    pragmas = {}
+    with connection.cursor() as cursor:
+        for name in settings.SQLITE_PRAGMAS:
+            cursor.execute(f'PRAGMA {name}')
+            pragmas[name] = cursor.fetchone()[0]
+    return pragmas
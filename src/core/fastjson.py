@@ -0,0 +1,80 @@
+"""
+JSON-рендерер и парсер DRF на orjson с откатом на stdlib.
+
+Вывод совпадает с ``rest_framework.renderers.JSONRenderer`` при настройках
+по умолчанию (``UNICODE_JSON``, ``COMPACT_JSON``, ``STRICT_JSON``): даты,
+Decimal и прочие типы, которые orjson не знает или форматирует иначе,
+передаются в ``default`` кодировщика DRF, U+2028/U+2029 экранируются так же.
+Если orjson не установлен, ``API_JSON_BACKEND = 'json'``, настройки DRF
+отличаются от умолчаний, запрошен отступ или orjson не смог закодировать
+данные (целые больше 64 бит), работает реализация DRF. Единственное
+отличие — запись очень больших и очень малых float: ``1e16`` вместо
+``1e+16``; сериализаторы API отдают Decimal строками, так что это касается
+только ``FloatField``.
+
+Парсер на ошибке orjson повторяет разбор stdlib: целые больше 64 бит
+принимаются, а текст ``ParseError`` остается прежним.
+"""
+from django.conf import settings
+from rest_framework import parsers, renderers
+from rest_framework.utils import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson необязателен
+    orjson = None
+
+LINE_SEPARATORS = ('\u2028'.encode(), '\u2029'.encode())
+
+
+def enabled():
+    return orjson is not None and settings.API_JSON_BACKEND == 'orjson'
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or not self._compatible(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Как в DRF: разделители строк ломают JSON, встроенный в <script>.
+        if LINE_SEPARATORS[0] in ret or LINE_SEPARATORS[1] in ret:
+            ret = ret.replace(LINE_SEPARATORS[0], b'\\u2028').replace(LINE_SEPARATORS[1], b'\\u2029')
+        return ret
+
+    def _compatible(self, accepted_media_type, renderer_context):
+        # orjson не экранирует не-ASCII, не ставит пробелы и пишет null вместо NaN.
+        return (
+            enabled()
+            and self.compact
+            and not self.ensure_ascii
+            and self.strict
+            and not self.get_indent(accepted_media_type, renderer_context)
+        )
+
+
+class FastJSONParser(parsers.JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if not (enabled() and self.strict and encoding.lower().replace('_', '-') in ('utf-8', 'utf8')):
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return self._parse_stdlib(body, encoding)
+
+    def _parse_stdlib(self, body, encoding):
+        try:
+            return json.loads(body.decode(encoding), parse_constant=json.strict_constant)
+        except ValueError as exc:
+            raise parsers.ParseError('JSON parse error - %s' % str(exc))
+
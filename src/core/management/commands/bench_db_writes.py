@@ -0,0 +1,124 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import OperationalError, close_old_connections, connection, transaction
+from django.test import override_settings
+
+from core.benchmarks import BenchmarkCommand, percentile
+from users.models import DriverLocation, User
+from cargo.management.commands._seed import seed_locations, seed_users
+from cargo.models import Order
+
+# Умолчания Django и драйверов, с которыми сравнивается профиль из настроек.
+SQLITE_DEFAULTS = {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'busy_timeout': 5000, 'mmap_size': 0}
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Параллельная запись из нескольких потоков (создание заказа и обновление '
+        'геолокации водителя на каждый "запрос"): умолчания против профиля базы из настроек.'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--ops', type=int, default=200, help='Запросов на поток')
+
+    def handle(self, *args, **options):
+        test_settings = connection.settings_dict['TEST']
+        if connection.vendor != 'sqlite' or test_settings.get('NAME'):
+            return super().handle(*args, **options)
+        # Тестовая SQLite по умолчанию в памяти, а блокировки и WAL нужны файловые.
+        directory = tempfile.mkdtemp()
+        test_settings['NAME'] = os.path.join(directory, 'bench.sqlite3')
+        try:
+            return super().handle(*args, **options)
+        finally:
+            test_settings['NAME'] = None
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def run_benchmark(self, **options):
+        sender = seed_users(1, User.Role.SENDER, '+7700')[0]
+        drivers = seed_users(options['threads'], User.Role.DRIVER, '+7701')
+        locations = seed_locations(10)
+        connection.close()
+
+        if connection.vendor == 'sqlite':
+            profiles = (
+                ('sqlite defaults', {'transaction_mode': 'DEFERRED'}, {'SQLITE_PRAGMAS': SQLITE_DEFAULTS}),
+                ('sqlite WAL profile', {'transaction_mode': 'IMMEDIATE'}, {}),
+            )
+        else:
+            profiles = (
+                ('CONN_MAX_AGE=0', {'CONN_MAX_AGE': 0}, {}),
+                ('persistent + health checks', {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True}, {}),
+            )
+        for label, database, overrides in profiles:
+            with self.profile(database), override_settings(**overrides):
+                self.run_writers(label, sender, drivers, locations, options['ops'])
+
+    @contextmanager
+    def profile(self, database):
+        """Временно меняет настройки соединения; потоки открывают соединения уже с ними."""
+        settings_dict = connection.settings_dict
+        saved = {key: settings_dict.get(key) for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+        saved_options = dict(settings_dict['OPTIONS'])
+        for key, value in database.items():
+            if key in saved:
+                settings_dict[key] = value
+            else:
+                settings_dict['OPTIONS'][key] = value
+        try:
+            yield
+        finally:
+            settings_dict.update(saved)
+            settings_dict['OPTIONS'] = saved_options
+
+    def run_writers(self, label, sender, drivers, locations, ops):
+        latencies, errors = [], []
+        barrier = threading.Barrier(len(drivers))
+
+        def writer(driver):
+            barrier.wait()
+            for index in range(ops):
+                # Границы запроса, как у request_started/request_finished.
+                close_old_connections()
+                started = time.perf_counter()
+                try:
+                    # Сначала чтение, потом запись: в DEFERRED-транзакции SQLite это
+                    # повышение блокировки, на котором и возникает "database is locked".
+                    with transaction.atomic():
+                        DriverLocation.objects.update_or_create(
+                            driver=driver,
+                            defaults={'latitude': Decimal('43.2') + index % 100 / Decimal(1000), 'longitude': Decimal('76.9')},
+                        )
+                        Order.objects.create(
+                            sender=sender, departure_point=locations[index % len(locations)],
+                            destination_point=locations[(index + 1) % len(locations)], weight=100,
+                        )
+                except OperationalError as error:
+                    errors.append(str(error))
+                else:
+                    latencies.append((time.perf_counter() - started) * 1000)
+                close_old_connections()
+            connection.close()
+
+        threads = [threading.Thread(target=writer, args=(driver,)) for driver in drivers]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'{label:<40} ok={len(latencies)} errors={len(errors)} '
+            f'{len(latencies) / elapsed:.0f} ops/s  p95={percentile(latencies or [0], 0.95):.2f} ms'
+        )
+        for message in sorted(set(errors)):
+            self.stdout.write(f'{"":<40} {message}')
@@ -0,0 +1,57 @@
+import io
+import tracemalloc
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core import fastjson
+from core.benchmarks import BenchmarkCommand, measure
+from core.compiled import compile_serializer
+from cargo.management.commands._seed import seed_orders, seed_users
+from cargo.models import Order
+from cargo.serializers import OrderReadSerializer
+from users.models import User
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Рендеринг и разбор страниц заказов: JSONRenderer/JSONParser DRF против '
+        'core.fastjson — время и пик выделенной памяти (tracemalloc).'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--pages', type=int, nargs='+', default=[20, 100, 1000])
+
+    def run_benchmark(self, **options):
+        repeat, sizes = options['repeat'], options['pages']
+        if not fastjson.enabled():
+            self.stdout.write('orjson не установлен или API_JSON_BACKEND != "orjson": сравниваются одинаковые пути')
+        senders = seed_users(10, User.Role.SENDER, '+7700')
+        seed_orders(max(sizes), senders=senders, stdout=self.stdout)
+        compiled = compile_serializer(OrderReadSerializer)
+        orders = compiled.data(compiled.values(Order.objects.order_by('-created_at', '-pk')))
+
+        candidates = (
+            ('DRF', JSONRenderer(), JSONParser()),
+            ('fastjson', fastjson.FastJSONRenderer(), fastjson.FastJSONParser()),
+        )
+        for size in sizes:
+            page = {'next': None, 'previous': None, 'results': orders[:size]}
+            body = JSONRenderer().render(page)
+            for label, renderer, parser in candidates:
+                assert renderer.render(page) == body
+                self.report(f'render {size} rows, {label}', measure(lambda: renderer.render(page), repeat))
+                self.stdout.write(f'{"":<40} peak={self.peak_kb(lambda: renderer.render(page)):.0f} KB')
+                parse = lambda: parser.parse(io.BytesIO(body), parser_context={'encoding': 'utf-8'})
+                self.report(f'parse {size} rows, {label}', measure(parse, repeat))
+                self.stdout.write(f'{"":<40} peak={self.peak_kb(parse):.0f} KB')
+
+    @staticmethod
+    def peak_kb(func):
+        tracemalloc.start()
+        try:
+            func()
+            return tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
@@ -0,0 +1,74 @@
+import asyncio
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.benchmarks import percentile
+from core.realtime import LocalBroker
+
+
+class Command(BaseCommand):
+    help = (
+        'Рассылка событий тысячам простаивающих SSE-подписчиков одного канала: '
+        'задержка от publish из синхронного потока до получения последним подписчиком.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=5000)
+        parser.add_argument('--messages', type=int, default=200)
+        parser.add_argument('--channels', type=int, default=1,
+                            help='Подписчики распределяются по этому числу каналов')
+        parser.add_argument('--interval', type=float, default=50, help='Пауза между событиями, мс')
+
+    def handle(self, *args, **options):
+        asyncio.run(self._run(**options))
+
+    async def _run(self, subscribers, messages, channels, interval, **options):
+        broker = LocalBroker(queue_size=messages + 1)
+        loop = asyncio.get_running_loop()
+        received = [0] * messages
+        finished = [None] * messages
+        per_message = subscribers // channels
+        done = asyncio.Event()
+
+        async def consume(subscription):
+            for _ in range(messages):
+                message = await subscription.get()
+                index = message['data']['index']
+                received[index] += 1
+                if received[index] == per_message:
+                    finished[index] = time.perf_counter()
+                    if index == messages - 1:
+                        done.set()
+
+        subscriptions = [broker.subscribe([f'order:{index % channels}']) for index in range(subscribers)]
+        tasks = [asyncio.create_task(consume(subscription)) for subscription in subscriptions]
+        await asyncio.sleep(0.1)
+
+        published = [None] * messages
+
+        def publisher():
+            for index in range(messages):
+                published[index] = time.perf_counter()
+                broker.publish('order:0', 'order.status', {'index': index})
+                time.sleep(interval / 1000)
+
+        started = time.perf_counter()
+        thread = threading.Thread(target=publisher)
+        thread.start()
+        await asyncio.wait_for(done.wait(), timeout=300)
+        elapsed = time.perf_counter() - started
+        await loop.run_in_executor(None, thread.join)
+        for task in tasks:
+            task.cancel()
+
+        latencies = [(finished[index] - published[index]) * 1000 for index in range(messages)]
+        deliveries = per_message * messages
+        self.stdout.write(f'Подписчиков: {subscribers}, на канал публикации: {per_message}, событий: {messages}')
+        self.stdout.write(
+            f'Задержка доставки всем: median={statistics.median(latencies):.2f} ms  '
+            f'p95={percentile(latencies, 0.95):.2f} ms  max={max(latencies):.2f} ms'
+        )
+        self.stdout.write(f'Доставок: {deliveries} за {elapsed:.2f} с ({deliveries / elapsed:,.0f} доставок/с)')
@@ -0,0 +1,51 @@
+from core.benchmarks import BenchmarkCommand, measure, percentile
+from core.compiled import compile_serializer
+from users.models import User
+from users.serializers import UserSerializer
+from cargo.management.commands._seed import seed_locations, seed_orders, seed_users
+from cargo.models import CargoType, Order
+from cargo.serializers import OrderReadSerializer
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Строк в секунду: OrderReadSerializer и UserSerializer против скомпилированного '
+        'режима (core.compiled), только сериализация и вместе с чтением из базы.'
+    )
+    default_repeat = 5
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--rows', type=int, default=5000)
+
+    def run_benchmark(self, **options):
+        count, repeat = options['rows'], options['repeat']
+        senders = seed_users(count, User.Role.SENDER, '+7700')
+        locations = seed_locations(200)
+        cargo_types = CargoType.objects.bulk_create(CargoType(name=f'Тип {index}') for index in range(10))
+        seed_orders(count, senders=senders, locations=locations, cargo_types=cargo_types, stdout=self.stdout)
+        self.analyze()
+
+        cases = (
+            ('orders', OrderReadSerializer, Order.objects.for_read().order_by('pk')),
+            ('users', UserSerializer, User.objects.order_by('pk')[:count]),
+        )
+        for label, serializer_class, queryset in cases:
+            compiled = compile_serializer(serializer_class)
+            instances = list(queryset)
+            rows = list(compiled.values(queryset))
+            assert compiled.data(rows) == serializer_class(instances, many=True).data
+            self.run_case(f'{label}: {serializer_class.__name__}', repeat, len(rows), {
+                'serialize': lambda: serializer_class(instances, many=True).data,
+                'query + serialize': lambda: serializer_class(list(queryset.all()), many=True).data,
+            })
+            self.run_case(f'{label}: compiled', repeat, len(rows), {
+                'serialize': lambda: compiled.data(rows),
+                'query + serialize': lambda: compiled.data(compiled.values(queryset)),
+            })
+
+    def run_case(self, label, repeat, count, funcs):
+        for name, func in funcs.items():
+            timings = measure(func, repeat)
+            self.report(f'{label}, {name}', timings)
+            self.stdout.write(f'{"":<40} rows/s={count / percentile(timings, 0.5) * 1000:.0f}')
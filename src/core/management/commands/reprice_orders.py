@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.pricing import reprice_pending_orders
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает расстояние и стоимость ожидающих заказов по активному тарифу.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        updated = reprice_pending_orders(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано заказов: {updated}'))
@@ -0,0 +1,22 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация по ``created_at``: страница выбирается условием
+    ``created_at < <курсор>`` по индексу, без OFFSET и без COUNT(*).
+    ``id`` добавлен вторым ключом, чтобы порядок записей с одинаковым
+    временем был стабильным между запросами.
+    """
+
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class IdCursorPagination(CursorPagination):
+    """Keyset-пагинация по первичному ключу."""
+
+    ordering = ('id',)
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,172 @@
+"""
+Расчет расстояния, времени в пути и стоимости заказа по тарифу.
+
+Активный тариф — последняя запись ``TariffSettings``. Он кешируется в памяти
+процесса и сбрасывается сигналами при сохранении или удалении тарифа; TTL
+ограничивает устаревание в остальных процессах.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Value
+from django.db.models.functions import Round
+
+from locations import routes
+from . import replicas
+from .models import TariffSettings
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+TARIFF_CACHE_TTL = 60
+
+# Один поток: пересчеты после нескольких правок тарифа идут по очереди.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pricing')
+
+_lock = threading.Lock()
+_cached_tariff = None
+_cached_until = 0.0
+
+
+def get_active_tariff():
+    global _cached_tariff, _cached_until
+    now = time.monotonic()
+    if now < _cached_until:
+        return _cached_tariff
+    with _lock:
+        if now >= _cached_until:
+            _cached_tariff = TariffSettings.objects.order_by('-pk').first()
+            _cached_until = now + TARIFF_CACHE_TTL
+        return _cached_tariff
+
+
+def invalidate_tariff_cache():
+    global _cached_until
+    with _lock:
+        _cached_until = 0.0
+
+
+def _money(value):
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+@dataclass(frozen=True)
+class Quote:
+    distance_km: Decimal = None
+    estimated_time_hours: Decimal = None
+    total_cost: Decimal = None
+
+    def as_fields(self):
+        return asdict(self)
+
+
+def price(distance_km, weight, tariff):
+    if tariff is None or distance_km is None:
+        return None
+    cost = tariff.base_fee + tariff.price_per_km * distance_km
+    if tariff.price_per_kg and weight is not None:
+        cost += tariff.price_per_kg * Decimal(weight)
+    return _money(cost)
+
+
+def quote(departure, destination, weight, tariff=None):
+    """Расчетные поля заказа для пары локаций и веса груза."""
+    distance, hours = routes.get_route(departure, destination) or (None, None)
+    return Quote(distance, hours, price(distance, weight, tariff or get_active_tariff()))
+
+
+def quote_many(items, locations=None, tariff=None):
+    """
+    Расчетные поля для списка ``(departure_id, destination_id, weight)``.
+    Маршруты берутся одним вызовом ``routes.get_routes``; уже загруженные
+    локации (``{id: Location}``) избавляют от повторного чтения координат.
+    """
+    items = list(items)
+    tariff = tariff or get_active_tariff()
+    found = routes.get_routes(((departure_id, destination_id) for departure_id, destination_id, _ in items), locations)
+    quotes = []
+    for departure_id, destination_id, weight in items:
+        distance, hours = found.get(routes.pair_key(departure_id, destination_id)) or (None, None)
+        quotes.append(Quote(distance, hours, price(distance, weight, tariff)))
+    return quotes
+
+
+def schedule_reprice():
+    """Ставит пересчет ожидающих заказов в очередь после коммита текущей транзакции."""
+    transaction.on_commit(_submit_reprice)
+
+
+def _submit_reprice():
+    if not settings.TARIFF_REPRICE_ASYNC:
+        return reprice_pending_orders()
+    return _executor.submit(_reprice_in_worker)
+
+
+def _reprice_in_worker():
+    try:
+        return reprice_pending_orders()
+    except Exception:
+        logger.exception('Ошибка пересчета ожидающих заказов')
+    finally:
+        close_old_connections()
+
+
+@replicas.primary()
+def reprice_pending_orders(tariff=None, batch_size=2000):
+    """
+    Пересчитывает ожидающие заказы под текущий тариф. ``schedule_reprice``
+    запускает его после коммита в потоке ``pricing``, а не в запросе
+    администратора, поэтому он читает основную базу: контекст запроса в поток
+    не переходит, а реплика могла еще не получить только что созданные
+    заказы и тариф.
+
+    Недостающие расстояния берутся из матрицы маршрутов и записываются
+    пачками через ``bulk_update``,
+    после чего стоимость всех заказов обновляется одним UPDATE с выражением
+    по колонкам ``distance_km`` и ``weight``. Если тарифа нет (удален
+    последний), стоимость ожидающих заказов сбрасывается в NULL, как у
+    заказов, созданных без тарифа. Возвращает число обновленных заказов.
+    """
+    from cargo.models import Order
+
+    tariff = tariff or get_active_tariff()
+    pending = Order.objects.filter(status=Order.Status.PENDING)
+
+    missing = pending.filter(distance_km__isnull=True).values_list(
+        'pk', 'departure_point_id', 'destination_point_id'
+    )
+    rows = []
+    for row in missing.iterator(chunk_size=batch_size):
+        rows.append(row)
+        if len(rows) >= batch_size:
+            _fill_distances(Order, rows)
+            rows = []
+    _fill_distances(Order, rows)
+
+    if tariff is None:
+        return pending.filter(total_cost__isnull=False).update(total_cost=None)
+    cost = Value(tariff.base_fee) + Value(tariff.price_per_km) * F('distance_km')
+    if tariff.price_per_kg:
+        cost = cost + Value(tariff.price_per_kg) * F('weight')
+    cost = ExpressionWrapper(
+        Round(cost, 2), output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+    return pending.filter(distance_km__isnull=False).update(total_cost=cost)
+
+
+def _fill_distances(Order, rows):
+    if not rows:
+        return
+    found = routes.get_routes((departure_id, destination_id) for _, departure_id, destination_id in rows)
+    batch = []
+    for pk, departure_id, destination_id in rows:
+        route = found.get(routes.pair_key(departure_id, destination_id))
+        if route is not None:
+            batch.append(Order(pk=pk, distance_km=route[0], estimated_time_hours=route[1]))
+    Order.objects.bulk_update(batch, ['distance_km', 'estimated_time_hours'])
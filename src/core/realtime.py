@@ -0,0 +1,115 @@
+"""
+Публикация событий для realtime-подписчиков (SSE).
+
+Брокер выбирается настройкой ``REALTIME_BROKER``. ``LocalBroker`` хранит
+подписчиков в памяти процесса: каждый подписчик — ``asyncio.Queue`` в event
+loop своего ASGI-запроса. ``publish`` можно вызывать из синхронного кода
+(сигналы, фоновые потоки): доставка передается в каждый loop одним
+``call_soon_threadsafe`` на публикацию, сколько бы подписчиков там ни было.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+def order_channel(order_id):
+    return f'order:{order_id}'
+
+
+def driver_channel(driver_id):
+    return f'driver:{driver_id}'
+
+
+class Subscription:
+    def __init__(self, broker, loop, queue_size):
+        self.broker = broker
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.channels = set()
+
+    def deliver(self, message):
+        if self.queue.full():
+            # Медленный клиент теряет самое старое событие, а не блокирует остальных.
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def add(self, channel):
+        self.broker.add_channel(self, channel)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    def __init__(self, queue_size=None):
+        self.queue_size = queue_size or settings.REALTIME_QUEUE_SIZE
+        self._lock = threading.Lock()
+        self._channels = defaultdict(set)
+
+    def subscribe(self, channels):
+        """Создает подписку в текущем event loop."""
+        subscription = Subscription(self, asyncio.get_running_loop(), self.queue_size)
+        for channel in channels:
+            self.add_channel(subscription, channel)
+        return subscription
+
+    def add_channel(self, subscription, channel):
+        with self._lock:
+            self._channels[channel].add(subscription)
+            subscription.channels.add(channel)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+            subscription.channels.clear()
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._channels.get(channel, ()))
+
+    def publish(self, channel, event, data):
+        message = {'event': event, 'data': data}
+        by_loop = defaultdict(list)
+        with self._lock:
+            for subscription in self._channels.get(channel, ()):
+                by_loop[subscription.loop].append(subscription)
+        for loop, subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_fan_out, subscriptions, message)
+            except RuntimeError:
+                # Loop уже закрыт: подписчики отпишутся при завершении запроса.
+                pass
+        return sum(len(subscriptions) for subscriptions in by_loop.values())
+
+
+def _fan_out(subscriptions, message):
+    for subscription in subscriptions:
+        subscription.deliver(message)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.REALTIME_BROKER)()
+    return _broker
+
+
+def publish(channel, event, data):
+    return get_broker().publish(channel, event, data)
@@ -0,0 +1,178 @@
+"""
+Чтение с реплик, запись в основную базу.
+
+``ReplicaRouter`` отправляет чтения на случайную из ``REPLICA_DATABASES``,
+запись — в ``default``. В основную базу идут и чтения:
+
+- в HTTP-запросах не GET/HEAD/OPTIONS: объект, прочитанный с отстающей
+  реплики и сохраненный, затер бы более новые данные;
+- внутри транзакции ``atomic`` и ``select_for_update`` (Django выбирает для
+  него базу записи);
+- в HTTP-запросе после записи в нем же;
+- пользователя в течение ``REPLICA_PIN_SECONDS`` после его записи
+  (read-your-writes). Отметку ставит ``ReplicaRoutingMiddleware`` в кеш
+  ``REPLICA_PIN_CACHE``; следующий запрос может попасть в другой процесс,
+  поэтому кеш должен быть общим (Redis): с локальным кешем процесса при
+  заданных репликах middleware не запускается (``ImproperlyConfigured``);
+- внутри ``with primary():``.
+
+Пользователь для проверки отметки берется из ``request.user`` при первом
+запросе к базе после аутентификации (DRF переносит пользователя из токена
+в ``HttpRequest``). Без реплик роутер и middleware ничего не меняют.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_request_state = contextvars.ContextVar('replica_request_state', default=None)
+_primary = contextvars.ContextVar('replica_primary', default=False)
+
+
+def pin_key(user_id):
+    return f'db:primary-pin:{user_id}'
+
+
+def _cache():
+    return caches[settings.REPLICA_PIN_CACHE]
+
+
+def check_pin_cache():
+    if settings.REPLICA_DATABASES and isinstance(_cache(), (LocMemCache, DummyCache)):
+        raise ImproperlyConfigured(
+            f'REPLICA_PIN_CACHE={settings.REPLICA_PIN_CACHE!r}: кеш локален процессу, '
+            'отметка записи не дойдет до других процессов. Нужен общий кеш (REDIS_URL).'
+        )
+
+
+def pin(user_id):
+    """Закрепляет чтения пользователя за основной базой на ``REPLICA_PIN_SECONDS``."""
+    _cache().set(pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user_id):
+    return bool(_cache().get(pin_key(user_id)))
+
+
+@contextmanager
+def primary():
+    """Все чтения блока — из основной базы."""
+    token = _primary.set(True)
+    try:
+        yield
+    finally:
+        _primary.reset(token)
+
+
+class _RequestState:
+    def __init__(self, request):
+        self.request = request
+        self.wrote = False
+        self.pinned = request.method not in SAFE_METHODS
+        self._user_checked = False
+        self._resolving = False
+
+    def use_primary(self):
+        if self.wrote or self.pinned:
+            return True
+        # Загрузка пользователя из сессии сама читает базу: без рекурсии.
+        if not self._user_checked and not self._resolving:
+            self._resolving = True
+            try:
+                user = getattr(self.request, 'user', None)
+                if user is not None and user.is_authenticated:
+                    self._user_checked = True
+                    self.pinned = is_pinned(user.pk)
+            finally:
+                self._resolving = False
+        return self.pinned
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.REPLICA_DATABASES
+        if not replicas:
+            return None
+        if _primary.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        state = _request_state.get()
+        if state is not None and state.use_primary():
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему реплик переносит репликация.
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Ведет состояние маршрутизации запроса и отмечает пользователя после записи.
+    Работает и под ASGI: запросы к базе из ``sync_to_async`` получают копию
+    контекста вместе с состоянием.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        check_pin_cache()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.REPLICA_DATABASES:
+            return self.get_response(request)
+        state = _RequestState(request)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        _pin_writer(request, state)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.REPLICA_DATABASES:
+            return await self.get_response(request)
+        state = _RequestState(request)
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state.wrote:
+            # Пользователь из сессии загружается запросом к базе.
+            await sync_to_async(_pin_writer)(request, state)
+        return response
+
+
+def _pin_writer(request, state):
+    user = getattr(request, 'user', None)
+    if state.wrote and user is not None and user.is_authenticated:
+        pin(user.pk)
@@ -0,0 +1,19 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import db, pricing
+from .models import TariffSettings
+
+
+@receiver(post_save, sender=TariffSettings)
+@receiver(post_delete, sender=TariffSettings)
+def tariff_changed(sender, **kwargs):
+    pricing.invalidate_tariff_cache()
+    pricing.schedule_reprice()
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        db.configure_sqlite(connection)
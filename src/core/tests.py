@@ -1,3 +1,450 @@
-from django.test import TestCase
+import asyncio
+import io
+import sqlite3
+import tempfile
+import uuid
+from datetime import date, datetime, time, timezone as dt_timezone
+from decimal import Decimal
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from cargo.models import CargoType, Order
+from cargo.serializers import OrderReadSerializer
+from locations.models import Location
+from notifications import dispatch
+from notifications.models import Notification
+from locations.routes import route_cache
+from users.models import User
+from users.serializers import UserSerializer
+from . import db, fastjson, pricing, realtime, replicas
+from .compiled import compile_serializer
+from .models import TariffSettings
+
+
+@override_settings(TARIFF_REPRICE_ASYNC=False)
+class PricingTests(TestCase):
+    def setUp(self):
+        pricing.invalidate_tariff_cache()
+        route_cache.clear()
+        self.addCleanup(pricing.invalidate_tariff_cache)
+        self.almaty = Location.objects.create(city_name='Алматы', latitude='43.238949', longitude='76.889709')
+        self.astana = Location.objects.create(city_name='Астана', latitude='51.169392', longitude='71.449074')
+        self.tariff = TariffSettings.objects.create(price_per_km='150.00', price_per_kg='2.00', base_fee='5000.00')
+        self.tariff.refresh_from_db()
+
+    def test_quote_uses_road_distance_and_tariff(self):
+        with self.settings(ROUTE_ROAD_FACTOR=1.0, ROUTE_AVERAGE_SPEED_KMH=50):
+            quote = pricing.quote(self.almaty, self.astana, Decimal('1000'))
+
+        self.assertEqual(quote.distance_km, Decimal('972.25'))
+        self.assertEqual(quote.estimated_time_hours, Decimal('19.45'))
+        self.assertEqual(quote.total_cost, Decimal('5000') + Decimal('150') * Decimal('972.25') + Decimal('2000'))
+
+    def test_quote_without_coordinates_is_empty(self):
+        unknown = Location.objects.create(city_name='Неизвестно')
+        quote = pricing.quote(self.almaty, unknown, Decimal('10'))
+        self.assertEqual(quote, pricing.Quote())
+
+    def test_active_tariff_is_cached_until_saved(self):
+        self.assertEqual(pricing.get_active_tariff(), self.tariff)
+        with self.assertNumQueries(0):
+            pricing.get_active_tariff()
+
+        self.tariff.base_fee = Decimal('0')
+        self.tariff.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(pricing.get_active_tariff().base_fee, Decimal('0'))
+
+    def test_reprice_pending_orders_in_bulk(self):
+        sender = User.objects.create(username='+70000000001', phone_number='+70000000001')
+        orders = Order.objects.bulk_create(
+            Order(
+                sender=sender,
+                departure_point=self.almaty,
+                destination_point=self.astana,
+                weight=100,
+                status=Order.Status.PENDING if index < 30 else Order.Status.DELIVERED,
+            )
+            for index in range(40)
+        )
+
+        # Заказы без расстояния, поиск маршрута, координаты, сохранение маршрута,
+        # один bulk_update расстояний и один UPDATE стоимости.
+        with self.assertNumQueries(6):
+            updated = pricing.reprice_pending_orders(self.tariff)
+
+        self.assertEqual(updated, 30)
+        pending = Order.objects.get(pk=orders[0].pk)
+        expected = pricing.quote(self.almaty, self.astana, pending.weight, self.tariff)
+        self.assertEqual(pending.distance_km, expected.distance_km)
+        self.assertEqual(pending.total_cost, expected.total_cost)
+        self.assertIsNone(Order.objects.get(pk=orders[-1].pk).total_cost)
+
+    def test_bulk_reprice_rounds_like_price(self):
+        sender = User.objects.create(username='+70000000001', phone_number='+70000000001')
+        tariff = TariffSettings.objects.create(price_per_km='0.15', price_per_kg='0.05', base_fee='0.01')
+        tariff.refresh_from_db()
+        # Половины копейки: 0.15 * 0.5 = 0.075, 0.05 * 0.3 = 0.015 и т. п.
+        cases = [
+            (Decimal(distance), Decimal(weight))
+            for distance in ('0.50', '1.50', '2.50', '0.10', '12.35', '99999.99')
+            for weight in ('0.00', '0.10', '0.30', '0.50', '0.70', '1.50', '12345678.99')
+        ]
+        orders = Order.objects.bulk_create(
+            Order(
+                sender=sender, departure_point=self.almaty, destination_point=self.astana,
+                distance_km=distance, weight=weight,
+            )
+            for distance, weight in cases
+        )
+
+        pricing.reprice_pending_orders(tariff)
+
+        costs = dict(Order.objects.filter(pk__in=[order.pk for order in orders]).values_list('pk', 'total_cost'))
+        for order, (distance, weight) in zip(orders, cases):
+            with self.subTest(distance=distance, weight=weight):
+                self.assertEqual(costs[order.pk], pricing.price(distance, weight, tariff))
+
+    def test_tariff_change_reprices_pending_orders(self):
+        sender = User.objects.create(username='+70000000001', phone_number='+70000000001')
+        order = Order.objects.create(
+            sender=sender, departure_point=self.almaty, destination_point=self.astana, weight=100
+        )
+        self.tariff.price_per_km = Decimal('200.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tariff.save()
+
+        order.refresh_from_db()
+        self.assertEqual(order.total_cost, pricing.quote(self.almaty, self.astana, order.weight).total_cost)
+
+    @override_settings(TARIFF_REPRICE_ASYNC=True)
+    def test_tariff_change_hands_reprice_to_worker(self):
+        sender = User.objects.create(username='+70000000001', phone_number='+70000000001')
+        order = Order.objects.create(
+            sender=sender, departure_point=self.almaty, destination_point=self.astana,
+            weight=100, **pricing.quote(self.almaty, self.astana, 100).as_fields(),
+        )
+        self.tariff.price_per_km = Decimal('200.00')
+        with patch.object(pricing, '_executor') as executor, self.captureOnCommitCallbacks(execute=True):
+            self.tariff.save()
+
+        executor.submit.assert_called_once_with(pricing._reprice_in_worker)
+        self.assertEqual(Order.objects.get(pk=order.pk).total_cost, order.total_cost)  # в запросе не пересчитан
+
+    def test_deleting_last_tariff_clears_pending_costs(self):
+        sender = User.objects.create(username='+70000000001', phone_number='+70000000001')
+        pending, delivered = (
+            Order.objects.create(
+                sender=sender, departure_point=self.almaty, destination_point=self.astana,
+                weight=100, status=status, **pricing.quote(self.almaty, self.astana, 100).as_fields(),
+            )
+            for status in (Order.Status.PENDING, Order.Status.DELIVERED)
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tariff.delete()
+
+        pending.refresh_from_db()
+        delivered.refresh_from_db()
+        self.assertIsNone(pending.total_cost)
+        self.assertIsNotNone(delivered.total_cost)
+        self.assertIsNone(pricing.quote(self.almaty, self.astana, 100).total_cost)
+
+
+class LocalBrokerTests(SimpleTestCase):
+    async def test_publish_from_thread_reaches_all_subscribers(self):
+        broker = realtime.LocalBroker(queue_size=10)
+        first = broker.subscribe(['order:1'])
+        second = broker.subscribe(['order:1', 'driver:2'])
+        other = broker.subscribe(['order:3'])
+
+        delivered = await asyncio.to_thread(broker.publish, 'order:1', 'order.status', {'status': 'ACCEPTED'})
+
+        self.assertEqual(delivered, 2)
+        for subscription in (first, second):
+            message = await asyncio.wait_for(subscription.get(), 1)
+            self.assertEqual(message, {'event': 'order.status', 'data': {'status': 'ACCEPTED'}})
+        self.assertTrue(other.queue.empty())
+
+    async def test_slow_subscriber_keeps_newest_events(self):
+        broker = realtime.LocalBroker(queue_size=2)
+        subscription = broker.subscribe(['driver:1'])
+        for index in range(5):
+            broker.publish('driver:1', 'driver.location', {'index': index})
+        await asyncio.sleep(0)
+
+        received = [subscription.queue.get_nowait()['data']['index'] for _ in range(2)]
+        self.assertEqual(received, [3, 4])
+
+    async def test_closed_subscription_is_removed(self):
+        broker = realtime.LocalBroker()
+        subscription = broker.subscribe(['order:1'])
+        subscription.close()
+        self.assertEqual(broker.subscriber_count('order:1'), 0)
+        self.assertEqual(broker.publish('order:1', 'order.status', {}), 0)
+
+
+class CompiledSerializerTests(TestCase):
+    def setUp(self):
+        sender = User.objects.create(username='+70000000001', phone_number='+70000000001', referral_code='ABC123')
+        driver = User.objects.create(username='+70000000002', phone_number='+70000000002', role=User.Role.DRIVER)
+        almaty = Location.objects.create(city_name='Алматы', latitude='43.238949', longitude='76.889709')
+        astana = Location.objects.create(city_name='Астана')
+        cargo_type = CargoType.objects.create(name='Документы', description='Папки')
+        Order.objects.create(
+            sender=sender, departure_point=almaty, destination_point=astana, cargo_type=cargo_type,
+            weight='120.5', length='1.25', distance_km='972.25', total_cost='150837.50',
+            description='Хрупкое "стекло"',
+        )
+        Order.objects.create(
+            sender=sender, driver=driver, departure_point=astana, destination_point=almaty,
+            weight=7, status=Order.Status.ACCEPTED, accepted_at=timezone.now(), is_driver_sharing_location=True,
+        )
+
+    def assertSameBytes(self, serializer_class, queryset):
+        compiled = compile_serializer(serializer_class)
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        actual = JSONRenderer().render(compiled.data(compiled.values(queryset)))
+        self.assertEqual(actual, expected)
+
+    def test_order_output_is_byte_identical(self):
+        queryset = Order.objects.for_read().order_by('pk')
+        self.assertSameBytes(OrderReadSerializer, queryset)
+        with timezone.override('UTC'):
+            self.assertSameBytes(OrderReadSerializer, queryset)
+
+    def test_user_output_is_byte_identical(self):
+        self.assertSameBytes(UserSerializer, User.objects.order_by('pk'))
+
+    def test_values_runs_one_query(self):
+        compiled = compile_serializer(OrderReadSerializer)
+        with self.assertNumQueries(1):
+            data = compiled.data(compiled.values(Order.objects.order_by('pk')))
+        self.assertIsNone(data[1]['cargo_type'])
+        self.assertEqual(data[0]['cargo_type']['name'], 'Документы')
+
+    def test_method_fields_are_rejected(self):
+        class WithMethod(UserSerializer):
+            display = serializers.SerializerMethodField()
+
+            class Meta(UserSerializer.Meta):
+                fields = [*UserSerializer.Meta.fields, 'display']
+
+            def get_display(self, user):
+                return user.username
+
+        with self.assertRaises(ImproperlyConfigured):
+            compile_serializer(WithMethod)
+
+
+class FastJSONTests(SimpleTestCase):
+    data = {
+        'id': 7,
+        'weight': Decimal('120.50'),
+        'created_at': datetime(2025, 3, 1, 9, 30, 15, 123456, tzinfo=dt_timezone.utc),
+        'local': timezone.localtime(datetime(2025, 3, 1, 9, 30, tzinfo=dt_timezone.utc)),
+        'naive': datetime(2025, 3, 1, 9, 30),
+        'day': date(2025, 3, 1),
+        'at': time(9, 30, 1, 500),
+        'uuid': uuid.UUID(int=1),
+        'city': 'Алматы\u2028Астана\u2029',
+        'route': ('Алматы', None, 1.5, True),
+        'nested': [{1: 'one'}, {'empty': {}}],
+    }
+
+    def assertRendersLikeDRF(self, data, media_type=None):
+        renderer = fastjson.FastJSONRenderer()
+        self.assertEqual(renderer.render(data, media_type), JSONRenderer().render(data, media_type))
+
+    def test_output_matches_drf(self):
+        with patch.object(fastjson.orjson, 'dumps', wraps=fastjson.orjson.dumps) as dumps:
+            self.assertRendersLikeDRF(self.data)
+        dumps.assert_called_once()
+        self.assertRendersLikeDRF(None)
+
+    def test_falls_back_to_stdlib(self):
+        with self.subTest('backend json'), override_settings(API_JSON_BACKEND='json'), \
+                patch.object(fastjson.orjson, 'dumps') as dumps:
+            self.assertRendersLikeDRF(self.data)
+            dumps.assert_not_called()
+        with self.subTest('orjson missing'), patch.object(fastjson, 'orjson', None):
+            self.assertRendersLikeDRF(self.data)
+        with self.subTest('indent'):
+            self.assertRendersLikeDRF(self.data, 'application/json; indent=4')
+        with self.subTest('int over 64 bits'):
+            self.assertRendersLikeDRF({'big': 2 ** 70})
+
+    def parse(self, body, parser_class=fastjson.FastJSONParser):
+        return parser_class().parse(io.BytesIO(body), parser_context={'encoding': 'utf-8'})
+
+    def test_parser(self):
+        body = '{"weight": 120.5, "city": "Алматы", "big": 1180591620717411303424, "items": [1, null]}'.encode()
+        self.assertEqual(self.parse(body), self.parse(body, JSONParser))
+        self.assertEqual(self.parse(body)['big'], 2 ** 70)
+
+        for bad in (b'{"weight": NaN}', b'{"weight": ', b'\xff'):
+            with self.subTest(body=bad):
+                with self.assertRaises(ParseError) as expected:
+                    self.parse(bad, JSONParser)
+                with self.assertRaises(ParseError) as actual:
+                    self.parse(bad)
+                self.assertEqual(str(actual.exception), str(expected.exception))
+
+
+class SQLitePragmaTests(SimpleTestCase):
+    def connect(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        wrapper = DatabaseWrapper({**connection.settings_dict, 'NAME': f'{directory.name}/db.sqlite3'}, alias='pragmas')
+        self.addCleanup(wrapper.close)
+        wrapper.ensure_connection()
+        return wrapper
+
+    def test_new_connections_get_pragmas(self):
+        with self.settings(SQLITE_PRAGMAS={
+            'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 5000, 'mmap_size': 1024 * 1024,
+        }):
+            pragmas = db.sqlite_pragmas(self.connect())
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000, 'mmap_size': 1024 * 1024})
+
+    def test_pragmas_follow_settings(self):
+        with self.settings(SQLITE_PRAGMAS={'journal_mode': 'DELETE', 'busy_timeout': 0}):
+            self.assertEqual(db.sqlite_pragmas(self.connect()), {'journal_mode': 'delete', 'busy_timeout': 0})
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """Основная база — тестовая, реплика — файл SQLite со снимком основной."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        cls.replica_path = f'{directory.name}/replica.sqlite3'
+        # Алиас появляется после проверок запуска тестов, поэтому разрешается здесь, а не в databases.
+        connections.settings['replica'] = {**connection.settings_dict, 'NAME': cls.replica_path}
+        cls.addClassCleanup(connections.settings.pop, 'replica')
+        cls.addClassCleanup(lambda: connections['replica'].close())
+        cls.databases = {*cls.databases, 'replica'}
+        # Отметки записи — в общем для процессов кеше, как того требует middleware.
+        cls.enterClassContext(override_settings(
+            CACHES={**settings.CACHES, 'replica_pins': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': f'{directory.name}/pins',
+            }},
+            REPLICA_PIN_CACHE='replica_pins',
+        ))
+
+    def setUp(self):
+        replicas._cache().clear()
+
+        self.sender = User.objects.create(username='+70000000001', phone_number='+70000000001')
+        self.other = User.objects.create(username='+70000000002', phone_number='+70000000002')
+        almaty = Location.objects.create(city_name='Алматы')
+        astana = Location.objects.create(city_name='Астана')
+        self.order = Order.objects.create(
+            sender=self.sender, departure_point=almaty, destination_point=astana, weight=100
+        )
+        self.replicate()
+
+    def replicate(self):
+        connections['replica'].close()
+        connection.ensure_connection()
+        with sqlite3.connect(self.replica_path) as replica:
+            connection.connection.backup(replica)
+        replica.close()
+
+    def test_reads_go_to_replica_and_writes_to_primary(self):
+        Order.objects.filter(pk=self.order.pk).update(description='на основной')
+
+        self.assertEqual(Order.objects.all().db, 'replica')
+        self.assertEqual(Order.objects.get(pk=self.order.pk).description, '')
+        with transaction.atomic():
+            self.assertEqual(Order.objects.all().db, 'default')
+            self.assertEqual(Order.objects.select_for_update().get(pk=self.order.pk).description, 'на основной')
+        with replicas.primary():
+            self.assertEqual(Order.objects.get(pk=self.order.pk).description, 'на основной')
+
+    def test_user_is_pinned_to_primary_after_write(self):
+        client = APIClient()
+        client.force_authenticate(self.sender)
+        detail = reverse('cargo:cargo-request-detail', args=[self.order.pk])
+        # Изменение, которое реплика еще не получила.
+        Order.objects.filter(pk=self.order.pk).update(weight=150)
+        self.assertEqual(client.get(detail).data['weight'], '100.00')
+
+        response = client.patch(detail, {'description': 'Хрупкое'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(replicas.is_pinned(self.sender.pk))
+        # PATCH читал заказ из основной базы и не затер weight значением с реплики.
+        data = client.get(detail).data
+        self.assertEqual((data['weight'], data['description']), ('150.00', 'Хрупкое'))
+
+        other = APIClient()
+        other.force_authenticate(self.other)
+        self.assertEqual(other.get(reverse('users:user-detail', args=[self.other.pk])).status_code, 200)
+        self.assertFalse(replicas.is_pinned(self.other.pk))
+
+        replicas._cache().delete(replicas.pin_key(self.sender.pk))
+        self.assertEqual(client.get(detail).data['description'], '')
+
+    @override_settings(NOTIFICATION_DISPATCH_ASYNC=True)
+    def test_background_jobs_read_primary(self):
+        driver = User.objects.create(
+            username='+70000000003', phone_number='+70000000003',
+            role=User.Role.DRIVER, is_subscription_active=True,
+        )
+        order = Order.objects.create(
+            sender=self.sender, departure_point=self.order.departure_point,
+            destination_point=self.order.destination_point, weight=10, distance_km=100,
+        )
+        TariffSettings.objects.create(base_fee=1000, price_per_km=10)
+        pricing.invalidate_tariff_cache()
+        self.addCleanup(pricing.invalidate_tariff_cache)
+
+        # Ни водителя, ни заказа, ни тарифа на реплике нет.
+        self.assertEqual(dispatch._submit(dispatch.notify_new_orders, [order.pk]).result(), 1)
+        pricing.reprice_pending_orders()
+        with replicas.primary():
+            self.assertTrue(Notification.objects.filter(user=driver, order=order).exists())
+            order.refresh_from_db()
+        self.assertEqual(order.total_cost, Decimal('2000.00'))
+
+    def test_async_requests_are_routed(self):
+        async def view(request):
+            if request.method == 'POST':
+                await Order.objects.filter(pk=self.order.pk).aupdate(description='на основной')
+            return await sync_to_async(lambda: Order.objects.all().db)()
+
+        middleware = replicas.ReplicaRoutingMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        factory = RequestFactory()
+        for method, db in (('get', 'replica'), ('post', 'default')):
+            request = getattr(factory, method)('/')
+            request.user = self.sender
+            self.assertEqual(async_to_sync(middleware)(request), db)
+        self.assertTrue(replicas.is_pinned(self.sender.pk))
+
+    def test_process_local_pin_cache_is_rejected(self):
+        with self.settings(REPLICA_PIN_CACHE='default'), self.assertRaises(ImproperlyConfigured):
+            replicas.ReplicaRoutingMiddleware(lambda request: None)
+        with self.settings(REPLICA_PIN_CACHE='default', REPLICA_DATABASES=[]):
+            replicas.ReplicaRoutingMiddleware(lambda request: None)
+
+    def test_without_replicas_everything_uses_default(self):
+        with self.settings(REPLICA_DATABASES=[]):
+            self.assertEqual(Order.objects.all().db, 'default')
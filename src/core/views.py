@@ -0,0 +1,39 @@
+"""
+Базовые view DRF.
+
+DRF 3.16 async-обработчики не поддерживает: ``APIView.dispatch`` синхронный
+и вернул бы корутину вместо ответа. ``AsyncAPIView.dispatch`` повторяет его
+шаги, но ждет async-обработчик, а синхронные проверки DRF (аутентификация,
+права, троттлинг) выполняет через ``sync_to_async``. Парсеры, рендереры и
+обработчик исключений DRF при этом работают как обычно.
+"""
+import inspect
+
+from asgiref.sync import sync_to_async
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """APIView, обработчики которого — ``async def``."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
@@ -0,0 +1,101 @@
+"""
+Геометрия на сфере и geohash без внешних зависимостей.
+
+Geohash кодирует точку строкой из алфавита base32 так, что у соседних точек
+совпадает префикс. Префикс длины ``n`` задает прямоугольную ячейку, а все
+точки внутри ячейки лежат в диапазоне строк ``[prefix, prefix + '~')`` —
+такой диапазон читается обычным B-tree индексом в SQLite и PostgreSQL.
+"""
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Не больше стольких ячеек в одном запросе поиска по радиусу.
+MAX_COVERING_CELLS = 16
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    latitude, longitude = float(latitude), float(longitude)
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, value = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """Размер ячейки geohash заданной длины в градусах: (широта, долгота)."""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, map(float, (lat1, lon1, lat2, lon2)))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """Прямоугольник (min_lat, min_lon, max_lat, max_lon), содержащий круг радиуса ``radius_km``."""
+    latitude, longitude = float(latitude), float(longitude)
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = math.cos(math.radians(latitude))
+    if cos_lat < 1e-6 or abs(latitude) + delta_lat >= 90:
+        delta_lon = 180.0
+    else:
+        delta_lon = min(180.0, math.degrees(radius_km / EARTH_RADIUS_KM / cos_lat))
+    return (
+        max(-90.0, latitude - delta_lat),
+        max(-180.0, longitude - delta_lon),
+        min(90.0, latitude + delta_lat),
+        min(180.0, longitude + delta_lon),
+    )
+
+
+def covering_prefixes(box, max_cells=MAX_COVERING_CELLS):
+    """
+    Набор префиксов geohash, ячейки которых вместе покрывают прямоугольник.
+
+    Выбирается самая мелкая длина префикса, при которой ячеек не больше
+    ``max_cells``: чем мельче ячейки, тем меньше лишних строк читается из индекса.
+    """
+    min_lat, min_lon, max_lat, max_lon = box
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_step, lon_step = cell_size(precision)
+        rows = math.floor(max_lat / lat_step) - math.floor(min_lat / lat_step) + 1
+        columns = math.floor(max_lon / lon_step) - math.floor(min_lon / lon_step) + 1
+        if rows * columns <= max_cells:
+            break
+    else:
+        return {''}
+
+    prefixes = set()
+    for row in range(rows):
+        latitude = min(max_lat, min_lat + row * lat_step)
+        for column in range(columns):
+            longitude = min(max_lon, min_lon + column * lon_step)
+            prefixes.add(encode_geohash(latitude, longitude, precision))
+        prefixes.add(encode_geohash(latitude, max_lon, precision))
+    for column in range(columns):
+        longitude = min(max_lon, min_lon + column * lon_step)
+        prefixes.add(encode_geohash(max_lat, longitude, precision))
+    prefixes.add(encode_geohash(max_lat, max_lon, precision))
+    return prefixes
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from locations.models import Location, Route
+from locations.routes import build_matrix, route_cache
+
+
+class Command(BaseCommand):
+    help = 'Предрасчет матрицы расстояний между всеми локациями с координатами.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        locations = list(
+            Location.objects.filter(latitude__isnull=False, longitude__isnull=False)
+            .values_list('pk', 'latitude', 'longitude')
+        )
+        written = 0
+        with transaction.atomic():
+            for batch in build_matrix(locations, batch_size=options['batch_size']):
+                Route.objects.bulk_create(
+                    batch,
+                    update_conflicts=True,
+                    unique_fields=['origin', 'destination'],
+                    update_fields=['distance_km', 'duration_hours', 'updated_at'],
+                )
+                written += len(batch)
+        route_cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f'Локаций: {len(locations)}, маршрутов: {written}, '
+            f'время: {time.perf_counter() - started:.1f} с'
+        ))
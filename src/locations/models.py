@@ -1,10 +1,46 @@
 from django.db import models
+from django.db.models import Q
+
+from .geo import GEOHASH_PRECISION, bounding_box, covering_prefixes, encode_geohash
+
+
+def bounding_box_q(box, prefix=''):
+    """
+    Условие «точка внутри прямоугольника» для локаций.
+
+    Диапазоны по ``geohash`` отбирают ячейки по индексу, сравнение координат
+    отсекает углы ячеек, выходящие за прямоугольник.
+    """
+    min_lat, min_lon, max_lat, max_lon = box
+    cells = Q()
+    for cell in sorted(covering_prefixes(box)):
+        cells |= Q(**{f'{prefix}geohash__gte': cell, f'{prefix}geohash__lt': cell + '~'})
+    return cells & Q(**{
+        f'{prefix}latitude__gte': min_lat,
+        f'{prefix}latitude__lte': max_lat,
+        f'{prefix}longitude__gte': min_lon,
+        f'{prefix}longitude__lte': max_lon,
+    })
+
+
+class LocationQuerySet(models.QuerySet):
+    def near(self, latitude, longitude, radius_km):
+        """Локации в прямоугольнике вокруг круга; точное расстояние проверяет вызывающий код."""
+        return self.filter(bounding_box_q(bounding_box(latitude, longitude, radius_km)))
+
 
 class Location(models.Model):
     """Модель для хранения локаций (городов, точек)."""
     city_name = models.CharField(max_length=100)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    # Geohash координат для поиска по радиусу; пересчитывается при сохранении.
+    geohash = models.CharField(max_length=GEOHASH_PRECISION, blank=True, db_index=True, editable=False)
+
+    objects = LocationQuerySet.as_manager()
+
+    # Координаты на момент загрузки; None — неизвестны (новый объект или отложенные поля).
+    _loaded_coordinates = None
 
     class Meta:
         indexes = [
@@ -12,4 +48,52 @@ class Location(models.Model):
         ]
 
     def __str__(self):
-        return self.city_name
\ No newline at end of file
+        return self.city_name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # По координатам из базы сигнал решает, устарели ли маршруты локации.
+        if {'latitude', 'longitude'} <= instance.__dict__.keys():
+            instance._loaded_coordinates = instance.coordinates()
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.update_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
+        self._loaded_coordinates = self.coordinates()
+
+    def coordinates(self):
+        """Пара ``(latitude, longitude)`` в Decimal, даже если атрибутам присвоены строки или float."""
+        field = self._meta.get_field
+        return field('latitude').to_python(self.latitude), field('longitude').to_python(self.longitude)
+
+    def coordinates_changed(self):
+        return self._loaded_coordinates is None or self._loaded_coordinates != self.coordinates()
+
+    def update_geohash(self):
+        if self.latitude is None or self.longitude is None:
+            self.geohash = ''
+        else:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+
+
+class Route(models.Model):
+    """Расстояние и время в пути между двумя локациями. Пара хранится один раз: origin_id < destination_id."""
+    origin = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='+')
+    destination = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='+')
+    distance_km = models.DecimalField(max_digits=10, decimal_places=2)
+    duration_hours = models.DecimalField(max_digits=5, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['origin', 'destination'], name='locations_route_unique_pair'),
+            models.CheckConstraint(condition=Q(origin__lt=models.F('destination')), name='locations_route_ordered_pair'),
+        ]
+
+    def __str__(self):
+        return f"{self.origin_id} ↔ {self.destination_id}: {self.distance_km} км"
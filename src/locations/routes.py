@@ -0,0 +1,181 @@
+"""
+Матрица расстояний между локациями.
+
+Поиск маршрута идет по трем уровням: LRU в памяти процесса, таблица ``Route``
+и, если пары еще нет, расчет по координатам с сохранением в таблицу.
+Пара симметрична и хранится с ключом ``(min_id, max_id)``; в ключе LRU к
+нему добавлены координаты обеих локаций, так что после переноса локации
+ни один процесс не отдаст расстояние по старым координатам.
+"""
+import math
+import threading
+from collections import OrderedDict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db.models import Q
+
+from .geo import EARTH_RADIUS_KM, haversine_km
+from .models import Location, Route
+
+CENT = Decimal('0.01')
+LOOKUP_CHUNK_SIZE = 250
+ZERO_ROUTE = (Decimal('0.00'), Decimal('0.00'))
+
+
+class RouteCache:
+    """Потокобезопасный LRU ``((min_id, max_id), coords_min, coords_max) -> (distance_km, duration_hours)``."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_location(self, location_id):
+        with self._lock:
+            for key in [key for key in self._data if location_id in key[0]]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+route_cache = RouteCache(settings.ROUTE_CACHE_SIZE)
+
+
+def pair_key(first_id, second_id):
+    return (first_id, second_id) if first_id <= second_id else (second_id, first_id)
+
+
+def estimate(departure_coords, destination_coords):
+    """Дорожное расстояние и время в пути между двумя парами координат."""
+    if None in departure_coords or None in destination_coords:
+        return None
+    straight_km = haversine_km(*departure_coords, *destination_coords)
+    return _round_route(straight_km)
+
+
+def _round_route(straight_km):
+    distance = (Decimal(straight_km) * Decimal(str(settings.ROUTE_ROAD_FACTOR))).quantize(CENT, ROUND_HALF_UP)
+    hours = (distance / Decimal(str(settings.ROUTE_AVERAGE_SPEED_KMH))).quantize(CENT, ROUND_HALF_UP)
+    return distance, hours
+
+
+def get_routes(pairs, locations=None):
+    """
+    Маршруты для набора пар id локаций: ``{(min_id, max_id): (distance_km, duration_hours)}``.
+
+    Координаты локаций читаются одним запросом (уже загруженные можно
+    передать в ``locations``, ``{id: Location}``), промахи LRU — из ``Route``
+    одним запросом на каждые ``LOOKUP_CHUNK_SIZE`` пар; недостающие пары
+    считаются по координатам и сохраняются одним ``bulk_create``. Пары без
+    координат в результат не попадают.
+    """
+    result, keys = {}, set()
+    for first_id, second_id in pairs:
+        key = pair_key(first_id, second_id)
+        if key[0] == key[1]:
+            result[key] = ZERO_ROUTE
+        else:
+            keys.add(key)
+    if not keys:
+        return result
+
+    coords = _coordinates({pk for key in keys for pk in key}, locations)
+    missing = set()
+    for key in keys:
+        if None in coords.get(key[0], (None,)) or None in coords.get(key[1], (None,)):
+            continue
+        cached = route_cache.get((key, coords[key[0]], coords[key[1]]))
+        if cached is None:
+            missing.add(key)
+        else:
+            result[key] = cached
+    if not missing:
+        return result
+
+    pending = sorted(missing)
+    for start in range(0, len(pending), LOOKUP_CHUNK_SIZE):
+        condition = Q()
+        for origin_id, destination_id in pending[start:start + LOOKUP_CHUNK_SIZE]:
+            condition |= Q(origin_id=origin_id, destination_id=destination_id)
+        stored = Route.objects.filter(condition).values_list(
+            'origin_id', 'destination_id', 'distance_km', 'duration_hours'
+        )
+        for origin_id, destination_id, distance, hours in stored:
+            key = (origin_id, destination_id)
+            missing.discard(key)
+            result[key] = (distance, hours)
+            route_cache.set((key, coords[origin_id], coords[destination_id]), (distance, hours))
+    if not missing:
+        return result
+
+    new_routes = []
+    for key in missing:
+        route = estimate(coords[key[0]], coords[key[1]])
+        result[key] = route
+        route_cache.set((key, coords[key[0]], coords[key[1]]), route)
+        new_routes.append(Route(origin_id=key[0], destination_id=key[1], distance_km=route[0], duration_hours=route[1]))
+    Route.objects.bulk_create(new_routes, ignore_conflicts=True)
+    return result
+
+
+def _coordinates(ids, locations):
+    coords = {pk: location.coordinates() for pk, location in (locations or {}).items() if pk in ids}
+    unknown = ids - coords.keys()
+    if unknown:
+        coords.update(
+            (pk, (lat, lon))
+            for pk, lat, lon in Location.objects.filter(pk__in=unknown).values_list('pk', 'latitude', 'longitude')
+        )
+    return coords
+
+
+def get_route(departure, destination):
+    """Маршрут между двумя локациями или ``None``, если у одной из них нет координат."""
+    key = pair_key(departure.pk, destination.pk)
+    return get_routes([key], {departure.pk: departure, destination.pk: destination}).get(key)
+
+
+def build_matrix(locations, batch_size=5000):
+    """
+    Генератор пачек ``Route`` для всех пар из ``locations`` (список ``(id, lat, lon)``).
+
+    Синусы и косинусы широт считаются один раз на локацию, а не на пару.
+    """
+    points = sorted(
+        (pk, math.radians(float(lat)), math.radians(float(lon)))
+        for pk, lat, lon in locations
+        if lat is not None and lon is not None
+    )
+    cos_lat = [math.cos(lat) for _, lat, _ in points]
+    batch = []
+    for i, (origin_id, lat1, lon1) in enumerate(points):
+        for j in range(i + 1, len(points)):
+            destination_id, lat2, lon2 = points[j]
+            a = math.sin((lat2 - lat1) / 2) ** 2 + cos_lat[i] * cos_lat[j] * math.sin((lon2 - lon1) / 2) ** 2
+            distance, hours = _round_route(2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a))))
+            batch.append(Route(
+                origin_id=origin_id, destination_id=destination_id,
+                distance_km=distance, duration_hours=hours,
+            ))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
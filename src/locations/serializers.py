@@ -0,0 +1,13 @@
+from rest_framework import serializers
+
+
+class RouteQuerySerializer(serializers.Serializer):
+    origin = serializers.IntegerField(min_value=1)
+    destination = serializers.IntegerField(min_value=1)
+
+
+class RouteSerializer(serializers.Serializer):
+    origin = serializers.IntegerField()
+    destination = serializers.IntegerField()
+    distance_km = serializers.DecimalField(max_digits=10, decimal_places=2)
+    duration_hours = serializers.DecimalField(max_digits=5, decimal_places=2)
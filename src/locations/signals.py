@@ -0,0 +1,18 @@
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Location, Route
+from .routes import route_cache
+
+
+@receiver(post_save, sender=Location)
+def location_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and 'geohash' not in update_fields):
+        return
+    if not instance.coordinates_changed():
+        return
+    # Сохраненные маршруты считались по старым координатам. LRU других
+    # процессов старые расстояния не отдаст: в его ключе есть координаты.
+    Route.objects.filter(Q(origin=instance) | Q(destination=instance)).delete()
+    route_cache.discard_location(instance.pk)
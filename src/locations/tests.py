@@ -1,3 +1,123 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from users.models import User
+from .models import Location, Route
+from .routes import get_route, get_routes, pair_key, route_cache
+
+
+class RouteMatrixTests(TestCase):
+    def setUp(self):
+        route_cache.clear()
+        self.almaty = Location.objects.create(city_name='Алматы', latitude='43.238949', longitude='76.889709')
+        self.astana = Location.objects.create(city_name='Астана', latitude='51.169392', longitude='71.449074')
+        self.shymkent = Location.objects.create(city_name='Шымкент', latitude='42.341700', longitude='69.590100')
+
+    def test_route_is_computed_once_and_stored_symmetrically(self):
+        forward = get_route(self.almaty, self.astana)
+        self.assertEqual(Route.objects.count(), 1)
+        route = Route.objects.get()
+        self.assertLess(route.origin_id, route.destination_id)
+
+        with self.assertNumQueries(0):
+            backward = get_route(self.astana, self.almaty)
+        self.assertEqual(forward, backward)
+
+    def test_stored_route_is_read_without_recomputing(self):
+        Route.objects.create(
+            origin=self.almaty, destination=self.astana, distance_km='1000.00', duration_hours='16.00'
+        )
+        with self.assertNumQueries(1):
+            route = get_route(self.astana, self.almaty)
+        self.assertEqual(str(route[0]), '1000.00')
+
+    def test_batch_lookup_uses_fixed_number_of_queries(self):
+        pairs = [(self.almaty.pk, self.astana.pk), (self.shymkent.pk, self.almaty.pk), (self.astana.pk, self.shymkent.pk)]
+        # Чтение Route, координаты локаций и bulk_create новых маршрутов.
+        with self.assertNumQueries(3):
+            routes = get_routes(pairs)
+        self.assertEqual(set(routes), {pair_key(*pair) for pair in pairs})
+
+    def test_moving_location_drops_its_routes(self):
+        get_route(self.almaty, self.astana)
+        self.almaty.latitude = '43.300000'
+        self.almaty.save()
+        self.assertFalse(Route.objects.exists())
+
+    def test_saving_without_moving_keeps_routes(self):
+        get_route(self.almaty, self.astana)
+        almaty = Location.objects.get(pk=self.almaty.pk)
+        almaty.city_name = 'Алма-Ата'
+        almaty.latitude = '43.238949'
+        almaty.save()
+
+        self.assertTrue(Route.objects.exists())
+        with self.assertNumQueries(0):
+            get_route(almaty, self.astana)
+
+    def test_moving_location_evicts_only_its_pairs(self):
+        get_route(self.almaty, self.astana)
+        get_route(self.astana, self.shymkent)
+        self.almaty.latitude = '43.300000'
+        self.almaty.save()
+
+        self.assertEqual(Route.objects.count(), 1)
+        with self.assertNumQueries(0):
+            get_route(self.astana, self.shymkent)
+
+    def test_other_process_move_is_not_served_from_lru(self):
+        before = get_route(self.almaty, self.astana)
+        # Локацию перенес другой процесс: его сигнал удалил строки Route, а LRU этого процесса не тронут.
+        with patch.object(route_cache, 'discard_location'):
+            self.almaty.latitude = '45.000000'
+            self.almaty.save()
+
+        after = get_routes([(self.almaty.pk, self.astana.pk)])[pair_key(self.almaty.pk, self.astana.pk)]
+        self.assertNotEqual(after, before)
+
+    def test_build_distance_matrix_command(self):
+        Location.objects.create(city_name='Без координат')
+        call_command('build_distance_matrix', batch_size=2, stdout=StringIO())
+        self.assertEqual(Route.objects.count(), 3)
+
+        stored = Route.objects.get(origin=self.almaty, destination=self.astana)
+        route_cache.clear()
+        Route.objects.all().delete()
+        self.assertEqual(get_route(self.almaty, self.astana)[0], stored.distance_km)
+
+
+class RouteAPITests(TestCase):
+    def setUp(self):
+        route_cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create(username='+70000000001', phone_number='+70000000001')
+        self.almaty = Location.objects.create(city_name='Алматы', latitude='43.238949', longitude='76.889709')
+        self.astana = Location.objects.create(city_name='Астана', latitude='51.169392', longitude='71.449074')
+        self.url = reverse('locations:route')
+
+    def test_route_lookup(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.url, {'origin': self.astana.pk, 'destination': self.almaty.pk})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['origin'], self.astana.pk)
+        self.assertEqual(response.data['distance_km'], str(Route.objects.get().distance_km))
+
+    def test_unknown_location(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.url, {'origin': self.almaty.pk, 'destination': 999})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_same_location(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.url, {'origin': self.almaty.pk, 'destination': self.almaty.pk})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['distance_km'], '0.00')
 
-# Create your tests here.
+        response = self.client.get(self.url, {'origin': 999, 'destination': 999})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
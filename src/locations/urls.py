@@ -5,5 +5,5 @@ from .views import *
 app_name = 'locations'
 
 urlpatterns = [
-
-]
\ No newline at end of file
+    path('routes/', RouteAPIView.as_view(), name='route'),
+]
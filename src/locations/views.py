@@ -1,3 +1,35 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import permissions
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from .models import Location
+from .routes import get_routes, pair_key
+from .serializers import RouteQuerySerializer, RouteSerializer
+
+
+class RouteAPIView(APIView):
+    """Расстояние и время в пути между двумя локациями из матрицы маршрутов"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(query_serializer=RouteQuerySerializer, responses={200: RouteSerializer})
+    def get(self, request):
+        query = RouteQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        origin_id, destination_id = query.validated_data['origin'], query.validated_data['destination']
+        if origin_id == destination_id:
+            # get_routes отвечает нулевым маршрутом, не заглядывая в базу.
+            get_object_or_404(Location, pk=origin_id)
+        route = get_routes([(origin_id, destination_id)]).get(pair_key(origin_id, destination_id))
+        if route is None:
+            get_object_or_404(Location, pk=origin_id)
+            get_object_or_404(Location, pk=destination_id)
+            raise ValidationError('У одной из локаций не заданы координаты')
+        return Response(RouteSerializer({
+            'origin': origin_id,
+            'destination': destination_id,
+            'distance_km': route[0],
+            'duration_hours': route[1],
+        }).data)
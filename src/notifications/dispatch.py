@@ -0,0 +1,119 @@
+"""
+Рассылка уведомлений о новых заказах водителям.
+
+Рассылка запускается после коммита создания заказа и выполняется в пуле
+потоков, поэтому время ответа ``CargoRequestViewSet.create`` не зависит от
+числа водителей. Строки ``Notification`` пишутся пачками через ``bulk_create``.
+Рассылка читает основную базу (``replicas.primary``): контекст запроса в
+поток не переходит, а реплика может еще не знать о новом заказе.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from cargo.models import Order
+from core import replicas
+from locations.geo import bounding_box, haversine_km
+from users.models import User
+from . import unread
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.NOTIFICATION_DISPATCH_WORKERS,
+    thread_name_prefix='notifications',
+)
+
+
+def schedule_new_orders(order_ids):
+    """Ставит рассылку в очередь после успешного коммита текущей транзакции."""
+    order_ids = list(order_ids)
+    transaction.on_commit(lambda: _submit(notify_new_orders, order_ids))
+
+
+def _submit(func, *args):
+    if not settings.NOTIFICATION_DISPATCH_ASYNC:
+        return func(*args)
+    return _executor.submit(_run_in_worker, func, *args)
+
+
+def _run_in_worker(func, *args):
+    try:
+        return func(*args)
+    except Exception:
+        logger.exception('Ошибка рассылки уведомлений')
+    finally:
+        close_old_connections()
+
+
+def target_driver_ids(order):
+    """
+    Водители с активной подпиской. Если задан ``NOTIFICATION_NEW_ORDER_RADIUS_KM``,
+    только те, чья последняя позиция в этом радиусе от точки отправления.
+    """
+    drivers = User.objects.filter(role=User.Role.DRIVER, is_active=True, is_subscription_active=True)
+    radius_km = settings.NOTIFICATION_NEW_ORDER_RADIUS_KM
+    departure = order.departure_point
+    if not radius_km or departure.latitude is None or departure.longitude is None:
+        return drivers.values_list('pk', flat=True).iterator(chunk_size=settings.NOTIFICATION_BATCH_SIZE)
+
+    min_lat, min_lon, max_lat, max_lon = bounding_box(departure.latitude, departure.longitude, radius_km)
+    nearby = drivers.filter(
+        driverlocation__latitude__range=(min_lat, max_lat),
+        driverlocation__longitude__range=(min_lon, max_lon),
+    ).values_list('pk', 'driverlocation__latitude', 'driverlocation__longitude')
+    return (
+        pk for pk, latitude, longitude in nearby.iterator(chunk_size=settings.NOTIFICATION_BATCH_SIZE)
+        if haversine_km(departure.latitude, departure.longitude, latitude, longitude) <= radius_km
+    )
+
+
+@replicas.primary()
+def notify_new_orders(order_ids):
+    """Создает уведомления ``NEW_ORDER``. Возвращает число созданных строк."""
+    batch_size = settings.NOTIFICATION_BATCH_SIZE
+    orders = Order.objects.open().filter(pk__in=order_ids).select_related('departure_point', 'destination_point')
+    created = 0
+    for order in orders:
+        title = 'Новый заказ'
+        message = (
+            f'{order.departure_point.city_name} → {order.destination_point.city_name}, '
+            f'{order.weight} кг'
+        )
+        batch = []
+        for driver_id in target_driver_ids(order):
+            batch.append(Notification(
+                user_id=driver_id, type=Notification.Type.NEW_ORDER,
+                title=title, message=message, order=order,
+            ))
+            if len(batch) >= batch_size:
+                created += _write(batch)
+                batch = []
+        created += _write(batch)
+    return created
+
+
+def _write(notifications):
+    if not notifications:
+        return 0
+    Notification.objects.bulk_create(notifications)
+    unread.invalidate(notification.user_id for notification in notifications)
+    return len(notifications)
+
+
+ORDER_STATUS_NOTIFICATIONS = {
+    Order.Status.ACCEPTED: (Notification.Type.ORDER_ACCEPTED, 'Заказ принят'),
+    Order.Status.DELIVERED: (Notification.Type.ORDER_DELIVERED, 'Заказ доставлен'),
+}
+
+
+def notify_order_status(order):
+    """Уведомляет отправителя о принятии или доставке его заказа."""
+    if order.status not in ORDER_STATUS_NOTIFICATIONS:
+        return 0
+    type_, title = ORDER_STATUS_NOTIFICATIONS[order.status]
+    message = f'Заказ #{order.pk}: {order.get_status_display().lower()}'
+    return _write([Notification(user_id=order.sender_id, type=type_, title=title, message=message, order=order)])
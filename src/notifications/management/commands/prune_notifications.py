@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from notifications import unread
+from notifications.models import Notification
+
+
+class Command(BaseCommand):
+    help = 'Удаляет прочитанные уведомления старше срока хранения пачками, не блокируя таблицу надолго.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.NOTIFICATION_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        expired = Notification.objects.filter(is_read=True, created_at__lt=cutoff).order_by()
+        deleted = 0
+        while True:
+            rows = list(expired.values_list('pk', 'user_id')[:options['batch_size']])
+            if not rows:
+                break
+            Notification.objects.filter(pk__in=[pk for pk, _ in rows]).delete()
+            unread.invalidate(user_id for _, user_id in rows)
+            deleted += len(rows)
+        self.stdout.write(self.style.SUCCESS(f'Удалено уведомлений: {deleted}'))
@@ -1,3 +1,271 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from cargo.models import Order
+from locations.models import Location
+from users.models import DriverLocation, User
+from . import unread
+from .dispatch import notify_new_orders
+from .models import Notification
+
+
+class NotificationFeedTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='+70000000001',
+            phone_number='+70000000001',
+            password='StrongPass123!',
+            role=User.Role.DRIVER,
+            email='driver@example.com'
+        )
+        self.other = User.objects.create_user(
+            username='+70000000002',
+            phone_number='+70000000002',
+            password='StrongPass123!',
+            email='other@example.com'
+        )
+        self.list_url = reverse('notifications:notification-list')
+
+    def _notify(self, user, count):
+        return Notification.objects.bulk_create(
+            Notification(
+                user=user,
+                type=Notification.Type.NEW_ORDER,
+                title=f'Новый заказ {index}',
+                message='Появился новый заказ',
+            )
+            for index in range(count)
+        )
+
+    def test_feed_contains_only_own_notifications(self):
+        own = self._notify(self.user, 2)
+        self._notify(self.other, 1)
+        self.client.force_authenticate(self.user)
+
+        response = self.client.get(self.list_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = {item['id'] for item in response.data['results']}
+        self.assertEqual(ids, {notification.id for notification in own})
+
+    def test_feed_is_cursor_paginated(self):
+        self._notify(self.user, 5)
+        self.client.force_authenticate(self.user)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.list_url, {'page_size': 2})
+
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertNotIn('count', response.data)
+        self.assertIn('cursor=', response.data['next'])
+
+    def test_feed_is_described_in_swagger(self):
+        response = self.client.get(reverse('schema-json', kwargs={'format': '.json'}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('/notifications/', response.json()['paths'])
+
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create(username='+70000000001', phone_number='+70000000001')
+        self.other = User.objects.create(
+            username='+70000000002', phone_number='+70000000002', referral_code='OTHER'
+        )
+        self.client.force_authenticate(self.user)
+
+    def _notify(self, user, count, **fields):
+        return Notification.objects.bulk_create(
+            Notification(user=user, type=Notification.Type.ORDER_ACCEPTED, title='Заказ принят', message='', **fields)
+            for _ in range(count)
+        )
+
+    def _unread(self):
+        return self.client.get(reverse('notifications:notification-unread-count')).data['unread']
+
+    def test_unread_count_is_served_from_cache(self):
+        self._notify(self.user, 3)
+        self._notify(self.user, 2, is_read=True)
+        self._notify(self.other, 4)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self._unread(), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._unread(), 3)
+
+    def test_mark_all_read_is_single_update(self):
+        self._notify(self.user, 5)
+        self._notify(self.other, 1)
+        self.assertEqual(self._unread(), 5)
+
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('notifications:notification-mark-all-read'))
+
+        self.assertEqual(response.data, {'updated': 5})
+        self.assertEqual(self._unread(), 0)
+        self.assertEqual(Notification.objects.filter(is_read=False).count(), 1)
+
+    def test_mark_all_read_keeps_concurrent_notification(self):
+        self._notify(self.user, 2)
+        self.assertEqual(self._unread(), 2)
+        update = QuerySet.update
+
+        def update_then_notify(queryset, **kwargs):
+            # Рассылка (dispatch._write) успевает записать уведомление сразу после UPDATE.
+            updated = update(queryset, **kwargs)
+            self._notify(self.user, 1)
+            unread.invalidate([self.user.pk])
+            return updated
+
+        with patch.object(QuerySet, 'update', update_then_notify):
+            unread.mark_all_read(self.user.pk)
+        self.assertEqual(self._unread(), 1)
+
+    def test_count_read_before_commit_is_not_kept(self):
+        self.assertEqual(self._unread(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self._notify(self.user, 1)
+                unread.invalidate([self.user.pk])
+                # Параллельный запрос до коммита еще видит 0 и кладет его в кеш.
+                cache.set(unread.cache_key(self.user.pk), 0)
+
+        self.assertEqual(self._unread(), 1)
+
+    def test_mark_read_touches_only_own_notifications(self):
+        own = self._notify(self.user, 3)
+        foreign = self._notify(self.other, 1)
+        self.assertEqual(self._unread(), 3)
+
+        response = self.client.post(
+            reverse('notifications:notification-mark-read'),
+            {'ids': [own[0].pk, own[1].pk, foreign[0].pk]},
+            format='json',
+        )
+
+        self.assertEqual(response.data, {'updated': 2})
+        self.assertEqual(self._unread(), 1)
+        self.assertFalse(Notification.objects.get(pk=foreign[0].pk).is_read)
+
+    def test_writes_invalidate_counter(self):
+        self.assertEqual(self._unread(), 0)
+        Notification.objects.create(user=self.user, type=Notification.Type.ORDER_ACCEPTED, title='Заказ принят', message='')
+        self.assertEqual(self._unread(), 1)
+
+        order_sender = User.objects.create(username='+70000000003', phone_number='+70000000003', referral_code='SND')
+        driver = User.objects.create(
+            username='+70000000004', phone_number='+70000000004', role=User.Role.DRIVER,
+            is_subscription_active=True, referral_code='DRV',
+        )
+        self.assertEqual(unread.unread_count(driver.pk), 0)
+        almaty = Location.objects.create(city_name='Алматы', latitude='43.238949', longitude='76.889709')
+        order = Order.objects.create(
+            sender=order_sender, departure_point=almaty, destination_point=almaty, weight=1
+        )
+        notify_new_orders([order.pk])
+
+        self.assertEqual(unread.unread_count(driver.pk), 1)
+
+    def test_prune_deletes_only_old_read_notifications(self):
+        old = timezone.now() - timedelta(days=120)
+        stale = self._notify(self.user, 5, is_read=True)
+        unread_old = self._notify(self.user, 1)
+        fresh = self._notify(self.user, 1, is_read=True)
+        Notification.objects.filter(pk__in=[n.pk for n in stale + unread_old]).update(created_at=old)
+
+        out = StringIO()
+        call_command('prune_notifications', days=90, batch_size=2, stdout=out)
+
+        self.assertIn('5', out.getvalue())
+        self.assertEqual(
+            set(Notification.objects.values_list('pk', flat=True)), {unread_old[0].pk, fresh[0].pk}
+        )
+
+
+@override_settings(NOTIFICATION_DISPATCH_ASYNC=False, NOTIFICATION_BATCH_SIZE=3)
+class NewOrderDispatchTests(TestCase):
+    def setUp(self):
+        self.sender = User.objects.create(
+            username='+70000000001', phone_number='+70000000001', role=User.Role.SENDER
+        )
+        self.drivers = User.objects.bulk_create(
+            User(
+                username=f'+7700000010{index}', phone_number=f'+7700000010{index}',
+                role=User.Role.DRIVER, is_subscription_active=index < 7, referral_code=f'DRV{index}',
+            )
+            for index in range(9)
+        )
+        self.almaty = Location.objects.create(city_name='Алматы', latitude='43.238949', longitude='76.889709')
+        self.astana = Location.objects.create(city_name='Астана', latitude='51.169392', longitude='71.449074')
+
+    def _order(self):
+        return Order.objects.create(
+            sender=self.sender, departure_point=self.almaty, destination_point=self.astana, weight=100
+        )
+
+    def test_subscribed_drivers_are_notified_in_batches(self):
+        order = self._order()
+        # Заказ, id водителей и три bulk_create по NOTIFICATION_BATCH_SIZE строк.
+        with self.assertNumQueries(5):
+            created = notify_new_orders([order.pk])
+
+        self.assertEqual(created, 7)
+        notified = set(Notification.objects.filter(order=order).values_list('user_id', flat=True))
+        self.assertEqual(notified, {driver.pk for driver in self.drivers[:7]})
+        self.assertEqual(Notification.objects.filter(type=Notification.Type.NEW_ORDER).count(), 7)
+
+    @override_settings(NOTIFICATION_NEW_ORDER_RADIUS_KM=50)
+    def test_proximity_targeting(self):
+        DriverLocation.objects.create(driver=self.drivers[0], latitude='43.250000', longitude='76.900000')
+        DriverLocation.objects.create(driver=self.drivers[1], latitude='51.169392', longitude='71.449074')
+        DriverLocation.objects.create(driver=self.drivers[8], latitude='43.250000', longitude='76.900000')
+
+        notify_new_orders([self._order().pk])
+
+        self.assertEqual(list(Notification.objects.values_list('user_id', flat=True)), [self.drivers[0].pk])
+
+    def test_create_schedules_dispatch_after_commit(self):
+        self.client.force_login(self.sender)
+        payload = {'departure_point': self.almaty.pk, 'destination_point': self.astana.pk, 'weight': 10}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('cargo:cargo-request-list'), payload, content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Notification.objects.filter(order=Order.objects.get()).count(), 7)
+
+    @override_settings(NOTIFICATION_DISPATCH_ASYNC=True)
+    def test_create_latency_does_not_depend_on_driver_count(self):
+        self.client.force_login(self.sender)
+        payload = {'departure_point': self.almaty.pk, 'destination_point': self.astana.pk, 'weight': 10}
+        url = reverse('cargo:cargo-request-list')
+
+        with patch('notifications.dispatch._executor') as executor:
+            self.client.post(url, payload, content_type='application/json')  # прогрев кешей тарифа и маршрутов
+            with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as few_drivers:
+                self.client.post(url, payload, content_type='application/json')
+            User.objects.bulk_create(
+                User(
+                    username=f'+7700000200{index}', phone_number=f'+7700000200{index}',
+                    role=User.Role.DRIVER, is_subscription_active=True, referral_code=f'MORE{index}',
+                )
+                for index in range(50)
+            )
+            with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(len(few_drivers)):
+                self.client.post(url, payload, content_type='application/json')
+
+        self.assertEqual(executor.submit.call_count, 2)
+        self.assertFalse(Notification.objects.exists())
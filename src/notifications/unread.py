@@ -0,0 +1,46 @@
+"""
+Кешированный счетчик непрочитанных уведомлений.
+
+Счетчик читается из кеша Django и пересчитывается ``COUNT(*)`` по индексу
+``(user, is_read)`` только при промахе. Любая запись, меняющая число
+непрочитанных, сбрасывает ключ. Записывать известное значение нельзя:
+уведомление, созданное между UPDATE и записью в кеш, потерялось бы в счетчике.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Notification
+
+
+def cache_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def unread_count(user_id):
+    key = cache_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        cache.set(key, count, settings.NOTIFICATION_UNREAD_CACHE_TIMEOUT)
+    return count
+
+
+def invalidate(user_ids):
+    # И после коммита: COUNT, прочитанный до коммита, закешировал бы старое число.
+    keys = [cache_key(user_id) for user_id in set(user_ids)]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def mark_all_read(user_id):
+    updated = Notification.objects.filter(user_id=user_id, is_read=False).update(is_read=True)
+    invalidate([user_id])
+    return updated
+
+
+def mark_read(user_id, ids):
+    updated = Notification.objects.filter(user_id=user_id, pk__in=ids, is_read=False).update(is_read=True)
+    if updated:
+        invalidate([user_id])
+    return updated
@@ -1,9 +1,12 @@
 from django.urls import path, include
-from rest_framework.routers import DefaultRouter
+from rest_framework.routers import SimpleRouter
 from .views import *
 
 app_name = 'notifications'
 
-urlpatterns = [
+router = SimpleRouter()
+router.register('', NotificationViewSet, basename='notification')
 
-]
\ No newline at end of file
+urlpatterns = [
+    path('', include(router.urls)),
+]
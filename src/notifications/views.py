@@ -1,3 +1,43 @@
-from django.shortcuts import render
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import permissions
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.viewsets import ReadOnlyModelViewSet
 
-# Create your views here.
+from core.pagination import CreatedAtCursorPagination
+from . import unread
+from .models import Notification
+from .serializers import MarkReadSerializer, NotificationSerializer
+
+
+class NotificationViewSet(ReadOnlyModelViewSet):
+    """Лента уведомлений текущего пользователя, от новых к старым."""
+
+    serializer_class = NotificationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
+    filterset_fields = ['is_read', 'type']
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            # drf_yasg строит схему фильтров без пользователя.
+            return Notification.objects.none()
+        return Notification.objects.filter(user=self.request.user).order_by('-created_at')
+
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        """Число непрочитанных уведомлений (из кеша)"""
+        return Response({'unread': unread.unread_count(request.user.pk)})
+
+    @action(detail=False, methods=['post'])
+    def mark_all_read(self, request):
+        """Отметить все уведомления прочитанными одним UPDATE"""
+        return Response({'updated': unread.mark_all_read(request.user.pk)})
+
+    @swagger_auto_schema(request_body=MarkReadSerializer)
+    @action(detail=False, methods=['post'])
+    def mark_read(self, request):
+        """Отметить прочитанными уведомления из списка ``ids``"""
+        serializer = MarkReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'updated': unread.mark_read(request.user.pk, serializer.validated_data['ids'])})
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:45
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def fill_summaries(apps, schema_editor):
+    Review = apps.get_model('reviews', 'Review')
+    RatingSummary = apps.get_model('reviews', 'RatingSummary')
+    stars = {f'stars_{star}': Count('pk', filter=Q(rating=star)) for star in range(1, 6)}
+    rows = Review.objects.order_by().values('reviewed_user_id').annotate(count=Count('pk'), total=Sum('rating'), **stars)
+    RatingSummary.objects.bulk_create(
+        (
+            RatingSummary(user_id=row.pop('reviewed_user_id'), average=row['total'] / row['count'], **row)
+            for row in rows.iterator(chunk_size=2000)
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0001_initial'),
+        ('users', '0003_drivertrackpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('average', models.FloatField(default=0)),
+                ('stars_1', models.PositiveIntegerField(default=0)),
+                ('stars_2', models.PositiveIntegerField(default=0)),
+                ('stars_3', models.PositiveIntegerField(default=0)),
+                ('stars_4', models.PositiveIntegerField(default=0)),
+                ('stars_5', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='rating',
+            field=models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)]),
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
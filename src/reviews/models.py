@@ -1,3 +1,4 @@
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from users.models import User
 from cargo.models import Order
@@ -7,7 +8,7 @@ class Review(models.Model):
     order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='review')
     reviewer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='given_reviews')
     reviewed_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_reviews')
-    rating = models.PositiveSmallIntegerField()
+    rating = models.PositiveSmallIntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     comment = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -15,4 +16,34 @@ class Review(models.Model):
         unique_together = ['order', 'reviewer']
 
     def __str__(self):
-        return f"Отзыв от {self.reviewer} для {self.reviewed_user}"
\ No newline at end of file
+        return f"Отзыв от {self.reviewer} для {self.reviewed_user}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем оценку из базы, чтобы сигнал мог поправить сводку при ее изменении.
+        instance._loaded_rating = instance.__dict__.get('rating')
+        return instance
+
+
+class RatingSummary(models.Model):
+    """Денормализованная сводка оценок пользователя; обновляется сигналами отзывов."""
+    STARS = range(1, 6)
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    count = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    average = models.FloatField(default=0)
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Рейтинг {self.user}: {self.average:.2f} ({self.count})"
+
+    @property
+    def histogram(self):
+        return {star: getattr(self, f'stars_{star}') for star in self.STARS}
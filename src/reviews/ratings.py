@@ -0,0 +1,72 @@
+"""
+Инкрементальное обновление ``RatingSummary``.
+
+Каждое изменение отзыва превращается в один ``UPDATE`` с выражениями ``F()``,
+поэтому параллельные отзывы одному пользователю не теряют друг друга.
+Среднее пересчитывается в том же запросе из старых значений столбцов.
+"""
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import RatingSummary, Review
+
+
+def _apply(user_id, count_delta, total_delta, histogram_delta):
+    count = F('count') + count_delta
+    total = F('total') + total_delta
+    fields = {
+        'count': count,
+        'total': total,
+        'average': Case(
+            When(**{'count__lte': -count_delta}, then=Value(0.0)),
+            default=Cast(total, FloatField()) / count,
+            output_field=FloatField(),
+        ),
+        'updated_at': timezone.now(),
+    }
+    for star, delta in histogram_delta.items():
+        field = f'stars_{star}'
+        fields[field] = F(field) + delta
+    return RatingSummary.objects.filter(user_id=user_id).update(**fields)
+
+
+def review_added(user_id, rating):
+    if not _apply(user_id, 1, rating, {rating: 1}):
+        # Первой оценке нужна строка сводки; при гонке ее создаст только один.
+        RatingSummary.objects.bulk_create([RatingSummary(user_id=user_id)], ignore_conflicts=True)
+        _apply(user_id, 1, rating, {rating: 1})
+
+
+def review_removed(user_id, rating):
+    # Строки может уже не быть, если удаляется сам пользователь: тогда обновлять нечего.
+    _apply(user_id, -1, -rating, {rating: -1})
+
+
+def review_changed(user_id, old_rating, new_rating):
+    _apply(user_id, 0, new_rating - old_rating, {old_rating: -1, new_rating: 1})
+
+
+def rebuild(batch_size=1000):
+    """Пересобирает все сводки из таблицы отзывов одним агрегирующим запросом."""
+    aggregates = {f'stars_{star}': Count('pk', filter=Q(rating=star)) for star in RatingSummary.STARS}
+    rows = (
+        Review.objects.order_by()
+        .values('reviewed_user_id')
+        .annotate(count=Count('pk'), total=Sum('rating'), **aggregates)
+    )
+    created = 0
+    with transaction.atomic():
+        RatingSummary.objects.all().delete()
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            user_id = row.pop('reviewed_user_id')
+            batch.append(RatingSummary(user_id=user_id, average=row['total'] / row['count'], **row))
+            if len(batch) >= batch_size:
+                RatingSummary.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        RatingSummary.objects.bulk_create(batch)
+        created += len(batch)
+    return created
@@ -0,0 +1,43 @@
+from rest_framework import serializers
+
+from cargo.models import Order
+from .models import RatingSummary, Review
+
+
+class ReviewSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Review
+        fields = ['id', 'order', 'reviewer', 'reviewed_user', 'rating', 'comment', 'created_at']
+        read_only_fields = ['reviewer', 'reviewed_user', 'created_at']
+
+    def validate_order(self, order):
+        user = self.context['request'].user
+        if user.pk not in (order.sender_id, order.driver_id):
+            raise serializers.ValidationError('Оставить отзыв может только участник заказа')
+        if order.status != Order.Status.DELIVERED or order.driver_id is None:
+            raise serializers.ValidationError('Отзыв можно оставить только по доставленному заказу')
+        if Review.objects.filter(order=order).exists():
+            raise serializers.ValidationError('По этому заказу уже есть отзыв')
+        return order
+
+    def create(self, validated_data):
+        order = validated_data['order']
+        reviewer = self.context['request'].user
+        validated_data['reviewer'] = reviewer
+        validated_data['reviewed_user_id'] = order.driver_id if reviewer.pk == order.sender_id else order.sender_id
+        return super().create(validated_data)
+
+
+class RatingSummarySerializer(serializers.ModelSerializer):
+    average = serializers.SerializerMethodField()
+    histogram = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RatingSummary
+        fields = ['user', 'average', 'count', 'histogram', 'updated_at']
+
+    def get_average(self, summary):
+        return round(summary.average, 2)
+
+    def get_histogram(self, summary):
+        return {str(star): count for star, count in summary.histogram.items()}
@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import ratings
+from .models import Review
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    if created:
+        ratings.review_added(instance.reviewed_user_id, instance.rating)
+    else:
+        old_rating = getattr(instance, '_loaded_rating', None)
+        if old_rating is not None and old_rating != instance.rating:
+            ratings.review_changed(instance.reviewed_user_id, old_rating, instance.rating)
+    instance._loaded_rating = instance.rating
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    ratings.review_removed(instance.reviewed_user_id, instance.rating)
@@ -1,3 +1,126 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from cargo.models import Order
+from locations.models import Location
+from users.models import User
+from .models import RatingSummary, Review
+
+
+class RatingSummaryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.sender = User.objects.create(
+            username='+70000000001', phone_number='+70000000001', role=User.Role.SENDER, referral_code='SND'
+        )
+        self.driver = User.objects.create(
+            username='+70000000002', phone_number='+70000000002', role=User.Role.DRIVER, referral_code='DRV'
+        )
+        self.location = Location.objects.create(city_name='Алматы', latitude='43.238949', longitude='76.889709')
+
+    def _order(self, **fields):
+        fields.setdefault('status', Order.Status.DELIVERED)
+        return Order.objects.create(
+            sender=self.sender, driver=self.driver, departure_point=self.location,
+            destination_point=self.location, weight=1, **fields
+        )
+
+    def _review(self, rating):
+        return Review.objects.create(
+            order=self._order(), reviewer=self.sender, reviewed_user=self.driver, rating=rating
+        )
+
+    def _summary(self):
+        return RatingSummary.objects.get(user=self.driver)
+
+    def test_summary_follows_created_changed_and_deleted_reviews(self):
+        first = self._review(5)
+        self._review(4)
+        third = self._review(2)
+
+        summary = self._summary()
+        self.assertEqual((summary.count, summary.total), (3, 11))
+        self.assertAlmostEqual(summary.average, 11 / 3)
+        self.assertEqual(summary.histogram, {1: 0, 2: 1, 3: 0, 4: 1, 5: 1})
+
+        third.rating = 3
+        third.save()
+        first.delete()
+
+        summary = self._summary()
+        self.assertEqual((summary.count, summary.total, summary.average), (2, 7, 3.5))
+        self.assertEqual(summary.histogram, {1: 0, 2: 0, 3: 1, 4: 1, 5: 0})
+
+        Review.objects.all().delete()
+        summary = self._summary()
+        self.assertEqual((summary.count, summary.total, summary.average), (0, 0, 0))
+
+    def test_summary_update_is_single_query(self):
+        self._review(5)
+        order = self._order()
+        # INSERT отзыва и один UPDATE сводки, без агрегации по отзывам.
+        with self.assertNumQueries(2):
+            Review.objects.create(order=order, reviewer=self.sender, reviewed_user=self.driver, rating=4)
+
+    def test_rebuild_matches_incremental_summary(self):
+        for rating in (1, 5, 5, 3):
+            self._review(rating)
+        expected = RatingSummary.objects.values().get(user=self.driver)
+        RatingSummary.objects.update(count=0, total=0, average=0, stars_5=0)
+
+        out = StringIO()
+        call_command('rebuild_ratings', stdout=out)
+
+        rebuilt = RatingSummary.objects.values().get(user=self.driver)
+        expected.pop('updated_at'), rebuilt.pop('updated_at')
+        self.assertEqual(rebuilt, expected)
+        self.assertIn('1', out.getvalue())
+
+    def test_rating_endpoint_reads_summary(self):
+        self._review(4)
+        self._review(5)
+        self.client.force_authenticate(self.sender)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('reviews:rating-summary', args=[self.driver.pk]))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['average'], 4.5)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['histogram']['5'], 1)
+
+    def test_rating_endpoint_for_user_without_reviews(self):
+        self.client.force_authenticate(self.sender)
+
+        response = self.client.get(reverse('reviews:rating-summary', args=[self.sender.pk]))
+
+        self.assertEqual(response.data['count'], 0)
+        self.assertEqual(response.data['average'], 0)
+
+    def test_sender_reviews_driver_of_delivered_order(self):
+        order = self._order()
+        self.client.force_authenticate(self.sender)
+
+        response = self.client.post(reverse('reviews:review-list'), {'order': order.pk, 'rating': 5}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['reviewed_user'], self.driver.pk)
+        self.assertEqual(self._summary().count, 1)
+
+    def test_review_rejected_for_undelivered_order_or_stranger(self):
+        pending = self._order(status=Order.Status.PENDING)
+        stranger = User.objects.create(username='+70000000003', phone_number='+70000000003', referral_code='STR')
+        url = reverse('reviews:review-list')
 
-# Create your tests here.
+        self.client.force_authenticate(self.sender)
+        self.assertEqual(self.client.post(url, {'order': pending.pk, 'rating': 5}).status_code, 400)
+        self.client.force_authenticate(stranger)
+        self.assertEqual(self.client.post(url, {'order': self._order().pk, 'rating': 5}).status_code, 400)
+        self.client.force_authenticate(self.sender)
+        self.assertEqual(self.client.post(url, {'order': self._order().pk, 'rating': 6}).status_code, 400)
+        self.assertFalse(RatingSummary.objects.exists())
@@ -1,9 +1,13 @@
 from django.urls import path, include
-from rest_framework.routers import DefaultRouter
+from rest_framework.routers import SimpleRouter
 from .views import *
 
 app_name = 'reviews'
 
-urlpatterns = [
+router = SimpleRouter()
+router.register('', ReviewViewSet, basename='review')
 
-]
\ No newline at end of file
+urlpatterns = [
+    path('ratings/<int:user_id>/', RatingSummaryAPIView.as_view(), name='rating-summary'),
+    path('', include(router.urls)),
+]
@@ -1,3 +1,26 @@
-from django.shortcuts import render
+from rest_framework import mixins, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.viewsets import GenericViewSet
 
-# Create your views here.
+from core.pagination import CreatedAtCursorPagination
+from .models import RatingSummary, Review
+from .serializers import RatingSummarySerializer, ReviewSerializer
+
+
+class ReviewViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin, GenericViewSet):
+    """Отзывы по доставленным заказам; фильтр ``?reviewed_user=`` отдает отзывы о пользователе"""
+    queryset = Review.objects.order_by('-created_at')
+    serializer_class = ReviewSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
+    filterset_fields = ['reviewed_user', 'reviewer', 'rating']
+
+
+class RatingSummaryAPIView(APIView):
+    """Рейтинг пользователя из готовой сводки, без агрегации по отзывам"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, user_id):
+        summary = RatingSummary.objects.filter(user_id=user_id).first() or RatingSummary(user_id=user_id)
+        return Response(RatingSummarySerializer(summary).data)
@@ -0,0 +1,115 @@
+"""
+Жизненный цикл подписок водителей.
+
+``sweep`` приводит ``UserSubscription.is_active`` и денормализованный флаг
+``User.is_subscription_active`` в соответствие со сроками подписок и
+предупреждает водителей об окончании подписки. Все изменения делаются
+пачками через ``UPDATE``/``bulk_create``; повторный запуск ничего не меняет,
+поэтому команду можно запускать по cron сколько угодно часто.
+"""
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from notifications import unread
+from notifications.models import Notification
+from users.authentication import invalidate_auth_state
+from users.models import User
+from .models import UserSubscription
+
+
+@dataclass
+class SweepResult:
+    expired: int = 0
+    deactivated_users: int = 0
+    activated_users: int = 0
+    notified: int = 0
+
+
+def _current(now):
+    return UserSubscription.objects.filter(is_active=True, end_date__gt=now)
+
+
+def _locked(queryset):
+    # Параллельный запуск на PostgreSQL пропускает строки, которые уже обрабатывает другой.
+    return queryset.select_for_update(skip_locked=True, of=('self',))
+
+
+def expire_lapsed(now, batch_size):
+    """Гасит истекшие подписки и снимает флаг с водителей, у которых не осталось действующих."""
+    lapsed = UserSubscription.objects.filter(is_active=True, end_date__lte=now).order_by()
+    expired = deactivated = 0
+    while True:
+        with transaction.atomic():
+            rows = list(_locked(lapsed).values_list('pk', 'user_id')[:batch_size])
+            if not rows:
+                break
+            UserSubscription.objects.filter(pk__in=[pk for pk, _ in rows]).update(is_active=False)
+            user_ids = {user_id for _, user_id in rows}
+            deactivated += (
+                User.objects.filter(pk__in=user_ids, is_subscription_active=True)
+                .filter(~Exists(_current(now).filter(user=OuterRef('pk'))))
+                .update(is_subscription_active=False)
+            )
+            # Флаг подписки читается из auth_state (users.authentication).
+            invalidate_auth_state(user_ids)
+        expired += len(rows)
+    return expired, deactivated
+
+
+def activate_current(now, batch_size):
+    """Ставит флаг водителям с действующей подпиской, у которых он почему-то снят."""
+    inactive = (
+        User.objects.filter(is_subscription_active=False)
+        .filter(Exists(_current(now).filter(user=OuterRef('pk'))))
+        .order_by()
+    )
+    activated = 0
+    while True:
+        with transaction.atomic():
+            user_ids = list(_locked(inactive).values_list('pk', flat=True)[:batch_size])
+            if not user_ids:
+                break
+            activated += User.objects.filter(pk__in=user_ids).update(is_subscription_active=True)
+            invalidate_auth_state(user_ids)
+    return activated
+
+
+def notify_expiring(now, window, batch_size):
+    """Один раз на подписку создает уведомление ``SUBSCRIPTION_EXPIRING``."""
+    expiring = _current(now).filter(end_date__lte=now + window, expiry_notified_at__isnull=True).order_by()
+    notified = 0
+    while True:
+        with transaction.atomic():
+            rows = list(_locked(expiring).values_list('pk', 'user_id', 'end_date', 'plan__name')[:batch_size])
+            if not rows:
+                break
+            Notification.objects.bulk_create(
+                Notification(
+                    user_id=user_id,
+                    type=Notification.Type.SUBSCRIPTION_EXPIRING,
+                    title='Подписка истекает',
+                    message=f'Подписка «{plan_name}» действует до {timezone.localtime(end_date):%d.%m.%Y %H:%M}',
+                )
+                for _, user_id, end_date, plan_name in rows
+            )
+            UserSubscription.objects.filter(pk__in=[row[0] for row in rows]).update(expiry_notified_at=now)
+        unread.invalidate(row[1] for row in rows)
+        notified += len(rows)
+    return notified
+
+
+def sweep(now=None, batch_size=None, warning_days=None):
+    now = now or timezone.now()
+    batch_size = batch_size or settings.SUBSCRIPTION_SWEEP_BATCH_SIZE
+    if warning_days is None:
+        warning_days = settings.SUBSCRIPTION_EXPIRY_WARNING_DAYS
+    result = SweepResult()
+    result.expired, result.deactivated_users = expire_lapsed(now, batch_size)
+    result.activated_users = activate_current(now, batch_size)
+    result.notified = notify_expiring(now, timedelta(days=warning_days), batch_size)
+    return result
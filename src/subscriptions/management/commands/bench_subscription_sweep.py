@@ -0,0 +1,49 @@
+import random
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+
+from cargo.management.commands._seed import seed_users
+from core.benchmarks import BenchmarkCommand
+from subscriptions.lifecycle import sweep
+from subscriptions.models import SubscriptionPlan, UserSubscription
+from users.models import User
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Прогон expire_subscriptions на синтетических подписках: часть истекла, '
+        'часть истекает в окне предупреждения. Второй прогон проверяет идемпотентность.'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--subscriptions', type=int, default=100_000)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def run_benchmark(self, **options):
+        count = options['subscriptions']
+        drivers = seed_users(count, User.Role.DRIVER, '+7702')
+        User.objects.update(is_subscription_active=True)
+        plan = SubscriptionPlan.objects.create(name='Месяц', price=5000, duration_days=30)
+        now = timezone.now()
+        rng = random.Random(count)
+        UserSubscription.objects.bulk_create(
+            (
+                # Треть истекла, около 3% истекает в ближайшие три дня, остальные действуют.
+                UserSubscription(user=driver, plan=plan, end_date=now + timedelta(hours=rng.uniform(-720, 1440)))
+                for driver in drivers
+            ),
+            batch_size=5000,
+        )
+        self.analyze()
+
+        for label in ('Первый прогон', 'Повторный прогон'):
+            started = time.perf_counter()
+            result = sweep(now=now, batch_size=options['batch_size'])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{label}: {elapsed:.2f} с, истекло {result.expired}, снят флаг {result.deactivated_users}, '
+                f'уведомлений {result.notified}'
+            )
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from subscriptions.lifecycle import sweep
+
+
+class Command(BaseCommand):
+    help = (
+        'Гасит истекшие подписки, синхронизирует User.is_subscription_active '
+        'и предупреждает водителей об окончании подписки. Запускается по расписанию.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.SUBSCRIPTION_SWEEP_BATCH_SIZE)
+        parser.add_argument('--warning-days', type=int, default=settings.SUBSCRIPTION_EXPIRY_WARNING_DAYS)
+
+    def handle(self, *args, **options):
+        result = sweep(batch_size=options['batch_size'], warning_days=options['warning_days'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Истекло подписок: {result.expired}, '
+            f'снят флаг: {result.deactivated_users}, поставлен флаг: {result.activated_users}, '
+            f'уведомлений: {result.notified}'
+        ))
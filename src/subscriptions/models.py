@@ -19,6 +19,12 @@ class UserSubscription(models.Model):
     start_date = models.DateTimeField(auto_now_add=True)
     end_date = models.DateTimeField()
     is_active = models.BooleanField(default=True)
+    expiry_notified_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_active', 'end_date']),
+        ]
 
     def __str__(self):
         return f"{self.user} - {self.plan}"
\ No newline at end of file
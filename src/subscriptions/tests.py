@@ -1,3 +1,97 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from notifications.models import Notification
+from users.models import User
+from .lifecycle import activate_current, sweep
+from .models import SubscriptionPlan, UserSubscription
+
+
+class SubscriptionSweepTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.plan = SubscriptionPlan.objects.create(name='Месяц', price=5000, duration_days=30)
+        self.drivers = User.objects.bulk_create(
+            User(
+                username=f'+7700000010{index}', phone_number=f'+7700000010{index}',
+                role=User.Role.DRIVER, is_subscription_active=True, referral_code=f'DRV{index}',
+            )
+            for index in range(6)
+        )
+
+    def _subscribe(self, driver, days):
+        return UserSubscription.objects.create(user=driver, plan=self.plan, end_date=self.now + timedelta(days=days))
+
+    def test_lapsed_subscriptions_expire_and_flags_follow(self):
+        lapsed = [self._subscribe(driver, -1) for driver in self.drivers[:4]]
+        self._subscribe(self.drivers[3], 20)  # продлил подписку заранее
+        self._subscribe(self.drivers[4], 20)
+        User.objects.filter(pk=self.drivers[4].pk).update(is_subscription_active=False)
+
+        result = sweep(now=self.now, batch_size=3)
+
+        self.assertEqual(result.expired, 4)
+        self.assertEqual(result.deactivated_users, 3)
+        self.assertEqual(result.activated_users, 1)
+        self.assertFalse(UserSubscription.objects.filter(pk__in=[s.pk for s in lapsed], is_active=True).exists())
+        active = set(User.objects.filter(is_subscription_active=True).values_list('pk', flat=True))
+        self.assertEqual(active, {self.drivers[3].pk, self.drivers[4].pk, self.drivers[5].pk})
+
+    def test_activation_runs_in_chunks(self):
+        for driver in self.drivers[:5]:
+            self._subscribe(driver, 20)
+        User.objects.update(is_subscription_active=False)
+
+        with CaptureQueriesContext(connection) as queries:
+            activated = activate_current(self.now, batch_size=2)
+
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(activated, 5)
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(User.objects.filter(is_subscription_active=True).count(), 5)
+
+    def test_expiring_subscriptions_are_notified_once(self):
+        soon = [self._subscribe(driver, 1) for driver in self.drivers[:3]]
+        self._subscribe(self.drivers[3], 10)
+
+        first = sweep(now=self.now, batch_size=2, warning_days=3)
+        second = sweep(now=self.now, batch_size=2, warning_days=3)
+
+        self.assertEqual(first.notified, 3)
+        self.assertEqual(second.notified, 0)
+        notified = Notification.objects.filter(type=Notification.Type.SUBSCRIPTION_EXPIRING)
+        self.assertEqual(set(notified.values_list('user_id', flat=True)), {s.user_id for s in soon})
+        self.assertIn('Месяц', notified.first().message)
+
+    def test_chunks_are_set_based(self):
+        for driver in self.drivers:
+            self._subscribe(driver, -1)
+
+        with CaptureQueriesContext(connection) as queries:
+            result = sweep(now=self.now, batch_size=3)
+
+        statements = [q['sql'] for q in queries if 'SAVEPOINT' not in q['sql']]
+        # Две пачки по SELECT и два UPDATE, пустые SELECT истечения, активации и уведомлений.
+        self.assertEqual(len(statements), 2 * 3 + 1 + 1 + 1)
+        self.assertEqual(result.expired, 6)
+        self.assertFalse(User.objects.filter(is_subscription_active=True).exists())
+
+    def test_command_is_idempotent(self):
+        self._subscribe(self.drivers[0], -1)
+        self._subscribe(self.drivers[1], 1)
+        out = StringIO()
+
+        call_command('expire_subscriptions', stdout=out)
+        call_command('expire_subscriptions', stdout=out)
 
-# Create your tests here.
+        first, second = out.getvalue().strip().splitlines()
+        self.assertIn('Истекло подписок: 1', first)
+        self.assertIn('уведомлений: 1', first)
+        self.assertIn('Истекло подписок: 0', second)
+        self.assertIn('уведомлений: 0', second)
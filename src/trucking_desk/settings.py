@@ -63,6 +63,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.replicas.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'trucking_desk.urls'
@@ -90,12 +91,80 @@ WSGI_APPLICATION = 'trucking_desk.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Профиль задается окружением: DB_ENGINE=postgres для рабочих серверов,
+# иначе SQLite (разработка). Параметры соединения SQLite — SQLITE_PRAGMAS (core.db).
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+DB_POOL = os.environ.get('DB_POOL', '')  # '', 'pgbouncer' или 'psycopg'
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'trucking_desk'),
+            'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),  # Секунд держать соединение между запросами
+            'CONN_HEALTH_CHECKS': True,             # Проверять сохраненное соединение перед запросом
+            'OPTIONS': {
+                'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+            },
+        }
+    }
+    if DB_POOL == 'pgbouncer':
+        # PgBouncer в режиме transaction: именованные курсоры живут дольше транзакции
+        # сервера, поэтому iterator() читает без server-side курсоров.
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+    elif DB_POOL == 'psycopg':
+        # Пул psycopg 3 в процессе; с ним Django требует CONN_MAX_AGE = 0.
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # Блокировка на запись берется в начале транзакции: без взаимной
+                # блокировки двух читателей, которые потом оба пишут.
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+
+# Реплики для чтения (core.replicas): DB_REPLICAS — хосты Postgres или файлы
+# SQLite через запятую. В тестах реплики смотрят в тестовую основную базу.
+for index, location in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST' if DB_ENGINE == 'postgres' else 'NAME': location.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+
+
+# Cache
+# REDIS_URL задает общий для всех процессов кеш (состояние пользователей,
+# черный список токенов, закрепление за основной базой). Без него кеш
+# локален процессу и годится только для разработки и тестов.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
-}
 
 
 # Password validation
@@ -134,6 +203,17 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     
+    # JSON через orjson, если он установлен (core.fastjson)
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.fastjson.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.fastjson.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+
     # Пагинация
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
@@ -172,6 +252,7 @@ SIMPLE_JWT = {
     
     # Кастомные claims (дополнительные данные в токене)
     'TOKEN_OBTAIN_SERIALIZER': 'users.serializers.CustomTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.CachedBlacklistTokenRefreshSerializer',
 }
 
 SWAGGER_SETTINGS = {
@@ -264,6 +345,85 @@ CORS_ALLOW_HEADERS = [
     'x-requested-with',
 ]
 
+# Маршруты между локациями (locations.routes) и расчет стоимости (core.pricing)
+ROUTE_ROAD_FACTOR = 1.2             # Отношение длины дороги к расстоянию по прямой
+ROUTE_AVERAGE_SPEED_KMH = 60        # Средняя скорость грузовика для оценки времени в пути
+ROUTE_CACHE_SIZE = 10000            # Размер LRU маршрутов в памяти процесса
+TARIFF_REPRICE_ASYNC = True         # False — пересчитывать заказы сразу после коммита в потоке запроса (удобно в тестах)
+
+# Прием GPS-отметок водителей (users.tracking)
+DRIVER_LOCATION_FLUSH_INTERVAL = 2.0    # Секунд между записями буфера в базу; 0 — писать сразу
+DRIVER_LOCATION_BUFFER_SIZE = 5000      # Запись без ожидания, когда в буфере столько отметок
+DRIVER_LOCATION_BUFFER_LIMIT = 20000    # Больше не принимаем (503), пока база недоступна
+DRIVER_LOCATION_MAX_BATCH = 500         # Максимум отметок в одном запросе
+
+# Realtime-события заказов и позиций водителей (core.realtime)
+REALTIME_BROKER = 'core.realtime.LocalBroker'
+REALTIME_QUEUE_SIZE = 100               # Событий в очереди одного подписчика
+REALTIME_HEARTBEAT_SECONDS = 15         # Пустой комментарий SSE, чтобы прокси не рвали соединение
+
+# Рассылка уведомлений (notifications.dispatch)
+NOTIFICATION_DISPATCH_ASYNC = True      # False — рассылать сразу в потоке запроса (удобно в тестах)
+NOTIFICATION_DISPATCH_WORKERS = 2
+NOTIFICATION_BATCH_SIZE = 1000          # Строк в одном bulk_create
+NOTIFICATION_NEW_ORDER_RADIUS_KM = None # Радиус от точки отправления; None — всем водителям с подпиской
+NOTIFICATION_UNREAD_CACHE_TIMEOUT = 60 * 60
+NOTIFICATION_RETENTION_DAYS = 90        # Прочитанные уведомления старше удаляет prune_notifications
+
+# Кеш пользователей для ClaimsJWTAuthentication (users.authentication)
+CLAIMS_USER_CACHE_TTL = 30              # Секунд; поля вне claims могут устареть не дольше этого
+CLAIMS_USER_CACHE_SIZE = 10000
+CLAIMS_AUTH_CACHE = 'default'           # Флаги доступа пользователя (auth_state); сбрасывается при изменении
+
+# Черный список refresh-токенов (users.tokens)
+JWT_BLACKLIST_BLOOM_CAPACITY = 1_000_000  # jti в bloom-фильтре процесса (~1.2 МБ при 1% ложных срабатываний)
+JWT_BLACKLIST_SYNC_SECONDS = 5            # Как часто дозагружать новые строки черного списка из базы
+JWT_BLACKLIST_CACHE = 'default'           # Алиас общего кеша из CACHES; с локальным промах фильтра проверяется в базе
+
+# Хеширование паролей (users.hashers)
+PASSWORD_HASHERS = [
+    'users.hashers.PolicyPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 1_000_000))  # При смене хеши обновятся при входе
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+PASSWORD_HASH_MAX_PENDING = 64          # Сверх этого вход отвечает 503 вместо очереди
+
+# Подписки
+SUBSCRIPTION_EXPIRY_WARNING_DAYS = 3    # За сколько дней до конца подписки предупреждать водителя
+SUBSCRIPTION_SWEEP_BATCH_SIZE = 2000    # Подписок в одной транзакции expire_subscriptions
+
+# Массовое создание заказов (cargo.bulk)
+CARGO_BULK_CREATE_MAX_ITEMS = 5000      # Заказов в одном запросе
+CARGO_BULK_CREATE_BATCH_SIZE = 500      # Строк в одном INSERT
+
+# Выгрузка истории заказов (cargo.export)
+ORDER_EXPORT_CHUNK_SIZE = 2000          # Строк в одном чтении из базы и в одном куске ответа
+
+# Кеш готовых представлений заказов (cargo.payloads)
+ORDER_PAYLOAD_CACHE = 'default'         # Алиас кеша из CACHES
+ORDER_PAYLOAD_CACHE_TIMEOUT = 24 * 60 * 60
+
+# JSON API (core.fastjson)
+API_JSON_BACKEND = os.environ.get('API_JSON_BACKEND', 'orjson')  # 'orjson' или 'json'; без orjson всегда stdlib
+
+# Параметры соединения SQLite (core.db), выполняются PRAGMA при каждом подключении
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',                  # Чтение не ждет записи
+    'synchronous': 'NORMAL',                # fsync только на checkpoint; в WAL не портит базу при сбое
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),  # Ждать блокировку вместо "database is locked"
+    'mmap_size': 256 * 1024 * 1024,         # Читать файл базы через отображение в память
+}
+
+# Чтение с реплик (core.replicas)
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+REPLICA_PIN_SECONDS = 5                 # Сколько после записи читать свои данные из основной базы
+REPLICA_PIN_CACHE = 'default'           # Алиас общего кеша из CACHES; локальный при репликах — ImproperlyConfigured
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
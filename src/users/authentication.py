@@ -0,0 +1,161 @@
+"""
+Аутентификация по claims access-токена без запроса пользователя из базы.
+
+``ClaimsJWTAuthentication`` подключается во view явно (``authentication_classes``)
+и собирает ``request.user`` из claims, которые кладет
+``CustomTokenObtainPairSerializer.get_token``. Поля, которых нет в токене,
+загружаются лениво одним запросом через короткий кеш процесса.
+
+Флаги доступа (``AUTH_FIELDS``: активность, роль, права персонала, подписка)
+берутся не из claims, а из ``auth_state``: кеш ``CLAIMS_AUTH_CACHE``,
+который сбрасывается при изменении пользователя, на промахе — один запрос.
+Заблокированный или удаленный пользователь получает 401 сразу, смена роли
+и подписки действует без обновления токена; без общего кеша в других
+процессах — не позже ``CLAIMS_USER_CACHE_TTL``. При обновлении токенов
+claims переписываются из базы (``CachedBlacklistTokenRefreshSerializer``).
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import models, transaction
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+CLAIM_FIELDS = ('username', 'role', 'is_subscription_active', 'email', 'is_staff', 'is_superuser')
+AUTH_FIELDS = ('is_active', 'role', 'is_staff', 'is_superuser', 'is_subscription_active')
+
+_lock = threading.Lock()
+_users = {}
+
+
+def get_cached_user(user_id):
+    now = time.monotonic()
+    entry = _users.get(user_id)
+    if entry is not None and entry[1] > now:
+        return entry[0]
+    user = User.objects.filter(pk=user_id).first()
+    with _lock:
+        if len(_users) >= settings.CLAIMS_USER_CACHE_SIZE:
+            _users.pop(next(iter(_users)), None)
+        _users[user_id] = (user, now + settings.CLAIMS_USER_CACHE_TTL)
+    return user
+
+
+def invalidate_cached_user(user_id):
+    with _lock:
+        _users.pop(user_id, None)
+
+
+def clear_user_cache():
+    with _lock:
+        _users.clear()
+
+
+def _auth_cache():
+    return caches[settings.CLAIMS_AUTH_CACHE]
+
+
+def auth_state_key(user_id):
+    return f'users:auth-state:{user_id}'
+
+
+def auth_state(user_id):
+    """Текущие ``AUTH_FIELDS`` пользователя; удаленный пользователь считается неактивным."""
+    key = auth_state_key(user_id)
+    state = _auth_cache().get(key)
+    if state is None:
+        state = User.objects.filter(pk=user_id).values(*AUTH_FIELDS).first() or {'is_active': False}
+        _auth_cache().set(key, state, settings.CLAIMS_USER_CACHE_TTL)
+    return state
+
+
+def remember_auth_state(user):
+    """Кладет флаги только что загруженного пользователя, чтобы первый запрос с токеном не читал базу."""
+    state = {field: getattr(user, field) for field in AUTH_FIELDS}
+    _auth_cache().set(auth_state_key(user.pk), state, settings.CLAIMS_USER_CACHE_TTL)
+
+
+def invalidate_auth_state(user_ids):
+    # После коммита: иначе параллельный запрос успеет закешировать старые значения.
+    keys = [auth_state_key(user_id) for user_id in user_ids]
+    _auth_cache().delete_many(keys)
+    transaction.on_commit(lambda: _auth_cache().delete_many(keys))
+
+
+class ClaimsUser(TokenUser):
+    """
+    Пользователь запроса из claims и ``auth_state``; недостающие атрибуты
+    берутся у модели ``User``.
+    """
+
+    def __init__(self, token, state):
+        super().__init__(token)
+        self.state = state
+
+    def __str__(self):
+        return self.username or f'ClaimsUser {self.id}'
+
+    @cached_property
+    def id(self):
+        # simplejwt кладет идентификатор строкой; приводим к типу pk, чтобы сравнения с *_id работали.
+        return User._meta.pk.to_python(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        if attr in AUTH_FIELDS:
+            return self.state[attr]
+        if attr in CLAIM_FIELDS and attr in self.token:
+            return self.token[attr]
+        user = get_cached_user(self.id)
+        if user is None:
+            raise AuthenticationFailed('Пользователь не найден', code='user_not_found')
+        return getattr(user, attr)
+
+    @property
+    def is_active(self):
+        return self.state['is_active']
+
+    @property
+    def is_staff(self):
+        return self.__getattr__('is_staff')
+
+    @property
+    def is_superuser(self):
+        return self.__getattr__('is_superuser')
+
+    @property
+    def username(self):
+        return self.__getattr__('username')
+
+    def __eq__(self, other):
+        if isinstance(other, models.Model):
+            return isinstance(other, User) and other.pk == self.pk
+        return super().__eq__(other)
+
+    __hash__ = TokenUser.__hash__
+
+
+class ClaimsJWTAuthentication(JWTStatelessUserAuthentication):
+    """JWT-аутентификация без запроса к ``users_user`` на каждый запрос."""
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken('В токене нет идентификатора пользователя')
+        user_id = User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        state = auth_state(user_id)
+        if not state['is_active']:
+            raise AuthenticationFailed('Пользователь неактивен', code='user_inactive')
+        return ClaimsUser(validated_token, state)
@@ -0,0 +1,74 @@
+"""
+Политика хеширования паролей и пул потоков для него.
+
+Число итераций PBKDF2 задается настройкой ``PASSWORD_PBKDF2_ITERATIONS``.
+Если политика меняется, ``must_update`` сообщает Django, что хеш устарел, и
+пароль перехешируется при следующем успешном входе.
+
+Хеширование выполняется в ограниченном пуле: ``hashlib.pbkdf2_hmac``
+отпускает GIL, поэтому потоки пула загружают ядра параллельно, а лимит
+ожидающих задач не дает очереди на вход расти без конца.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    PBKDF2PasswordHasher,
+    check_password,
+    get_hasher,
+    identify_hasher,
+    make_password,
+)
+
+
+class PolicyPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 с числом итераций из настроек; формат хеша стандартный."""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class HashingBusy(Exception):
+    """Очередь хеширования заполнена; клиенту стоит повторить запрос позже."""
+
+
+_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+_slots = threading.BoundedSemaphore(settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_MAX_PENDING)
+
+
+def _submit(func, *args, wait=False):
+    if not _slots.acquire(blocking=wait):
+        raise HashingBusy
+    try:
+        future = _executor.submit(func, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+
+def hash_password(raw_password):
+    """``make_password`` в пуле хеширования; синхронный вызов ждет свободного места в очереди."""
+    return _submit(make_password, raw_password, wait=True).result()
+
+
+async def ahash_password(raw_password):
+    return await asyncio.wrap_future(_submit(make_password, raw_password))
+
+
+async def acheck_password(raw_password, encoded):
+    return await asyncio.wrap_future(_submit(check_password, raw_password, encoded))
+
+
+def needs_rehash(encoded):
+    """Хеш сделан не основным хешером или с другими параметрами политики."""
+    preferred = get_hasher('default')
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
@@ -0,0 +1,81 @@
+"""
+Асинхронный вход по номеру телефона и паролю.
+
+Проверка пароля уходит в пул ``users.hashers``, поэтому под ASGI вход не
+занимает общий поток синхронных view и несколько проверок идут параллельно.
+``LoginAPIView`` — ``core.views.AsyncAPIView``: парсеры, троттлинг и
+обработка исключений DRF работают как у остальных view.
+"""
+from asgiref.sync import sync_to_async
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import permissions, status
+from rest_framework.response import Response
+
+from core.views import AsyncAPIView
+
+from .hashers import HashingBusy, acheck_password, ahash_password, needs_rehash
+from .models import User
+from .serializers import (
+    CustomTokenObtainPairSerializer,
+    UserLoginResponseSerializer,
+    UserLoginSerializer,
+    UserSerializer,
+)
+
+
+def _issue_tokens(user):
+    refresh = CustomTokenObtainPairSerializer.get_token(user)
+    return {
+        'access': str(refresh.access_token),
+        'refresh': str(refresh),
+        'user': UserSerializer(user).data,
+    }
+
+
+async def _verify(user, password):
+    if user is None:
+        # Хешируем и для несуществующего номера, чтобы время ответа его не выдавало.
+        await ahash_password(password)
+        return False
+    return await acheck_password(password, user.password) and user.is_active
+
+
+class LoginAPIView(AsyncAPIView):
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    @swagger_auto_schema(
+        operation_id='auth_login',
+        request_body=UserLoginSerializer,
+        responses={
+            200: UserLoginResponseSerializer,
+            400: 'Необходимо указать номер телефона и пароль',
+            401: 'Неверные учетные данные',
+            503: 'Сервер перегружен, повторите попытку позже',
+        },
+    )
+    async def post(self, request):
+        """Аутентификация пользователя и получение JWT токенов"""
+        serializer = UserLoginSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Необходимо указать номер телефона и пароль'}, status=status.HTTP_400_BAD_REQUEST
+            )
+        phone_number = serializer.validated_data['phone_number']
+        password = serializer.validated_data['password']
+
+        user = await User.objects.filter(**{User.USERNAME_FIELD: phone_number}).afirst()
+        try:
+            if not await _verify(user, password):
+                return Response({'error': 'Неверные учетные данные'}, status=status.HTTP_401_UNAUTHORIZED)
+            if needs_rehash(user.password):
+                user.password = await ahash_password(password)
+                await user.asave(update_fields=['password'])
+        except HashingBusy:
+            return Response(
+                {'error': 'Сервер перегружен, повторите попытку позже'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': '1'},
+            )
+
+        return Response(await sync_to_async(_issue_tokens)(user))
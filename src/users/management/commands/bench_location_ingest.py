@@ -0,0 +1,70 @@
+import random
+import threading
+import time
+
+from django.db import connection
+from django.utils import timezone
+
+from core.benchmarks import BenchmarkCommand
+from users.models import DriverLocation, DriverTrackPoint, User
+from users.tracking import LocationBuffer
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Нагрузочный прогон приема GPS-отметок: несколько потоков-клиентов '
+        'шлют пачки отметок в буфер, фоновый поток пишет их в базу. '
+        'Запускается на той базе, что настроена в DATABASES (SQLite или PostgreSQL).'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--drivers', type=int, default=2000)
+        parser.add_argument('--pings', type=int, default=200_000, help='Всего отметок')
+        parser.add_argument('--batch', type=int, default=10, help='Отметок в одном запросе')
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--flush-interval', type=float, default=1.0)
+
+    def run_benchmark(self, **options):
+        drivers = User.objects.bulk_create(
+            User(
+                username=f'+7701{index:07d}', phone_number=f'+7701{index:07d}',
+                role=User.Role.DRIVER, referral_code=f'D{index:07d}', password='!',
+            )
+            for index in range(options['drivers'])
+        )
+        driver_ids = [driver.pk for driver in drivers]
+        buffer = LocationBuffer(flush_interval=options['flush_interval'], max_points=50_000)
+        per_thread = options['pings'] // options['threads']
+        batch = options['batch']
+
+        def client(seed):
+            rng = random.Random(seed)
+            sent = 0
+            while sent < per_thread:
+                now = timezone.now()
+                pings = [
+                    (rng.uniform(40.5, 55.4), rng.uniform(46.5, 87.3), now)
+                    for _ in range(min(batch, per_thread - sent))
+                ]
+                buffer.add(rng.choice(driver_ids), pings)
+                sent += len(pings)
+
+        threads = [threading.Thread(target=client, args=(seed,)) for seed in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        accepted = time.perf_counter() - started
+        buffer.stop()
+        elapsed = time.perf_counter() - started
+
+        total = per_thread * options['threads']
+        self.stdout.write(f'База: {connection.vendor}')
+        self.stdout.write(f'Принято {total} отметок за {accepted:.2f} с: {total / accepted:,.0f} отметок/с')
+        self.stdout.write(f'Записано в базу за {elapsed:.2f} с: {total / elapsed:,.0f} отметок/с')
+        self.stdout.write(
+            f'Точек трека: {DriverTrackPoint.objects.count()}, '
+            f'позиций водителей: {DriverLocation.objects.count()}'
+        )
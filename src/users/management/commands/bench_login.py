@@ -0,0 +1,70 @@
+import asyncio
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+
+from cargo.management.commands._seed import seed_users
+from core.benchmarks import BenchmarkCommand
+from users.models import User
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Пропускная способность входа и регистрации через ASGI при разной цене '
+        'хеша PBKDF2: запросов в секунду всего и на одно ядро.'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--iterations', default=f'{settings.PASSWORD_PBKDF2_ITERATIONS},200000',
+                            help='Список значений PASSWORD_PBKDF2_ITERATIONS через запятую')
+
+    def run_benchmark(self, **options):
+        total, concurrency = options['requests'], options['concurrency']
+        cores = min(settings.PASSWORD_HASH_WORKERS, os.cpu_count() or 1)
+        users = seed_users(total, User.Role.SENDER, '+7704')
+        self.stdout.write(f'Потоков хеширования: {settings.PASSWORD_HASH_WORKERS}, ядер: {os.cpu_count()}')
+
+        for iterations in (int(value) for value in options['iterations'].split(',')):
+            # AsyncClient всегда ходит на testserver.
+            with override_settings(PASSWORD_PBKDF2_ITERATIONS=iterations,
+                                   ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                User.objects.update(password=make_password('StrongPass123!'))
+                login = [
+                    (reverse('users:login'), {'phone_number': user.phone_number, 'password': 'StrongPass123!'})
+                    for user in users
+                ]
+                register = [
+                    (reverse('users:register'), {
+                        'phone_number': f'+7705{iterations:07d}{index:05d}', 'email': '',
+                        'password': 'StrongPass123!', 'password_confirm': 'StrongPass123!',
+                    })
+                    for index in range(total)
+                ]
+                for label, requests, expected in (('вход', login, 200), ('регистрация', register, 201)):
+                    elapsed = asyncio.run(self._run(requests, concurrency, expected))
+                    rate = total / elapsed
+                    self.stdout.write(
+                        f'{label:<12} iterations={iterations:<8} {rate:8.1f} запросов/с  '
+                        f'{rate / cores:8.1f} запросов/с на ядро'
+                    )
+
+    @staticmethod
+    async def _run(requests, concurrency, expected):
+        client = AsyncClient()
+        pending = iter(requests)
+
+        async def worker():
+            for url, data in pending:
+                response = await client.post(url, data, content_type='application/json')
+                assert response.status_code == expected, (response.status_code, response.content)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - started
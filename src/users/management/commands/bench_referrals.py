@@ -0,0 +1,67 @@
+import random
+import time
+
+from django.db import connection
+
+from core.benchmarks import BenchmarkCommand, measure
+from users.models import User
+from users.referrals import rebuild_paths, referral_stats
+
+RECURSIVE_CTE = '''
+    WITH RECURSIVE tree(id, level) AS (
+        SELECT id, 1 FROM users_user WHERE referred_by_id = %s
+        UNION ALL
+        SELECT child.id, tree.level + 1 FROM users_user child JOIN tree ON child.referred_by_id = tree.id
+    )
+    SELECT level, COUNT(*) FROM tree GROUP BY level ORDER BY level
+'''
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Реферальная статистика на синтетическом дереве: материализованный путь '
+        'против рекурсивного CTE по referred_by, плюс время полной пересборки путей.'
+    )
+    default_repeat = 10
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--roots', type=float, default=0.01, help='Доля пользователей без пригласившего')
+
+    def run_benchmark(self, **options):
+        count = options['users']
+        self.stdout.write(f'Генерация {count} пользователей...')
+        self._seed(count, options['roots'])
+
+        started = time.perf_counter()
+        rebuild_paths(User)
+        self.stdout.write(f'Пересборка путей: {time.perf_counter() - started:.1f} с')
+        self.analyze()
+
+        largest = User.objects.filter(referral_depth=0).order_by('pk').first()
+        middle = User.objects.filter(referral_depth=3).order_by('pk').first()
+        for label, user in (('корень', largest), ('уровень 3', middle)):
+            stats = referral_stats(user)
+            self.stdout.write(f'{label}: всего {stats["total"]}, прямых {stats["direct"]}, глубина {stats["depth"]}')
+            self.report(f'{label}, путь', measure(lambda: referral_stats(user), options['repeat']))
+            self.report(f'{label}, рекурсивный CTE', measure(lambda: self._cte(user.pk), options['repeat']))
+
+    @staticmethod
+    def _cte(user_id):
+        with connection.cursor() as cursor:
+            cursor.execute(RECURSIVE_CTE, [user_id])
+            return cursor.fetchall()
+
+    @staticmethod
+    def _seed(count, roots, batch_size=20000):
+        rng = random.Random(count)
+        for start in range(1, count + 1, batch_size):
+            User.objects.bulk_create(
+                User(
+                    pk=pk, username=f'+7706{pk:09d}', phone_number=f'+7706{pk:09d}',
+                    referral_code=f'R{pk:08d}', password='!',
+                    referred_by_id=None if pk == 1 or rng.random() < roots else rng.randrange(1, pk),
+                )
+                for pk in range(start, min(count, start + batch_size - 1) + 1)
+            )
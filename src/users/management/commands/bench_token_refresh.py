@@ -0,0 +1,72 @@
+import time
+import uuid
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from cargo.management.commands._seed import seed_users
+from core.benchmarks import BenchmarkCommand
+from users.models import User
+from users.serializers import CachedBlacklistTokenRefreshSerializer
+from users.tokens import CachedBlacklistRefreshToken, token_blacklist
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Латентность обновления токена (с ротацией и черным списком) при большой '
+        'таблице outstanding-токенов: стандартный TokenRefreshSerializer против '
+        'CachedBlacklistTokenRefreshSerializer.'
+    )
+    default_repeat = 200
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--tokens', type=int, default=1_000_000, help='Строк OutstandingToken')
+        parser.add_argument('--blacklisted', type=float, default=0.5, help='Доля отозванных')
+
+    def run_benchmark(self, **options):
+        user = seed_users(1, User.Role.DRIVER, '+7703')[0]
+        self._seed(options['tokens'], options['blacklisted'], user)
+        self.analyze()
+
+        started = time.perf_counter()
+        token_blacklist.reset()
+        token_blacklist.sync(force=True)
+        self.stdout.write(f'Загрузка bloom-фильтра: {(time.perf_counter() - started) * 1000:.0f} мс')
+
+        for serializer_class, token_class in (
+            (TokenRefreshSerializer, RefreshToken),
+            (CachedBlacklistTokenRefreshSerializer, CachedBlacklistRefreshToken),
+        ):
+            tokens = [str(token_class.for_user(user)) for _ in range(options['repeat'])]
+            timings = []
+            for index, refresh in enumerate(tokens):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    serializer = serializer_class(data={'refresh': refresh})
+                    serializer.is_valid(raise_exception=True)
+                    timings.append((time.perf_counter() - started) * 1000)
+                if not index:
+                    first_queries = len(queries)
+            self.report(serializer_class.__name__, timings)
+            self.stdout.write(f'{"":<40} запросов на обновление: {first_queries}')
+
+    def _seed(self, count, blacklisted, user, batch_size=20000):
+        self.stdout.write(f'Генерация {count} токенов...')
+        now = timezone.now()
+        step = max(1, round(1 / blacklisted)) if blacklisted else 0
+        for start in range(0, count, batch_size):
+            tokens = OutstandingToken.objects.bulk_create(
+                OutstandingToken(
+                    user=user, jti=uuid.uuid4().hex, token='-',
+                    created_at=now, expires_at=now + timedelta(days=7 if index % 3 else -1),
+                )
+                for index in range(start, min(count, start + batch_size))
+            )
+            if step:
+                BlacklistedToken.objects.bulk_create(BlacklistedToken(token=token) for token in tokens[::step])
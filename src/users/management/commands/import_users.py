@@ -0,0 +1,59 @@
+import csv
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import User
+
+FIELDS = ('phone_number', 'email', 'role', 'first_name', 'last_name')
+
+
+class Command(BaseCommand):
+    help = (
+        'Импорт пользователей из CSV (phone_number, email, role, first_name, last_name). '
+        'Реферальные коды назначаются пачками без запроса на каждого пользователя; '
+        'пароль не задается, уже существующие номера пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as source:
+                rows = list(csv.DictReader(source))
+        except OSError as error:
+            raise CommandError(error)
+
+        roles = set(User.Role.values)
+        users, seen = [], set()
+        for line, row in enumerate(rows, start=2):
+            phone_number = (row.get('phone_number') or '').strip()
+            role = (row.get('role') or User.Role.SENDER).strip().upper()
+            if not phone_number or role not in roles:
+                raise CommandError(f'Строка {line}: нужен phone_number и роль из {sorted(roles)}')
+            if phone_number in seen:
+                continue
+            seen.add(phone_number)
+            users.append(User(
+                username=User.normalize_username(phone_number),
+                phone_number=phone_number,
+                email=User.objects.normalize_email((row.get('email') or '').strip()),
+                role=role,
+                first_name=(row.get('first_name') or '').strip(),
+                last_name=(row.get('last_name') or '').strip(),
+                password=make_password(None),
+            ))
+
+        existing = set()
+        phones = [user.phone_number for user in users]
+        for start in range(0, len(phones), options['batch_size']):
+            chunk = phones[start:start + options['batch_size']]
+            existing.update(User.objects.filter(phone_number__in=chunk).values_list('phone_number', flat=True))
+        users = [user for user in users if user.phone_number not in existing]
+
+        User.objects.bulk_create_with_referral_codes(users, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано пользователей: {len(users)}, пропущено существующих: {len(existing)}'
+        ))
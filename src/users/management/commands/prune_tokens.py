@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет истекшие outstanding-токены (и их записи в черном списке) пачками. '
+        'В отличие от flushexpiredtokens не держит одну длинную транзакцию на всю таблицу.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        # Индекса по expires_at нет, но истекшие токены — самые старые, поэтому
+        # обход по возрастанию pk находит пачку в начале таблицы.
+        expired = OutstandingToken.objects.filter(expires_at__lte=timezone.now()).order_by('pk')
+        deleted = 0
+        while True:
+            ids = list(expired.values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            OutstandingToken.objects.filter(pk__in=ids).delete()
+            deleted += len(ids)
+        self.stdout.write(self.style.SUCCESS(f'Удалено токенов: {deleted}'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import User
+from users.referrals import rebuild_paths
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает материализованные пути реферального дерева по referred_by.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated, orphaned = rebuild_paths(User)
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано пользователей: {updated}'))
+        if orphaned:
+            self.stdout.write(self.style.WARNING(f'Недостижимы от корней (цикл в referred_by): {orphaned}'))
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:04
+
+from django.db import migrations, models
+
+from users.referrals import rebuild_paths
+
+
+def fill_referral_paths(apps, schema_editor):
+    rebuild_paths(apps.get_model('users', 'User'), schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0004_user_manager'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='referral_depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='referral_path',
+            field=models.TextField(default='/', editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['referral_path', 'referral_depth'], name='users_referral_tree_idx', opclasses=['text_pattern_ops', 'int4_ops']),
+        ),
+        migrations.RunPython(fill_referral_paths, migrations.RunPython.noop),
+    ]
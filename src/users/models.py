@@ -1,7 +1,59 @@
-from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
+from django.db import IntegrityError, models, router, transaction
 from django.utils.crypto import get_random_string
 
+from .referrals import ROOT_PATH, move_subtree, referral_prefix
+
+REFERRAL_CODE_LENGTH = 8
+REFERRAL_CODE_ATTEMPTS = 5
+
+
+class UserManager(BaseUserManager):
+    def bulk_create_with_referral_codes(self, users, batch_size=1000):
+        """
+        Массовое создание пользователей с реферальными кодами: на пачку один
+        запрос проверки кодов и один INSERT. Коды, совпавшие с уже занятыми или
+        между собой, перегенерируются до вставки.
+        """
+        users = list(users)
+        for start in range(0, len(users), batch_size):
+            self._insert_batch(users[start:start + batch_size])
+        return users
+
+    def _insert_batch(self, batch):
+        generated = [user for user in batch if not user.referral_code]
+        for attempt in range(REFERRAL_CODE_ATTEMPTS):
+            self._assign_codes(batch, generated)
+            try:
+                with transaction.atomic(using=self.db):
+                    self.bulk_create(batch)
+                return
+            except IntegrityError:
+                # Код мог занять параллельный запрос между проверкой и вставкой.
+                codes = [user.referral_code for user in generated]
+                if attempt == REFERRAL_CODE_ATTEMPTS - 1 or not self.filter(referral_code__in=codes).exists():
+                    raise
+                for user in generated:
+                    user.referral_code = None
+
+    def _assign_codes(self, batch, generated):
+        for user in generated:
+            user.referral_code = user.generate_referral_code()
+        while True:
+            codes = [user.referral_code for user in batch]
+            taken = set(self.filter(referral_code__in=codes).values_list('referral_code', flat=True))
+            seen = set()
+            retry = []
+            for user in generated:
+                if user.referral_code in taken or user.referral_code in seen:
+                    retry.append(user)
+                seen.add(user.referral_code)
+            if not retry:
+                return
+            for user in retry:
+                user.referral_code = user.generate_referral_code()
+
+
 class User(AbstractUser):
     """Расширенная модель пользователя для всех ролей."""
     
@@ -24,18 +76,85 @@ class User(AbstractUser):
     # Поля для реферальной системы
     referral_code = models.CharField(max_length=10, unique=True, blank=True, null=True)
     referred_by = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='referrals')
+    # Материализованный путь по referred_by (users.referrals): id предков от корня.
+    # TextField: длина растет с глубиной цепочки приглашений и ничем не ограничена.
+    referral_path = models.TextField(default='/', editable=False)
+    referral_depth = models.PositiveIntegerField(default=0, editable=False)
     
+    objects = UserManager()
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Покрывающий индекс для статистики поддерева; text_pattern_ops — чтобы
+            # PostgreSQL использовал его для LIKE 'prefix%' при любой сортировке.
+            models.Index(
+                fields=['referral_path', 'referral_depth'],
+                name='users_referral_tree_idx',
+                opclasses=['text_pattern_ops', 'int4_ops'],
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_referred_by_id = instance.__dict__.get('referred_by_id')
+        return instance
+
     def save(self, *args, **kwargs):
-        if not self.referral_code:
+        moved_prefix = self._update_referral_path(kwargs)
+        self._save_with_referral_code(*args, **kwargs)
+        if moved_prefix is not None:
+            old_prefix, depth_delta = moved_prefix
+            move_subtree(type(self), old_prefix, referral_prefix(self), depth_delta, self._state.db)
+        self._loaded_referred_by_id = self.referred_by_id
+
+    def _update_referral_path(self, kwargs):
+        """Пересчитывает путь при создании или смене пригласившего; возвращает, что переносить."""
+        if not self._state.adding and self.referred_by_id == getattr(self, '_loaded_referred_by_id', self.referred_by_id):
+            return None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            if 'referred_by' not in update_fields and 'referred_by_id' not in update_fields:
+                return None
+            kwargs['update_fields'] = {*update_fields, 'referral_path', 'referral_depth'}
+        old_prefix, old_depth = (None if self._state.adding else referral_prefix(self)), self.referral_depth
+        parent = self.referred_by
+        if parent is None:
+            self.referral_path, self.referral_depth = ROOT_PATH, 0
+        else:
+            if self.pk is not None and (parent.pk == self.pk or f'/{self.pk}/' in parent.referral_path):
+                raise ValueError('Пользователь не может быть приглашен своим рефералом')
+            self.referral_path, self.referral_depth = referral_prefix(parent), parent.referral_depth + 1
+        if old_prefix is None:
+            return None
+        return old_prefix, self.referral_depth - old_depth
+
+    def _save_with_referral_code(self, *args, **kwargs):
+        if self.referral_code:
+            return super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'referral_code'}
+        # Код не проверяется заранее: коллизию ловит уникальный индекс, и тогда пробуем другой.
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        for attempt in range(REFERRAL_CODE_ATTEMPTS):
             self.referral_code = self.generate_referral_code()
-        super().save(*args, **kwargs)
-    
+            try:
+                if transaction.get_connection(using).in_atomic_block:
+                    # Внутри транзакции ошибка без savepoint сломала бы ее целиком.
+                    with transaction.atomic(using=using):
+                        return super().save(*args, **kwargs)
+                return super().save(*args, **kwargs)
+            except IntegrityError:
+                code, self.referral_code = self.referral_code, None
+                if attempt == REFERRAL_CODE_ATTEMPTS - 1:
+                    raise
+                if not type(self)._default_manager.using(using).filter(referral_code=code).exists():
+                    raise
+
     def generate_referral_code(self):
-        while True:
-            code = get_random_string(8).upper()
-            if not type(self).objects.filter(referral_code=code).exists():
-                return code
-            
+        return get_random_string(REFERRAL_CODE_LENGTH).upper()
+
 
 class DriverLocation(models.Model):
     """Модель для хранения текущей геолокации водителя."""
@@ -46,3 +165,19 @@ class DriverLocation(models.Model):
 
     def __str__(self):
         return f"Локация {self.driver}"
+
+
+class DriverTrackPoint(models.Model):
+    """История перемещений водителя: только добавление, без обновлений."""
+    driver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='track_points', db_index=False)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    recorded_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['driver', 'recorded_at']),
+        ]
+
+    def __str__(self):
+        return f"Точка {self.driver_id} {self.recorded_at}"
@@ -0,0 +1,90 @@
+"""
+Реферальное дерево как материализованный путь.
+
+``User.referral_path`` хранит id предков от корня: ``/1/5/`` у пользователя,
+которого пригласил пользователь 5, приглашенный пользователем 1. Поддерево
+пользователя — все строки с путем, начинающимся с ``referral_prefix(user)``,
+поэтому статистика по всем уровням считается одним запросом по индексу.
+"""
+from django.db import connections
+from django.db.models import CharField, Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Cast, Concat, Substr
+
+ROOT_PATH = '/'
+
+
+def referral_prefix(user):
+    return f'{user.referral_path}{user.pk}/'
+
+
+def descendants_q(prefix, using='default'):
+    condition = Q(referral_path__startswith=prefix)
+    if connections[using].vendor == 'sqlite':
+        # SQLite не использует индекс для LIKE; диапазон по бинарной сортировке
+        # выбирает те же строки ('/' < '0'). В PostgreSQL LIKE идет по индексу *_like,
+        # а диапазон при локальной сортировке был бы неверен.
+        condition &= Q(referral_path__gte=prefix, referral_path__lt=prefix[:-1] + '0')
+    return condition
+
+
+def referral_stats(user):
+    """Прямые рефералы, весь нижестоящий состав и глубина дерева пользователя."""
+    model = type(user)
+    rows = (
+        model._default_manager.filter(descendants_q(referral_prefix(user), user._state.db or 'default'))
+        .order_by()
+        .values('referral_depth')
+        .annotate(count=Count('pk'))
+        .order_by('referral_depth')
+    )
+    levels = [
+        {'level': row['referral_depth'] - user.referral_depth, 'count': row['count']}
+        for row in rows
+    ]
+    return {
+        'user': user.pk,
+        'direct': levels[0]['count'] if levels and levels[0]['level'] == 1 else 0,
+        'total': sum(level['count'] for level in levels),
+        'depth': levels[-1]['level'] if levels else 0,
+        'levels': levels,
+    }
+
+
+def move_subtree(model, old_prefix, new_prefix, depth_delta, using='default'):
+    """Переносит поддерево под новый префикс одним ``UPDATE``."""
+    return model._default_manager.using(using).filter(descendants_q(old_prefix, using)).update(
+        referral_path=Concat(Value(new_prefix), Substr('referral_path', len(old_prefix) + 1)),
+        referral_depth=F('referral_depth') + depth_delta,
+    )
+
+
+def rebuild_paths(model, using='default'):
+    """
+    Пересчитывает пути всех пользователей по ``referred_by``: по одному
+    ``UPDATE`` на уровень дерева. Возвращает число обработанных пользователей
+    и тех, кто не достижим от корней (цикл в ``referred_by``).
+    """
+    users = model._default_manager.using(using)
+    users.update(referral_path='', referral_depth=0)
+    updated = users.filter(referred_by__isnull=True).update(referral_path=ROOT_PATH)
+    parents = model._default_manager.using(using).filter(pk=OuterRef('referred_by_id'))
+    depth = 0
+    while True:
+        level = users.filter(
+            referral_path='',
+            referred_by__in=users.filter(referral_depth=depth).exclude(referral_path='').values('pk'),
+        ).update(
+            referral_path=Concat(
+                Subquery(parents.values('referral_path')),
+                Cast('referred_by_id', CharField()),
+                Value('/'),
+                output_field=CharField(),
+            ),
+            referral_depth=depth + 1,
+        )
+        if not level:
+            break
+        updated += level
+        depth += 1
+    orphaned = users.filter(referral_path='').update(referral_path=ROOT_PATH)
+    return updated, orphaned
@@ -1,22 +1,33 @@
 # src/users/serializers.py
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.password_validation import validate_password
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .authentication import CLAIM_FIELDS, remember_auth_state
+from .hashers import hash_password
 from .models import User
+from .tokens import CachedBlacklistRefreshToken
+
+def stamp_claims(token, user):
+    """Записывает в токен claims из текущих значений пользователя."""
+    for field in CLAIM_FIELDS:
+        token[field] = getattr(user, field)
+
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     """Кастомный сериализатор для добавления дополнительных данных в JWT токен"""
     username_field = 'phone_number'
+    token_class = CachedBlacklistRefreshToken
     
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
-
-        token['username'] = user.username
-        token['role'] = user.role
-        token['is_subscription_active'] = user.is_subscription_active
-        token['email'] = user.email
-
+        stamp_claims(token, user)
+        remember_auth_state(user)
         return token
 
     def validate(self, attrs):
@@ -35,6 +46,36 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         
         return data
 
+class CachedBlacklistTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Обновление токенов с проверкой черного списка через bloom-фильтр и кеш.
+
+    simplejwt копирует claims старого refresh-токена в новые, поэтому здесь
+    они переписываются из базы: иначе роль и подписка из первого входа
+    жили бы, пока пользователь обновляет токены.
+    """
+    token_class = CachedBlacklistRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user_id = refresh.payload.get(jwt_settings.USER_ID_CLAIM)
+        user = User.objects.filter(**{jwt_settings.USER_ID_FIELD: user_id}).first() if user_id else None
+        if user is None or not jwt_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        stamp_claims(refresh, user)
+        remember_auth_state(user)
+
+        data = {'access': str(refresh.access_token)}
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            if jwt_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+            data['refresh'] = str(refresh)
+        return data
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, validators=[validate_password])
     password_confirm = serializers.CharField(write_only=True)
@@ -50,11 +91,12 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         validated_data.pop('password_confirm')
+        # Хеш считается в пуле users.hashers, как и при входе.
+        password = hash_password(validated_data.pop('password'))
         phone_number = validated_data.get('phone_number')
-        user = User.objects.create_user(
-            username=phone_number,
-            **validated_data
-        )
+        validated_data['email'] = User.objects.normalize_email(validated_data.get('email'))
+        user = User(username=User.normalize_username(phone_number), password=password, **validated_data)
+        user.save()
         return user
 
 class UserSerializer(serializers.ModelSerializer):
@@ -67,7 +109,7 @@ class UserSerializer(serializers.ModelSerializer):
 
 class UserLoginSerializer(serializers.Serializer):
     phone_number = serializers.CharField(help_text='+77000000000')
-    password = serializers.CharField(write_only=True, help_text='Пароль пользователя')
+    password = serializers.CharField(write_only=True, trim_whitespace=False, help_text='Пароль пользователя')
 
 
 class UserLoginResponseSerializer(serializers.Serializer):
@@ -93,3 +135,20 @@ class UserLoginResponseSerializer(serializers.Serializer):
                 }
             }
         }
+
+
+class LocationPingSerializer(serializers.Serializer):
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    recorded_at = serializers.DateTimeField(required=False)
+
+
+class LocationPingBatchSerializer(serializers.Serializer):
+    pings = LocationPingSerializer(many=True, allow_empty=False, max_length=settings.DRIVER_LOCATION_MAX_BATCH)
+
+    def to_pings(self):
+        now = timezone.now()
+        return [
+            (ping['latitude'], ping['longitude'], ping.get('recorded_at') or now)
+            for ping in self.validated_data['pings']
+        ]
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .authentication import invalidate_auth_state, invalidate_cached_user
+from .models import User
+from .referrals import ROOT_PATH, move_subtree, referral_prefix
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+    invalidate_auth_state([instance.pk])
+
+
+@receiver(pre_delete, sender=User)
+def detach_referrals(sender, instance, using, **kwargs):
+    # SET_NULL обнулит referred_by без save(), поэтому рефералы со своими
+    # поддеревьями становятся корнями заранее, одним UPDATE.
+    move_subtree(User, referral_prefix(instance), ROOT_PATH, -(instance.referral_depth + 1), using)
@@ -1,10 +1,34 @@
-from django.test import TestCase
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from unittest.mock import patch
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.throttling import AnonRateThrottle
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
 
-from .models import User
+import os
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+
+from django.utils import timezone
+
+from .authentication import ClaimsJWTAuthentication, clear_user_cache
+from .login import LoginAPIView
+from .models import DriverLocation, DriverTrackPoint, User
+from .serializers import CachedBlacklistTokenRefreshSerializer, CustomTokenObtainPairSerializer
+from .tokens import BloomFilter, CachedBlacklistRefreshToken, cache_key, token_blacklist
+from .tracking import BufferFull, LocationBuffer, location_buffer
 
 
 class UserPermissionTests(TestCase):
@@ -45,6 +69,17 @@ class UserPermissionTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertGreaterEqual(len(response.data), 3)
 
+    def test_admin_user_list_is_cursor_paginated_by_id(self):
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.get(reverse('users:user-list'), {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        ids = [item['id'] for item in response.data['results']]
+        self.assertEqual(ids, [self.regular_user.pk, self.other_user.pk])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([item['id'] for item in response.data['results']], [self.admin_user.pk])
+
     def test_regular_user_can_retrieve_self(self):
         self.client.force_authenticate(user=self.regular_user)
         url = reverse('users:user-detail', args=[self.regular_user.pk])
@@ -86,3 +121,610 @@ class UserModelTests(TestCase):
             )
 
         self.assertEqual(new_user.referral_code, 'UNIQUECD')
+
+    def test_referral_code_needs_no_precheck_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            user = User.objects.create(username='+70000000012', phone_number='+70000000012')
+
+        statements = [q['sql'] for q in queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('INSERT'))
+        self.assertEqual(len(user.referral_code), 8)
+
+    def test_other_integrity_errors_are_not_retried(self):
+        User.objects.create(username='+70000000013', phone_number='+70000000013')
+
+        with patch('users.models.get_random_string', side_effect=['first', 'second']) as generate:
+            with self.assertRaises(IntegrityError):
+                User.objects.create(username='+70000000014', phone_number='+70000000013')
+
+        self.assertEqual(generate.call_count, 1)
+
+    def test_bulk_create_assigns_unique_codes_in_one_pass(self):
+        User.objects.create(username='+70000000015', phone_number='+70000000015', referral_code='TAKEN')
+        codes = iter(['taken', 'dup', 'dup', 'fresh1', 'fresh2'])
+        users = [User(username=f'+7700000002{index}', phone_number=f'+7700000002{index}') for index in range(3)]
+
+        with patch('users.models.get_random_string', side_effect=lambda length: next(codes)):
+            with CaptureQueriesContext(connection) as queries:
+                User.objects.bulk_create_with_referral_codes(users)
+
+        # Проверка кодов дважды (вторая — после перегенерации совпавших) и один INSERT.
+        statements = [q['sql'].split()[0] for q in queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(statements, ['SELECT', 'SELECT', 'INSERT'])
+
+        self.assertEqual(
+            set(User.objects.exclude(referral_code='TAKEN').values_list('referral_code', flat=True)),
+            {'DUP', 'FRESH1', 'FRESH2'},
+        )
+
+    def test_import_users_command(self):
+        User.objects.create(username='+70000000030', phone_number='+70000000030')
+        with NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', delete=False) as source:
+            source.write('phone_number,email,role,first_name\n')
+            source.write('+70000000030,old@example.com,SENDER,Старый\n')
+            for index in range(1, 2501):
+                source.write(f'+7701{index:07d},user{index}@Example.COM,driver,Водитель\n')
+        self.addCleanup(os.unlink, source.name)
+
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('import_users', source.name, stdout=out)
+
+        # По пачкам из 1000: три проверки номеров и три проверки кодов; остальное — INSERT.
+        selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 6)
+
+        self.assertIn('Импортировано пользователей: 2500', out.getvalue())
+        drivers = User.objects.filter(role=User.Role.DRIVER)
+        self.assertEqual(drivers.count(), 2500)
+        self.assertEqual(drivers.values('referral_code').distinct().count(), 2500)
+        self.assertFalse(drivers.first().has_usable_password())
+        self.assertTrue(drivers.filter(email='user1@example.com').exists())
+
+
+class DriverLocationIngestTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.driver = User.objects.create(
+            username='+70000000001', phone_number='+70000000001', role=User.Role.DRIVER
+        )
+        self.other_driver = User.objects.create(
+            username='+70000000002', phone_number='+70000000002', role=User.Role.DRIVER
+        )
+        self.url = reverse('users:location-pings')
+
+    def _buffer(self, max_points=10_000):
+        buffer = LocationBuffer(flush_interval=60, max_points=max_points)
+        self.addCleanup(buffer.stop)
+        return buffer
+
+    def test_buffer_coalesces_pings_into_two_queries(self):
+        buffer = self._buffer()
+        start = timezone.now()
+        for index in range(50):
+            buffer.add(self.driver.pk, [(43.2 + index / 1000, 76.9, start + timedelta(seconds=index))])
+        buffer.add(self.other_driver.pk, [(51.1, 71.4, start)])
+        # Поздняя отметка, пришедшая последней, не должна перетереть свежую позицию.
+        buffer.add(self.driver.pk, [(10.0, 10.0, start - timedelta(minutes=5))])
+
+        with self.assertNumQueries(2):
+            written = buffer.flush()
+
+        self.assertEqual(written, 52)
+        self.assertEqual(DriverTrackPoint.objects.filter(driver=self.driver).count(), 51)
+        location = DriverLocation.objects.get(driver=self.driver)
+        self.assertEqual(str(location.latitude), '43.249000')
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_flush_updates_existing_position(self):
+        buffer = self._buffer()
+        DriverLocation.objects.create(driver=self.driver, latitude='1.000000', longitude='1.000000')
+        buffer.add(self.driver.pk, [(43.25, 76.95, timezone.now())])
+        buffer.flush()
+
+        location = DriverLocation.objects.get(driver=self.driver)
+        self.assertEqual(str(location.longitude), '76.950000')
+
+    def test_buffer_flushes_when_full(self):
+        buffer = self._buffer(max_points=3)
+        now = timezone.now()
+        buffer.add(self.driver.pk, [(43.2, 76.9, now)] * 2)
+        self.assertEqual(DriverTrackPoint.objects.count(), 0)
+        buffer.add(self.driver.pk, [(43.2, 76.9, now)])
+        self.assertEqual(DriverTrackPoint.objects.count(), 3)
+        self.assertEqual(buffer.pending(), 0)
+
+    def test_failed_flush_keeps_points_for_retry(self):
+        buffer = self._buffer()
+        now = timezone.now()
+        buffer.add(self.driver.pk, [(43.2, 76.9, now)])
+        with patch.object(DriverTrackPoint.objects, 'bulk_create', side_effect=OperationalError('database is locked')):
+            with self.assertRaises(OperationalError):
+                buffer.flush()
+        self.assertEqual(buffer.pending(), 1)
+
+        buffer.add(self.driver.pk, [(43.3, 76.9, now - timedelta(seconds=5))])
+        with patch.object(DriverLocation.objects, 'bulk_create', side_effect=OperationalError('database is locked')):
+            with self.assertRaises(OperationalError):
+                buffer.flush()
+        # История записана, позиция ждет следующего сброса.
+        self.assertEqual((DriverTrackPoint.objects.count(), buffer.pending()), (2, 0))
+        self.assertFalse(DriverLocation.objects.exists())
+
+        self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(str(DriverLocation.objects.get(driver=self.driver).latitude), '43.200000')
+
+    def test_full_buffer_with_failing_write_never_raises_after_accepting(self):
+        buffer = LocationBuffer(flush_interval=60, max_points=3, max_pending=6)
+        self.addCleanup(buffer.stop)
+        now = timezone.now()
+        failing = patch.object(DriverTrackPoint.objects, 'bulk_create', side_effect=OperationalError('database is locked'))
+        with failing, self.assertLogs('users.tracking', 'ERROR'):
+            buffer.add(self.driver.pk, [(43.2, 76.9, now)] * 2)
+            buffer.add(self.driver.pk, [(43.2, 76.9, now)] * 2)
+            buffer.add(self.driver.pk, [(43.2, 76.9, now)] * 2)
+            self.assertEqual(buffer.pending(), 6)
+            with self.assertRaises(BufferFull):
+                buffer.add(self.driver.pk, [(43.2, 76.9, now)])
+        self.assertEqual(buffer.pending(), 6)
+
+        self.assertEqual(buffer.flush(), 6)
+        self.assertEqual(DriverTrackPoint.objects.count(), 6)
+
+    def test_restore_drops_oldest_history_over_limit(self):
+        buffer = LocationBuffer(flush_interval=60, max_points=100, max_pending=4)
+        self.addCleanup(buffer.stop)
+        now = timezone.now()
+        buffer.add(self.driver.pk, [(1.0, 1.0, now), (2.0, 2.0, now + timedelta(seconds=1)), (3.0, 3.0, now + timedelta(seconds=2))])
+
+        def arrive_then_fail(objs, **kwargs):
+            # Пока шла запись, пришли новые отметки.
+            buffer.add(self.other_driver.pk, [(9.0, 9.0, now)] * 3)
+            raise OperationalError('database is locked')
+
+        with patch.object(DriverTrackPoint.objects, 'bulk_create', side_effect=arrive_then_fail), \
+                self.assertLogs('users.tracking', 'WARNING'), self.assertRaises(OperationalError):
+            buffer.flush()
+
+        self.assertEqual(buffer.pending(), 4)
+        buffer.flush()
+        self.assertEqual(
+            sorted(DriverTrackPoint.objects.values_list('driver_id', 'latitude')),
+            [(self.driver.pk, 3.0)] + [(self.other_driver.pk, 9.0)] * 3,
+        )
+        self.assertEqual(DriverLocation.objects.get(driver=self.driver).latitude, Decimal('3.000000'))
+
+    @patch.object(location_buffer, 'max_pending', 1)
+    def test_full_buffer_returns_503(self):
+        self.client.force_authenticate(self.driver)
+        payload = {'pings': [
+            {'latitude': 43.2, 'longitude': 76.8, 'recorded_at': '2025-10-08T10:00:00Z'},
+            {'latitude': 43.3, 'longitude': 76.9, 'recorded_at': '2025-10-08T10:00:05Z'},
+        ]}
+        response = self.client.post(self.url, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertEqual(location_buffer.pending(), 0)
+
+    def test_flush_drops_only_points_of_deleted_drivers(self):
+        buffer = self._buffer()
+        now = timezone.now()
+        buffer.add(self.driver.pk, [(43.2, 76.9, now)])
+        buffer.add(self.other_driver.pk, [(51.1, 71.4, now)])
+        self.other_driver.delete()
+        bulk_create = DriverTrackPoint.objects.bulk_create
+        calls = []
+
+        def fail_first(objs, **kwargs):
+            # Внешние ключи проверяются при коммите, в тесте его нет.
+            calls.append(len(objs))
+            if len(calls) == 1:
+                raise IntegrityError('FOREIGN KEY constraint failed')
+            return bulk_create(objs, **kwargs)
+
+        with patch.object(DriverTrackPoint.objects, 'bulk_create', side_effect=fail_first), \
+                self.assertLogs('users.tracking', 'WARNING'):
+            self.assertEqual(buffer.flush(), 1)
+
+        self.assertEqual(calls, [2, 1])
+        self.assertEqual(list(DriverLocation.objects.values_list('driver_id', flat=True)), [self.driver.pk])
+
+    @patch.object(location_buffer, 'flush_interval', 0)
+    def test_driver_posts_batch_of_pings(self):
+        self.client.force_authenticate(self.driver)
+        payload = {'pings': [
+            {'latitude': 43.238949, 'longitude': 76.889709, 'recorded_at': '2025-10-08T10:00:00Z'},
+            {'latitude': 43.240000, 'longitude': 76.890000, 'recorded_at': '2025-10-08T10:00:05Z'},
+        ]}
+        response = self.client.post(self.url, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['accepted'], 2)
+        self.assertEqual(DriverTrackPoint.objects.count(), 2)
+        self.assertEqual(str(DriverLocation.objects.get(driver=self.driver).latitude), '43.240000')
+
+    def test_sender_cannot_post_pings(self):
+        sender = User.objects.create(username='+70000000003', phone_number='+70000000003')
+        self.client.force_authenticate(sender)
+        response = self.client.post(self.url, {'pings': [{'latitude': 1, 'longitude': 1}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_invalid_coordinates_are_rejected(self):
+        self.client.force_authenticate(self.driver)
+        response = self.client.post(self.url, {'pings': [{'latitude': 91, 'longitude': 1}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        clear_user_cache()
+        self.addCleanup(clear_user_cache)
+        self.user = User.objects.create(
+            username='+70000000001', phone_number='+70000000001', role=User.Role.DRIVER,
+            is_subscription_active=True, first_name='Иван', referral_code='CLAIMS',
+        )
+
+    def _authenticate(self, token):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        user, _ = ClaimsJWTAuthentication().authenticate(request)
+        return user
+
+    def test_user_is_built_from_claims(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+
+        with self.assertNumQueries(0):
+            user = self._authenticate(token)
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertEqual(user.role, User.Role.DRIVER)
+            self.assertTrue(user.is_subscription_active)
+            self.assertFalse(user.is_staff)
+            self.assertTrue(user.is_authenticated)
+        self.assertEqual(user, self.user)
+
+    def test_other_fields_are_loaded_once_and_cached(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self._authenticate(token).first_name, 'Иван')
+            self.assertEqual(self._authenticate(token).referral_code, 'CLAIMS')
+
+        self.user.first_name = 'Петр'
+        self.user.save()
+        self.assertEqual(self._authenticate(token).first_name, 'Петр')
+
+    def test_token_without_custom_claims_falls_back_to_database(self):
+        token = AccessToken.for_user(self.user)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self._authenticate(token).role, User.Role.DRIVER)
+
+    def test_access_flags_follow_database(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        self.user.role = User.Role.SENDER
+        self.user.is_subscription_active = False
+        self.user.save()
+
+        user = self._authenticate(token)
+        self.assertEqual((user.role, user.is_subscription_active), (User.Role.SENDER, False))
+
+    def test_inactive_or_deleted_user_is_rejected(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate(token)
+
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate(token)
+
+    def test_refresh_restamps_claims_from_database(self):
+        refresh = str(CustomTokenObtainPairSerializer.get_token(self.user))
+        self.user.role = User.Role.SENDER
+        self.user.is_subscription_active = False
+        self.user.save()
+
+        url = reverse('token_refresh')
+        for _ in range(2):  # и после повторной ротации
+            with self.captureOnCommitCallbacks(execute=True):
+                response = APIClient().post(url, {'refresh': refresh})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            refresh = response.data['refresh']
+            for token in (AccessToken(response.data['access']), CachedBlacklistRefreshToken(refresh)):
+                self.assertEqual((token['role'], token['is_subscription_active']), (User.Role.SENDER, False))
+
+        self.user.is_active = False
+        self.user.save()
+        response = APIClient().post(url, {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_login_issues_tokens_with_claims(self):
+        self.user.set_password('StrongPass123!')
+        self.user.save()
+
+        response = APIClient().post(
+            reverse('users:login'), {'phone_number': '+70000000001', 'password': 'StrongPass123!'}
+        )
+
+        token = AccessToken(response.json()['access'])
+        self.assertEqual(token['role'], User.Role.DRIVER)
+        self.assertIs(token['is_staff'], False)
+
+
+class TokenBlacklistTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        token_blacklist.reset()
+        self.addCleanup(token_blacklist.reset)
+        self.user = User.objects.create(username='+70000000001', phone_number='+70000000001', referral_code='TOKENS')
+        self.refresh_url = reverse('token_refresh')
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        values = [f'jti-{index}' for index in range(1000)]
+        for value in values:
+            bloom.add(value)
+
+        self.assertTrue(all(value in bloom for value in values))
+        false_positives = sum(f'other-{index}' in bloom for index in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_rotated_refresh_token_is_rejected(self):
+        refresh = str(CustomTokenObtainPairSerializer.get_token(self.user))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.client.post(self.refresh_url, {'refresh': refresh})
+        again = self.client.post(self.refresh_url, {'refresh': refresh})
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(again.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.post(self.refresh_url, {'refresh': first.data['refresh']}).status_code, 200)
+
+    def _shared_blacklist_cache(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return self.settings(
+            CACHES={**settings.CACHES, 'shared': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': directory.name,
+            }},
+            JWT_BLACKLIST_CACHE='shared',
+        )
+
+    def test_refresh_check_does_not_query_blacklist(self):
+        self.enterContext(self._shared_blacklist_cache())
+        token_blacklist.sync(force=True)
+        refresh = str(CachedBlacklistRefreshToken.for_user(self.user))
+
+        # Пользователь, поиск outstanding-токена, вставка в черный список и нового outstanding-токена.
+        with CaptureQueriesContext(connection) as queries:
+            serializer = CachedBlacklistTokenRefreshSerializer(data={'refresh': refresh})
+            serializer.is_valid(raise_exception=True)
+
+        statements = [q['sql'] for q in queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(statements), 4)
+        self.assertFalse(any('blacklistedtoken"."id"' in sql and 'SELECT' in sql for sql in statements))
+
+    def test_token_blacklisted_elsewhere_is_seen_after_sync(self):
+        refresh = CachedBlacklistRefreshToken.for_user(self.user)
+        token_blacklist.sync(force=True)
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=refresh['jti']))
+
+        token_blacklist.sync(force=True)
+
+        with self.assertRaises(TokenError):
+            CachedBlacklistRefreshToken(str(refresh))
+
+    def test_token_blacklisted_elsewhere_is_seen_before_sync(self):
+        refresh = CachedBlacklistRefreshToken.for_user(self.user)
+        token_blacklist.sync(force=True)
+        # Другой процесс отозвал токен: строка в базе, ключ в его кеше.
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=refresh['jti']))
+
+        # Локальный кеш этого процесса о записи не знает, проверяется база.
+        with self.assertRaises(TokenError):
+            CachedBlacklistRefreshToken(str(refresh))
+
+        with self._shared_blacklist_cache():
+            self.assertNotIn(refresh['jti'], token_blacklist)
+            caches['shared'].set(cache_key(refresh['jti']), True)
+            self.assertIn(refresh['jti'], token_blacklist)
+
+    def test_logout_blacklists_through_cache(self):
+        refresh = CustomTokenObtainPairSerializer.get_token(self.user)
+        self.client.force_login(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('users:logout'), {'refresh': str(refresh)})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(cache.get(f'jwt:blacklisted:{refresh["jti"]}'))
+        self.assertTrue(BlacklistedToken.objects.filter(token__jti=refresh['jti']).exists())
+
+    def test_prune_tokens_removes_expired_in_batches(self):
+        now = timezone.now()
+        expired = OutstandingToken.objects.bulk_create(
+            OutstandingToken(jti=f'old-{index}', token='-', expires_at=now - timedelta(days=1)) for index in range(5)
+        )
+        BlacklistedToken.objects.create(token=expired[0])
+        alive = OutstandingToken.objects.create(jti='alive', token='-', expires_at=now + timedelta(days=1))
+
+        out = StringIO()
+        call_command('prune_tokens', batch_size=2, stdout=out)
+
+        self.assertIn('5', out.getvalue())
+        self.assertEqual(list(OutstandingToken.objects.values_list('pk', flat=True)), [alive.pk])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='+70000000001', phone_number='+70000000001', password='StrongPass123!'
+        )
+        self.url = reverse('users:login')
+
+    def _login(self, password='StrongPass123!', **kwargs):
+        return self.client.post(self.url, {'phone_number': '+70000000001', 'password': password}, **kwargs)
+
+    def test_login_accepts_json_and_form(self):
+        for kwargs in ({'format': 'json'}, {}):
+            with self.subTest(**kwargs):
+                response = self._login(**kwargs)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response.json()['user']['id'], self.user.pk)
+
+    def test_login_errors(self):
+        self.assertEqual(self._login('wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.post(self.url, {'phone_number': '+79999999999', 'password': 'x'}).status_code, 401)
+        self.assertEqual(self.client.post(self.url, {'phone_number': '+70000000001'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+    def test_login_goes_through_drf(self):
+        response = self.client.post(self.url, b'{', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('detail', response.json())  # ParseError из FastJSONParser
+
+        with patch.object(LoginAPIView, 'throttle_classes', [AnonRateThrottle]), \
+                patch.object(AnonRateThrottle, 'THROTTLE_RATES', {'anon': '1/min'}):
+            cache.clear()
+            self.assertEqual(self._login().status_code, status.HTTP_200_OK)
+            self.assertEqual(self._login().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_password_is_not_trimmed(self):
+        self.user.set_password(' spaced ')
+        self.user.save()
+        self.assertEqual(self._login('spaced').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self._login(' spaced ', format='json').status_code, status.HTTP_200_OK)
+
+    def test_login_is_described_in_swagger(self):
+        response = self.client.get(reverse('schema-json', kwargs={'format': '.json'}))
+        operation = response.json()['paths']['/auth/login/']['post']
+
+        self.assertEqual(operation['parameters'][0]['schema'], {'$ref': '#/definitions/UserLogin'})
+        self.assertEqual(operation['responses']['200']['schema'], {'$ref': '#/definitions/UserLoginResponse'})
+        self.assertEqual(set(operation['responses']), {'200', '400', '401', '503'})
+
+    def test_hash_follows_policy_and_is_upgraded_on_login(self):
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=1500):
+            self.assertEqual(self._login().status_code, status.HTTP_200_OK)
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1500$'))
+        self.assertTrue(self.user.check_password('StrongPass123!'))
+
+    def test_full_hashing_queue_returns_503(self):
+        with patch('users.hashers._slots', threading.BoundedSemaphore(1)) as slots:
+            slots.acquire()
+            response = self._login()
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_registration_hashes_with_policy(self):
+        response = self.client.post(reverse('users:register'), {
+            'phone_number': '+70000000009', 'email': 'new@EXAMPLE.com', 'role': User.Role.DRIVER,
+            'password': 'StrongPass123!', 'password_confirm': 'StrongPass123!',
+        })
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        user = User.objects.get(phone_number='+70000000009')
+        self.assertEqual(user.username, '+70000000009')
+        self.assertEqual(user.email, 'new@example.com')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(user.check_password('StrongPass123!'))
+
+
+class ReferralTreeTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.root = self._user(0)
+        self.a = self._user(1, self.root)
+        self.b = self._user(2, self.root)
+        self.a1 = self._user(3, self.a)
+        self.a2 = self._user(4, self.a)
+        self.a1x = self._user(5, self.a1)
+
+    def _user(self, index, parent=None):
+        return User.objects.create(
+            username=f'+7700000005{index}', phone_number=f'+7700000005{index}', referred_by=parent
+        )
+
+    def _stats(self, user):
+        self.client.force_authenticate(user)
+        with self.assertNumQueries(2):  # пользователь и один агрегирующий запрос по поддереву
+            response = self.client.get(reverse('users:user-referrals', args=[user.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_paths_follow_referred_by(self):
+        self.assertEqual(self.root.referral_path, '/')
+        self.assertEqual(self.a1x.referral_path, f'/{self.root.pk}/{self.a.pk}/{self.a1.pk}/')
+        self.assertEqual(self.a1x.referral_depth, 3)
+
+    def test_stats_counts_direct_total_and_depth(self):
+        stats = self._stats(self.root)
+
+        self.assertEqual((stats['direct'], stats['total'], stats['depth']), (2, 5, 3))
+        self.assertEqual(stats['levels'], [
+            {'level': 1, 'count': 2}, {'level': 2, 'count': 2}, {'level': 3, 'count': 1},
+        ])
+        self.assertEqual(self._stats(self.a1x)['total'], 0)
+
+    def test_stats_of_other_user_requires_admin(self):
+        self.client.force_authenticate(self.a)
+        response = self.client.get(reverse('users:user-referrals', args=[self.root.pk]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_changing_referrer_moves_subtree(self):
+        self.a.referred_by = self.b
+        self.a.save()
+
+        self.a1x.refresh_from_db()
+        self.assertEqual(self.a1x.referral_path, f'/{self.root.pk}/{self.b.pk}/{self.a.pk}/{self.a1.pk}/')
+        self.assertEqual(self.a1x.referral_depth, 4)
+        self.assertEqual(self._stats(self.b)['total'], 4)
+
+        self.a.referred_by = self.a1x
+        with self.assertRaises(ValueError):
+            self.a.save()
+
+    def test_deep_chain_path_is_not_truncated(self):
+        parent = self.a1x
+        for index in range(200):
+            parent = User.objects.create(
+                username=f'+7701{index:07d}', phone_number=f'+7701{index:07d}', referred_by=parent
+            )
+
+        parent.refresh_from_db()
+        self.assertGreater(len(parent.referral_path), 512)
+        self.assertEqual(parent.referral_depth, 203)
+        self.assertTrue(parent.referral_path.endswith(f'/{parent.referred_by_id}/'))
+        self.assertEqual(self._stats(self.root)['depth'], 203)
+
+    def test_deleting_referrer_makes_referrals_roots(self):
+        self.a.delete()
+
+        self.a1.refresh_from_db()
+        self.a1x.refresh_from_db()
+        self.assertIsNone(self.a1.referred_by_id)
+        self.assertEqual((self.a1.referral_path, self.a1.referral_depth), ('/', 0))
+        self.assertEqual((self.a1x.referral_path, self.a1x.referral_depth), (f'/{self.a1.pk}/', 1))
+        self.assertEqual(self._stats(self.root)['total'], 1)
+
+    def test_rebuild_command_restores_paths(self):
+        expected = dict(User.objects.values_list('pk', 'referral_path'))
+        User.objects.update(referral_path='/', referral_depth=0)
+
+        out = StringIO()
+        call_command('rebuild_referral_paths', stdout=out)
+
+        self.assertEqual(dict(User.objects.values_list('pk', 'referral_path')), expected)
+        self.assertEqual(User.objects.get(pk=self.a1x.pk).referral_depth, 3)
+        self.assertIn('6', out.getvalue())
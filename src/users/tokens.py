@@ -0,0 +1,155 @@
+"""
+Быстрая проверка черного списка refresh-токенов.
+
+Стандартный ``RefreshToken`` на каждое обновление делает JOIN
+``BlacklistedToken``/``OutstandingToken`` по ``jti`` и еще несколько
+``get_or_create`` при ротации. Здесь проверка идет в три шага:
+
+1. bloom-фильтр процесса с jti из черного списка; он дозагружает новые
+   строки ``BlacklistedToken`` по возрастанию id не чаще раза в
+   ``JWT_BLACKLIST_SYNC_SECONDS``;
+2. если фильтр говорит «нет» — ключ в кеше ``JWT_BLACKLIST_CACHE``, куда
+   пишет любой процесс, отзывающий токен: он закрывает окно до следующей
+   синхронизации;
+3. если фильтр говорит «возможно» — точная проверка в базе.
+
+Ложные срабатывания фильтра стоят одного запроса. Токен, отозванный другим
+процессом, до синхронизации виден только через кеш, поэтому кеш должен быть
+общим (Redis). Если он локален процессу, на шаге 2 вместо кеша проверяется
+база: отозванный токен не принимается ни одним процессом, но каждое
+обновление стоит запроса.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+
+class BloomFilter:
+    """Bloom-фильтр на ``bytearray``; позиции битов — из одного blake2b-дайджеста."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(1, capacity)
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + index * second) % self.size for index in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+def cache_key(jti):
+    return f'jwt:blacklisted:{jti}'
+
+
+def _cache():
+    return caches[settings.JWT_BLACKLIST_CACHE]
+
+
+class TokenBlacklist:
+    """Черный список jti процесса: bloom-фильтр, синхронизируемый с ``BlacklistedToken``."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._bloom = BloomFilter(settings.JWT_BLACKLIST_BLOOM_CAPACITY)
+            self._last_id = 0
+            self._synced_at = float('-inf')
+
+    def sync(self, force=False):
+        """Добавляет в фильтр строки черного списка, появившиеся после прошлой синхронизации."""
+        now = time.monotonic()
+        if not force and now - self._synced_at < settings.JWT_BLACKLIST_SYNC_SECONDS:
+            return
+        with self._lock:
+            if not force and now - self._synced_at < settings.JWT_BLACKLIST_SYNC_SECONDS:
+                return
+            if self._bloom.count >= self._bloom.capacity:
+                # Фильтр переполнен: строим заново вдвое больше, истекшие токены при этом выпадают.
+                self._bloom = BloomFilter(self._bloom.capacity * 2)
+                self._last_id = 0
+            rows = (
+                BlacklistedToken.objects.filter(pk__gt=self._last_id, token__expires_at__gt=timezone.now())
+                .order_by('pk')
+                .values_list('pk', 'token__jti')
+            )
+            for pk, jti in rows.iterator(chunk_size=10000):
+                self._bloom.add(jti)
+                self._last_id = pk
+            self._synced_at = now
+
+    def add(self, jti, expires_at):
+        with self._lock:
+            self._bloom.add(jti)
+        timeout = max(1, int((expires_at - timezone.now()).total_seconds()))
+        _cache().set(cache_key(jti), True, timeout)
+
+    def __contains__(self, jti):
+        self.sync()
+        cache = _cache()
+        if jti in self._bloom or isinstance(cache, (LocMemCache, DummyCache)):
+            return BlacklistedToken.objects.filter(token__jti=jti).exists()
+        return cache.get(cache_key(jti), False)
+
+
+token_blacklist = TokenBlacklist()
+
+
+class CachedBlacklistRefreshToken(RefreshToken):
+    """
+    ``RefreshToken`` с проверкой черного списка через ``token_blacklist``
+    и без лишних запросов пользователя при ротации.
+    """
+
+    def check_blacklist(self):
+        if self.payload[api_settings.JTI_CLAIM] in token_blacklist:
+            raise TokenError('Токен в черном списке')
+
+    def blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        expires_at = datetime_from_epoch(self.payload['exp'])
+        token_id = OutstandingToken.objects.filter(jti=jti).values_list('pk', flat=True).first()
+        if token_id is None:
+            # Токен выпущен до учета outstanding-токенов: стандартный путь его создаст.
+            super().blacklist()
+        else:
+            BlacklistedToken.objects.bulk_create([BlacklistedToken(token_id=token_id)], ignore_conflicts=True)
+        transaction.on_commit(lambda: token_blacklist.add(jti, expires_at))
+
+    def outstand(self):
+        # После ротации jti новый, искать его в базе незачем. Пользователя
+        # TokenRefreshSerializer уже проверил перед ротацией.
+        return OutstandingToken.objects.create(
+            user_id=self.payload.get(api_settings.USER_ID_CLAIM),
+            jti=self.payload[api_settings.JTI_CLAIM],
+            token=str(self),
+            created_at=self.current_time,
+            expires_at=datetime_from_epoch(self.payload['exp']),
+        )
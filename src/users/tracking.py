@@ -0,0 +1,195 @@
+"""
+Прием GPS-отметок водителей.
+
+Отметки копятся в памяти процесса и сбрасываются в базу раз в
+``DRIVER_LOCATION_FLUSH_INTERVAL`` секунд или при заполнении буфера: вся
+история пишется одним ``bulk_create`` в ``DriverTrackPoint``, а последняя
+позиция каждого водителя — одним upsert в ``DriverLocation`` и событием
+``driver.location`` для realtime-подписчиков. Так частые отметки не
+превращаются в UPDATE строки на каждый запрос.
+"""
+import atexit
+import logging
+import threading
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections
+
+from core import realtime
+from .models import DriverLocation, DriverTrackPoint, User
+
+logger = logging.getLogger(__name__)
+
+RETRY_SECONDS = 1.0
+
+
+def _coordinate(value):
+    return Decimal(f'{float(value):.6f}')
+
+
+class BufferFull(Exception):
+    """Буфер на пределе (база недоступна дольше обычного): отметки не приняты."""
+
+
+class LocationBuffer:
+    def __init__(self, flush_interval, max_points, max_pending=None):
+        self.flush_interval = flush_interval
+        self.max_points = max_points
+        # Сколько отметок можно держать, пока запись не удается.
+        self.max_pending = max_pending or max_points * 4
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._points = []
+        self._latest = {}
+        self._worker = None
+        self._stopped = threading.Event()
+
+    def add(self, driver_id, pings):
+        """
+        Принимает отметки ``(latitude, longitude, recorded_at)`` одного водителя.
+
+        Либо отклоняет их целиком (``BufferFull``), либо оставляет у себя и уже
+        не пробрасывает ошибок: неудачную запись повторит фоновый поток, а
+        повтор запроса клиентом записал бы отметки дважды.
+        """
+        with self._lock:
+            if len(self._points) + len(pings) > self.max_pending:
+                raise BufferFull
+            latest = self._latest.get(driver_id)
+            for latitude, longitude, recorded_at in pings:
+                self._points.append((driver_id, float(latitude), float(longitude), recorded_at))
+                if latest is None or recorded_at >= latest[2]:
+                    latest = (latitude, longitude, recorded_at)
+            if latest is not None:
+                self._latest[driver_id] = latest
+            overflow = len(self._points) >= self.max_points
+        if overflow or self.flush_interval <= 0:
+            try:
+                self.flush()
+                return
+            except Exception:
+                logger.exception('Не удалось записать позиции водителей, повтор в фоне')
+        self._ensure_worker()
+
+    def pending(self):
+        with self._lock:
+            return len(self._points)
+
+    def flush(self):
+        """
+        Записывает накопленные отметки. Возвращает число записанных точек.
+
+        Если запись не удалась, незаписанное возвращается в буфер (сверх
+        ``max_pending`` — без самых старых отметок истории) и ошибка
+        пробрасывается: следующий сброс повторит попытку. Отметки водителей,
+        удаленных до записи (``IntegrityError``), отбрасываются с предупреждением.
+        """
+        with self._flush_lock:
+            with self._lock:
+                points, latest = self._points, self._latest
+                self._points, self._latest = [], {}
+            if not points and not latest:
+                return 0
+            try:
+                try:
+                    self._write_points(points)
+                except IntegrityError:
+                    points, latest = self._without_missing_drivers(points, latest)
+                    self._write_points(points)
+            except Exception:
+                self._restore(points, latest)
+                raise
+            try:
+                self._write_latest(latest)
+            except Exception:
+                # История уже записана, повторять нужно только позиции.
+                self._restore([], latest)
+                raise
+            for driver_id, (lat, lon, recorded_at) in latest.items():
+                realtime.publish(realtime.driver_channel(driver_id), 'driver.location', {
+                    'driver': driver_id,
+                    'latitude': float(lat),
+                    'longitude': float(lon),
+                    'recorded_at': recorded_at.isoformat(),
+                })
+            return len(points)
+
+    def _write_points(self, points):
+        DriverTrackPoint.objects.bulk_create(
+            [
+                DriverTrackPoint(driver_id=driver_id, latitude=lat, longitude=lon, recorded_at=recorded_at)
+                for driver_id, lat, lon, recorded_at in points
+            ],
+            batch_size=2000,
+        )
+
+    def _write_latest(self, latest):
+        DriverLocation.objects.bulk_create(
+            [
+                DriverLocation(driver_id=driver_id, latitude=_coordinate(lat), longitude=_coordinate(lon))
+                for driver_id, (lat, lon, _) in latest.items()
+            ],
+            batch_size=2000,
+            update_conflicts=True,
+            unique_fields=['driver'],
+            update_fields=['latitude', 'longitude', 'updated_at'],
+        )
+
+    def _without_missing_drivers(self, points, latest):
+        existing = set(User.objects.filter(pk__in=latest).values_list('pk', flat=True))
+        dropped = [point for point in points if point[0] not in existing]
+        if dropped:
+            logger.warning(
+                'Отброшено %d отметок удаленных водителей: %s',
+                len(dropped), sorted({point[0] for point in dropped}),
+            )
+        return (
+            [point for point in points if point[0] in existing],
+            {driver_id: position for driver_id, position in latest.items() if driver_id in existing},
+        )
+
+    def _restore(self, points, latest):
+        """Возвращает незаписанное в буфер перед отметками, пришедшими во время записи."""
+        with self._lock:
+            self._points = points + self._points
+            excess = len(self._points) - self.max_pending
+            if excess > 0:
+                # Последние позиции хранятся отдельно и не теряются, теряется только история.
+                del self._points[:excess]
+            for driver_id, position in latest.items():
+                current = self._latest.get(driver_id)
+                if current is None or position[2] > current[2]:
+                    self._latest[driver_id] = position
+        if excess > 0:
+            logger.warning('Буфер позиций переполнен, отброшено %d старых отметок истории', excess)
+
+    def stop(self):
+        self._stopped.set()
+        self.flush()
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='driver-location-flush', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        # При записи без буфера (интервал 0) поток только повторяет неудачные записи.
+        while not self._stopped.wait(self.flush_interval if self.flush_interval > 0 else RETRY_SECONDS):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Не удалось записать позиции водителей')
+            finally:
+                close_old_connections()
+
+
+location_buffer = LocationBuffer(
+    flush_interval=settings.DRIVER_LOCATION_FLUSH_INTERVAL,
+    max_points=settings.DRIVER_LOCATION_BUFFER_SIZE,
+    max_pending=settings.DRIVER_LOCATION_BUFFER_LIMIT,
+)
+atexit.register(location_buffer.stop)
@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import *
+from .login import LoginAPIView
 
 app_name = 'users'
 
@@ -11,9 +12,10 @@ router.register('users', UserViewSet, basename='user')
 urlpatterns = [
     # Auth endpoints
     path('register/', UserRegistrationAPIView.as_view(), name='register'),
-    path('login/', UserLoginAPIView.as_view(), name='login'),
+    path('login/', LoginAPIView.as_view(), name='login'),
     path('logout/', UserLogoutAPIView.as_view(), name='logout'),
     path('profile/', UserProfileAPIView.as_view(), name='profile'),
+    path('location/pings/', DriverLocationPingAPIView.as_view(), name='location-pings'),
     
     # Router URLs
     path('', include(router.urls)),
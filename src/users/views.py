@@ -3,17 +3,20 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.viewsets import ModelViewSet
-from django.contrib.auth import authenticate
 from django.db import transaction
-from rest_framework_simplejwt.tokens import RefreshToken
 from drf_yasg.utils import swagger_auto_schema
+from core.compiled import compile_serializer
+from core.pagination import IdCursorPagination
 from .permissions import IsAdminOrSelf
 from .models import User
+from .referrals import referral_stats
+from .tokens import CachedBlacklistRefreshToken
+from .tracking import BufferFull, location_buffer
 from .serializers import (
+    CustomTokenObtainPairSerializer,
+    LocationPingBatchSerializer,
     UserSerializer,
     UserRegistrationSerializer,
-    UserLoginSerializer,
-    UserLoginResponseSerializer,
 )
 
 
@@ -38,7 +41,7 @@ class UserRegistrationAPIView(generics.CreateAPIView):
         self.perform_create(serializer)
 
         user = serializer.instance
-        refresh = RefreshToken.for_user(user)
+        refresh = CustomTokenObtainPairSerializer.get_token(user)
 
         data = serializer.data
         data.update({
@@ -50,45 +53,6 @@ class UserRegistrationAPIView(generics.CreateAPIView):
         headers = self.get_success_headers(serializer.data)
         return Response(data, status=status.HTTP_201_CREATED, headers=headers)
 
-class UserLoginAPIView(APIView):
-    """Аутентификация пользователя и получение JWT токенов"""
-    permission_classes = [permissions.AllowAny]
-    
-    @swagger_auto_schema(
-        request_body=UserLoginSerializer,
-        responses={
-            200: UserLoginResponseSerializer,
-            400: 'Необходимо указать номер телефона и пароль',
-            401: 'Неверные учетные данные',
-        },
-    )
-    
-    def post(self, request):
-        phone_number = request.data.get('phone_number')
-        password = request.data.get('password')
-        
-        if not phone_number or not password:
-            return Response(
-                {'error': 'Необходимо указать номер телефона и пароль'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        user = authenticate(username=phone_number, password=password)
-        
-        if user:
-            refresh = RefreshToken.for_user(user)
-            
-            return Response({
-                'access': str(refresh.access_token),
-                'refresh': str(refresh),
-                'user': UserSerializer(user).data
-            })
-        else:
-            return Response(
-                {'error': 'Неверные учетные данные'},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
-
 class UserLogoutAPIView(APIView):
     """Выход пользователя (добавление refresh токена в черный список)"""
     permission_classes = [permissions.IsAuthenticated]
@@ -96,7 +60,7 @@ class UserLogoutAPIView(APIView):
     def post(self, request):
         try:
             refresh_token = request.data["refresh"]
-            token = RefreshToken(refresh_token)
+            token = CachedBlacklistRefreshToken(refresh_token)
             token.blacklist()  # Добавляем в черный список
             
             return Response({'message': 'Успешный выход из системы'})
@@ -114,19 +78,58 @@ class UserProfileAPIView(generics.RetrieveUpdateAPIView):
     def get_object(self):
         return self.request.user
 
+class DriverLocationPingAPIView(APIView):
+    """Прием пачки GPS-отметок водителя; запись в базу идет в фоне пачками"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        request_body=LocationPingBatchSerializer,
+        responses={202: 'Отметки приняты', 503: 'Буфер отметок переполнен, повторите позже'},
+    )
+    def post(self, request):
+        if getattr(request.user, 'role', None) != User.Role.DRIVER:
+            return Response(
+                {'error': 'Отправлять местоположение могут только водители'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        serializer = LocationPingBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        pings = serializer.to_pings()
+        try:
+            location_buffer.add(request.user.pk, pings)
+        except BufferFull:
+            return Response(
+                {'error': 'Сервер перегружен, повторите попытку позже'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': '5'},
+            )
+        return Response({'accepted': len(pings)}, status=status.HTTP_202_ACCEPTED)
+
 class UserViewSet(ModelViewSet):
     """ViewSet для управления пользователями"""
     serializer_class = UserSerializer
     permission_classes = [IsAdminOrSelf]
+    pagination_class = IdCursorPagination
 
     def get_queryset(self):
         user = self.request.user
         if IsAdminOrSelf._is_admin(user):
             return User.objects.order_by('id')
         return User.objects.filter(pk=user.pk).order_by('id')
+
+    def list(self, request, *args, **kwargs):
+        # Список только читается: строки values() через скомпилированный UserSerializer.
+        compiled = compile_serializer(UserSerializer)
+        page = self.paginate_queryset(compiled.values(self.filter_queryset(self.get_queryset())))
+        return self.get_paginated_response(compiled.data(page))
     
     @action(detail=False, methods=['get'])
     def me(self, request):
         """Получить текущего пользователя"""
         serializer = self.get_serializer(request.user)
         return Response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def referrals(self, request, pk=None):
+        """Реферальная статистика: прямые приглашенные, весь состав и глубина дерева"""
+        return Response(referral_stats(self.get_object()))